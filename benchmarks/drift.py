@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+'''
+Long-horizon drift benchmark for the integrators: flies a minute of slowly
+varying open-loop motor values with each integrator at several frame rates,
+and reports the worst deviation from an adaptive RK45 reference at the same
+rate
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import time
+
+import numpy as np
+
+from gym_copter.dynamics.djiphantom import BatchDJIPhantomDynamics
+from gym_copter.dynamics.integrators import INTEGRATORS
+
+SECONDS = 60
+
+def fly(integrator, fps):
+
+    t = np.arange(int(fps * SECONDS)) / fps
+
+    thrust = 0.55 + 0.01 * np.cos(0.3 * t)
+    roll, pitch, yaw = 0.004 * np.cos(0.7 * t), 0.004 * np.cos(1.1 * t), 0.004 * np.cos(0.5 * t)
+
+    motors = np.column_stack((thrust-roll-pitch+yaw, thrust+roll+pitch+yaw, thrust+roll-pitch-yaw, thrust-roll+pitch-yaw))
+
+    dynamics = BatchDJIPhantomDynamics(1, fps, integrator=integrator)
+
+    state = np.zeros((1, 12))
+    state[0, 4] = -10
+    dynamics.setState(state)
+
+    states = np.empty((len(t), 1, 12))
+
+    start = time.perf_counter()
+
+    for k, m in enumerate(motors):
+        dynamics.setMotors(m[np.newaxis])
+        dynamics.update()
+        dynamics.getState(states[k])
+
+    return states[:,0], (time.perf_counter() - start) / len(t)
+
+def main():
+
+    for fps in (50, 25, 12.5):
+
+        reference, _ = fly('rk45', fps)
+
+        print('%g fps' % fps)
+
+        for name in INTEGRATORS:
+
+            if name == 'rk45':
+                continue
+
+            states, seconds = fly(name, fps)
+
+            error = np.abs(states - reference)
+
+            print('  %-13s  position %8.2e m  angle %8.2e rad  %5.0f usec/step' %
+                  (name, error[:,0:6:2].max(), error[:,6::2].max(), seconds * 1e6))
+
+if __name__ == '__main__':
+
+    main()
@@ -25,38 +25,102 @@ Copyright (C) 2019 Simon D. Levy
 MIT License
 '''
 
+from math import atan2, asin
+
 import numpy as np
 
+from gym_copter.dynamics.integrators import makeIntegrator
+from gym_copter.dynamics.frames import mix
+from gym_copter.dynamics.jacobians import jacobians
+from gym_copter.dynamics.quaternion import eulerToQuaternion, quaternionRotate
+
 class Parameters:
     '''
-    Class for parameters from the table below Equation 3
+    Class for parameters from the table below Equation 3, together with the
+    derived coefficients used by the dynamics, which are computed once here.
+    Parameters are immutable, and can be packed into a row of floats for a
+    parameter table (see parameterTable).
     '''
 
+    # Constructor arguments
+    ARGUMENTS = ('b', 'd', 'm', 'l', 'Ix', 'Iy', 'Iz', 'Jr', 'maxrpm')
+
+    # Derived coefficients: full-throttle motor speed in rad/s, reciprocals of
+    # mass and inertias, gyroscopic coefficients of Equation 12, and the
+    # roll/pitch thrust factor of Equation 6
+    DERIVED = ('maxOmega', 'invm', 'invIx', 'invIy', 'invIz', 'gyroX', 'gyroY', 'gyroZ', 'JrIx', 'JrIy', 'lb')
+
+    # Columns of a packed parameter row
+    COLUMNS = ARGUMENTS + DERIVED
+
+    __slots__ = COLUMNS
+
     def __init__(self, b,  d,  m,  l,  Ix,  Iy,  Iz,  Jr, maxrpm):
-   
-        self.b = b
-        self.d = d
-        self.m = m
-        self.l = l
-        self.Ix = Ix
-        self.Iy = Iy
-        self.Iz = Iz
-        self.Jr = Jr
-
-        self.maxrpm = maxrpm
 
-class MultirotorDynamics:
+        values = (b, d, m, l, Ix, Iy, Iz, Jr, maxrpm) + derivedParameters(b, d, m, l, Ix, Iy, Iz, Jr, maxrpm)
+
+        for name, value in zip(self.COLUMNS, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+
+        raise AttributeError('Parameters are immutable')
+
+    def __delattr__(self, name):
+
+        raise AttributeError('Parameters are immutable')
+
+    def __reduce__(self):
+
+        return Parameters, tuple(getattr(self, name) for name in self.ARGUMENTS)
+
+    def __repr__(self):
+
+        return 'Parameters(%s)' % ', '.join('%s=%r' % (name, getattr(self, name)) for name in self.ARGUMENTS)
+
+    def pack(self):
+        '''
+        Returns the values of COLUMNS as an array
+        '''
+        return np.array([getattr(self, name) for name in self.COLUMNS])
+
+def derivedParameters(b,  d,  m,  l,  Ix,  Iy,  Iz,  Jr, maxrpm):
+    '''
+    Returns the values of Parameters.DERIVED; works on floats or on arrays
+    of per-vehicle values
     '''
-    Abstract class for multirotor dynamics.  You implementing class should define the following methods:
 
-        # roll right
-        u2(omega^2)
+    return (maxrpm * np.pi / 30,
+            1 / m, 1 / Ix, 1 / Iy, 1 / Iz,
+            (Iy - Iz) / Ix, (Iz - Ix) / Iy, (Ix - Iy) / Iz,
+            Jr / Ix, Jr / Iy,
+            l * b)
+
+def parameterTable(params, vehicleCount=1, dtype=float):
+    '''
+    Returns an (N, len(Parameters.COLUMNS)) table with one row of parameters
+    per vehicle, indexed by the P_* column constants.  The table is stored
+    column-major, so that each coefficient is a contiguous (N,) array.
+    params Parameters shared by vehicleCount vehicles, or a sequence of one
+    Parameters per vehicle
+    '''
 
-        # pitch forward
-        u3(omega^2)
+    if isinstance(params, Parameters):
+        rows = np.tile(params.pack(), (vehicleCount, 1))
+    else:
+        rows = [p.pack() for p in params]
 
-        # yaw cw
-        u4(omega^2)
+    return np.asfortranarray(rows, dtype=dtype)
+
+# Columns of a parameter table
+(P_B, P_D, P_M, P_L, P_IX, P_IY, P_IZ, P_JR, P_MAXRPM,
+ P_MAXOMEGA, P_INVM, P_INVIX, P_INVIY, P_INVIZ, P_GYROX, P_GYROY, P_GYROZ, P_JRIX, P_JRIY, P_LB) = range(len(Parameters.COLUMNS))
+
+class MultirotorDynamics:
+    '''
+    Class for multirotor dynamics.  The motor layout is given by a Frame
+    (see frames.py), whose mixer matrix turns motor speeds into the values
+    of Equation 6.
     '''
 
     '''
@@ -91,22 +155,72 @@ class MultirotorDynamics:
     LANDING_VEL_Y  = 1.0
     LANDING_ANGLE  = np.pi/4
 
-    def __init__(self, params, motorCount, framesPerSecond, g=G):
+    # Euler-angle attitude unless the constructor says otherwise
+    _quat = None
+    _eulerStale = False
+
+    def __init__(self, params, frame, framesPerSecond, g=G, integrator='euler', substeps=1, attitude='euler', contact='step'):
         '''
         Constructor
         Initializes kinematic pose, with flag for whether we're airbone (helps with testing gravity).
+        frame Frame object describing the motor layout
+        integrator one of 'euler', 'semi-implicit', 'verlet', 'rk4', 'rk45'
+        substeps number of physics steps per call to update()
+        attitude 'euler' to integrate the Euler angles directly, or
+        'quaternion' to keep the attitude as a unit quaternion, rotated by
+        the angular rates each physics step.  This is not a speedup: the
+        Euler angles in the state are converted from the quaternion whenever
+        the state is read after an update(), and a step costs about the same
+        as with Euler attitude.
+        The rate states PHI_DOT, THETA_DOT and PSI_DOT are then taken as
+        body-frame angular rates (p, q, r) rather than Euler-angle rates.
+        The two agree only near level flight, so with any sizeable attitude
+        the two modes follow different trajectories.
+        Quaternion attitude works with the 'euler' and 'semi-implicit'
+        integrators, and not with batch() or batched rollout().
+        contact 'step' to detect touchdown at the first physics step that
+        starts below ground, or 'event' to cut the physics step that crosses
+        the ground short at the crossing, and judge the landing there (see
+        update())
         '''
+        if attitude not in ('euler', 'quaternion'):
+            raise ValueError('Unknown attitude %r; choose euler or quaternion' % attitude)
+
+        if contact not in ('step', 'event'):
+            raise ValueError('Unknown contact %r; choose step or event' % contact)
+
+        if attitude == 'quaternion' and integrator not in ('euler', 'semi-implicit'):
+            raise ValueError('Quaternion attitude supports the euler and semi-implicit integrators, not %r' % integrator)
+
         self._p = params
-        self._motorCount = motorCount
+        self._frame = frame
+        self._motorCount = motorCount = frame.motorCount
+        self._mixer = frame.mixer(params)
         self._fps = framesPerSecond
         self.g = g
 
+        self._integrator = integrator
+        self._integrate = makeIntegrator(integrator, (12,))
+        self._substeps = substeps
+        self._contact = contact
+
         self._omegas  = np.zeros(motorCount)
 
         # Always start at location (0,0,0) with zero velocities
         self._x    = np.zeros(12)
         self._dxdt = np.zeros(12)
 
+        # Attitude quaternion, or None for Euler angles; _eulerStale is True
+        # while the angles in _x lag behind the quaternion
+        self._quat = [1., 0., 0., 0.] if attitude == 'quaternion' else None
+        self._eulerStale = False
+
+        # Scratch buffers, so that setMotors() and update() allocate no arrays
+        self._U        = np.zeros(5)
+        self._mixwork  = np.zeros((5, motorCount))
+        self._accelNED = np.zeros(3)
+        self._x0       = np.zeros(12)
+
         # Start on ground
         self._status = self.STATUS_LANDED
 
@@ -130,29 +244,29 @@ class MultirotorDynamics:
         '''
 
         # Convert the  motor values to radians per second
-        self._omegas = self._computeMotorSpeed(motorvals) #rad/s
-
-        # Compute overall torque from omegas before squaring
-        self._Omega = self.u4(self._omegas)
-
-        # Overall thrust is sum of squared omegas
-        omegas2 = self._omegas**2
-        self._U1 = np.sum(self._p.b * omegas2)
+        self._computeMotorSpeed(motorvals, self._omegas) #rad/s
 
-        # Use the squared Omegas to implement the rest of Eqn. 6
-        self._U2 = self._p.l * self._p.b * self.u2(omegas2)
-        self._U3 = self._p.l * self._p.b * self.u3(omegas2)
-        self._U4 = self._p.d * self.u4(omegas2)
+        # Thrust, roll, pitch, yaw and overall torque with one product
+        self._U1, self._U2, self._U3, self._U4, self._Omega = mix(self._mixer, self._omegas, self._U, self._mixwork)
         
     def update(self):
         '''
         Updates state.
+
+        With event contact, a physics step that takes the vehicle from
+        above to below ground is cut short where the altitude crosses zero.
+        The crossing time is found by interpolating the altitude linearly
+        over the step, and the state by interpolating it to that time, which
+        for the Euler integrator is exactly an Euler step of that length.
+        The landing criteria are then applied to the vehicle's velocity and
+        attitude at contact, so that landing outcomes do not depend on the
+        frame rate.  A step that starts below ground (e.g. after setState())
+        has no crossing to find, and is handled as with step contact.
         '''
 
-        # Use the current Euler angles to rotate the orthogonal thrust vector into the inertial frame.
+        # Use the current attitude to rotate the orthogonal thrust vector into the inertial frame.
         # Negate to use NED.
-        euler = ( self._x[6], self._x[8], self._x[10] )
-        accelNED = MultirotorDynamics._bodyZToInertial(-self._U1 / self._p.m, euler)
+        accelNED = self._thrustToInertial(-self._U1 * self._p.invm)
 
         # Compute net vertical acceleration by subtracting gravity
         netz = accelNED[2] + self.g
@@ -165,111 +279,424 @@ class MultirotorDynamics:
         # Leveling mode: change roll, pitch angles for  rendering
         if self._status == self.STATUS_LEVELING:
 
+                self._syncEuler()
                 self._x[self.STATE_PHI] = 0
                 self._x[self.STATE_THETA] = 0
                 self._status = self.STATUS_LANDED
 
-        # Once airborne, we can update dynamics
+                if self._quat is not None:
+                    self._quat = eulerToQuaternion(self._x[6::2]).tolist()
+
+        # Once airborne, we can update dynamics, in one or more physics steps
         elif self._status == self.STATUS_AIRBORNE:
 
-            # If we've descended to the ground
-            if self._x[self.STATE_Z] > 0 and self._x[self.STATE_Z_DOT] > 0:
+            dt = 1./(self._fps * self._substeps)
+
+            for k in range(self._substeps):
+
+                # Later physics steps need acceleration at the new attitude
+                if k > 0:
+                    accelNED = self._thrustToInertial(-self._U1 * self._p.invm)
+                    netz = accelNED[2] + self.g
+
+                # If we've descended to the ground
+                if self._x[self.STATE_Z] > 0 and self._x[self.STATE_Z_DOT] > 0:
+                    self._touchDown()
+                    return
 
-                # Big angles indicate a crash
-                phi   = self._x[self.STATE_PHI]
-                velx  = self._x[self.STATE_Y_DOT]
-                vely  = self._x[self.STATE_Z_DOT]
-                if vely > self.LANDING_VEL_Y or abs(velx)>self.LANDING_VEL_X or abs(phi)>self.LANDING_ANGLE: 
-                    self._status = self.STATUS_CRASHED
+                # Compute the state derivatives using Equation 12
+                self._computeStateDerivative(accelNED, netz)
 
-                # Small angles indicate leveling
-                else:
-                    self._status = self.STATUS_LEVELING
+                # Add instantaneous perturbation
+                self._dxdt[1::2] += self._perturb
 
-                return
+                # Once airborne, inertial-frame acceleration is same as NED acceleration
+                self._inertialAccel[:] = accelNED
 
-            # Compute the state derivatives using Equation 12
-            self._computeStateDerivative(accelNED, netz)
+                # With quaternion attitude, the angles integrate to a body-frame rotation for this step
+                if self._quat is not None:
+                    self._x[6::2] = 0
 
-            # Add instantaneous perturbation
-            self._dxdt[1::2] += self._perturb
+                if self._contact == 'event':
+                    self._x0[:] = self._x
 
-            # Compute state as first temporal integral of first temporal derivative
-            self._x += 1./self._fps * self._dxdt
+                # Compute state as temporal integral of first temporal derivative
+                self._integrate(self._stateDerivative, self._x, self._dxdt, dt)
 
-            # Once airborne, inertial-frame acceleration is same as NED acceleration
-            self._inertialAccel = accelNED.copy()
+                # Event contact: back up to where this step crossed the ground, if it started above it
+                crossed = self._contact == 'event' and self._x0[self.STATE_Z] <= 0 < self._x[self.STATE_Z]
+                if crossed:
+                    z0, z1 = self._x0[self.STATE_Z], self._x[self.STATE_Z]
+                    self._x -= self._x0
+                    self._x *= z0 / (z0 - z1)
+                    self._x += self._x0
+
+                if self._quat is not None:
+                    self._quat = quaternionRotate(self._quat, self._x[6::2].tolist())
+                    self._eulerStale = True
+
+                if crossed:
+                    self._touchDown()
+                    return
 
         # Reset instantaneous perturbation
-        self._perturb = np.zeros(6)
+        self._perturb.fill(0)
+
+    def reinit(self, state=None):
+        '''
+        Returns the vehicle to the condition it was constructed in, on the
+        ground at (0,0,0) with zero velocities, reusing all arrays, so that
+        environments can reset without building a new dynamics object.
+        state optional state to set afterwards, as with setState()
+        '''
+        self._omegas.fill(0)
+        self._x.fill(0)
+        self._dxdt.fill(0)
+        self._perturb.fill(0)
+
+        if self._quat is not None:
+            self._quat = [1., 0., 0., 0.]
+        self._eulerStale = False
+
+        self._status = self.STATUS_LANDED
+
+        self._U1 = self._U2 = self._U3 = self._U4 = self._Omega = 0
+
+        # Rightmost column of the rotation matrix of a level vehicle, as in _bodyZToInertial()
+        self._inertialAccel[:] = 0, 0, 1
+        self._inertialAccel *= -self.g
+
+        # Forget any adaptive step size
+        if hasattr(self._integrate, 'h'):
+            self._integrate.h = np.nan
+
+        if state is not None:
+            self.setState(state)
 
-    def getState(self):
+    def getState(self, out=None):
         '''
-        Returns a copy of the state vector as a tuple
+        Returns a copy of the state vector as a tuple, or copies it into the
+        array out (of length 12) and returns that array
         '''
-        return tuple(self._x)
+        self._syncEuler()
+
+        if out is None:
+            return tuple(self._x)
+
+        out[:] = self._x
+
+        return out
 
     def setState(self, state):
         '''
         Sets the state to the values specified in a sequence
         '''
-        self._x = np.array(state)
+        self._x[:] = state
         self._status = self.STATUS_AIRBORNE if self._x[self.STATE_Z] < 0 else self.STATUS_LANDED
 
+        if self._quat is not None:
+            self._quat = eulerToQuaternion(self._x[6::2]).tolist()
+            self._eulerStale = False
+
+    def getQuaternion(self):
+        '''
+        Returns the attitude as a unit quaternion [w, x, y, z] (see quaternion.py)
+        '''
+        if self._quat is None:
+            return eulerToQuaternion(self._x[6::2])
+
+        return np.array(self._quat)
+
     def getStatus(self):
 
         return self._status
 
     def perturb(self, force):
 
-        self._perturb = force / self._p.m
+        np.divide(force, self._p.m, out=self._perturb)
+
+    def rollout(self, motorvals):
+        '''
+        Runs an open-loop sequence of motor values from the current state,
+        leaving the simulator state unchanged.
+        motorvals (T, motorCount) array, or (N, T, motorCount) for N
+        sequences, which are run together in the BatchMultirotorDynamics
+        returned by batch()
+        returns (T, 12) states and (T,) flight statuses after each update(),
+        with a leading dimension N for batched sequences
+        Only the batched form is accelerated: a single sequence is stepped
+        with setMotors() and update(), at the cost of stepping by hand,
+        which for one vehicle is several times cheaper than a batch of one.
+        '''
+        motorvals = np.asarray(motorvals)
+
+        if motorvals.ndim == 2:
+            return self._rollout(motorvals)
 
-    def _computeStateDerivative(self, accelNED, netz):
+        return self.batch(len(motorvals)).rollout(motorvals)
+
+    def batch(self, vehicleCount):
+        '''
+        Returns a BatchMultirotorDynamics of vehicleCount copies of this
+        vehicle, each starting in its current state
+        Raises ValueError for quaternion attitude, which the batched
+        dynamics do not support.
+        '''
+        if self._quat is not None:
+            raise ValueError('Batched dynamics do not support quaternion attitude')
+
+        from gym_copter.dynamics.batch import BatchMultirotorDynamics
+
+        batch = BatchMultirotorDynamics(self._p, self._frame, vehicleCount, self._fps, self.g, self._integrator,
+                                        self._substeps, contact=self._contact)
+        batch.set_snapshot(np.tile(self.get_snapshot(), (vehicleCount,1)))
+
+        return batch
+
+    def getJacobians(self, state=None, motorvals=None):
+        '''
+        Linearizes the airborne dynamics of Equation 12 (see jacobians.py).
+        state state to linearize about, defaulting to the current state
+        motorvals motor values to linearize about, defaulting to the last ones set
+        returns the Jacobians of the state derivative with respect to the
+        state (12 x 12), to [U1, U2, U3, U4, Omega] (12 x 5) and to the motor
+        values (12 x motorCount), each with a leading dimension N for
+        BatchMultirotorDynamics
+        '''
+        mixer = np.asarray(self._mixer)
+
+        self._syncEuler()
+
+        x = np.asarray(self._x if state is None else state, dtype=float)
+
+        if motorvals is None:
+            omegas = np.asarray(self._omegas, dtype=float)
+            U = np.stack(np.broadcast_arrays(self._U1, self._U2, self._U3, self._U4, self._Omega), axis=-1)
+
+        else:
+            omegas = np.asarray(self._computeMotorSpeed(motorvals), dtype=float)
+            U = mix(mixer, omegas)
+
+        return jacobians(self._vehicleParameters(), mixer, x, U, omegas)
+
+    def snapshotSize(self):
+        '''
+        Returns the length of the arrays used by get_snapshot() and set_snapshot()
+        '''
+        return 40 + self._motorCount + (0 if self._quat is None else 4)
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as a flat array: state, state
+        derivative, inertial acceleration, perturbation, motor speeds,
+        Equation 6 values, flight status and integrator step size, followed
+        by the attitude quaternion if there is one.
+        out optional array of length snapshotSize() to fill
+        '''
+        if out is None:
+            out = np.empty(self.snapshotSize())
+
+        self._syncEuler()
+
+        m = self._motorCount
+
+        out[0:12]  = self._x
+        out[12:24] = self._dxdt
+        out[24:27] = self._inertialAccel
+        out[27:33] = self._perturb
+        out[33:33+m] = self._omegas
+        out[33+m] = self._U1
+        out[34+m] = self._U2
+        out[35+m] = self._U3
+        out[36+m] = self._U4
+        out[37+m] = self._Omega
+        out[38+m] = self._status
+        out[39+m] = getattr(self._integrate, 'h', np.nan)
+
+        if self._quat is not None:
+            out[40+m:44+m] = self._quat
+
+        return out
+
+    def set_snapshot(self, snapshot):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        m = self._motorCount
+
+        self._x[:]             = snapshot[0:12]
+        self._dxdt[:]          = snapshot[12:24]
+        self._inertialAccel[:] = snapshot[24:27]
+        self._perturb[:]       = snapshot[27:33]
+        self._omegas[:]        = snapshot[33:33+m]
+
+        self._U1, self._U2, self._U3, self._U4, self._Omega = snapshot[33+m:38+m]
+
+        self._status = int(snapshot[38+m])
+
+        if hasattr(self._integrate, 'h'):
+            self._integrate.h = snapshot[39+m]
+
+        if self._quat is not None:
+            self._quat = snapshot[40+m:44+m].tolist()
+            self._eulerStale = False
+
+    def _thrustToInertial(self, bodyZ):
+        '''
+        Rotates a body-frame thrust acceleration into the inertial frame,
+        using the attitude quaternion if there is one
+        '''
+
+        if self._quat is None:
+            return MultirotorDynamics._bodyZToInertial(bodyZ, (self._x[6], self._x[8], self._x[10]), self._accelNED)
+
+        w, x, y, z = self._quat
+
+        # This is the rightmost column of the body-to-inertial rotation matrix
+        return [bodyZ * 2 * (x * z + w * y), bodyZ * 2 * (y * z - w * x), bodyZ * (1 - 2 * (x * x + y * y))]
+
+    def _syncEuler(self):
+        '''
+        Brings the Euler angles in the state up to date with the attitude quaternion
+        '''
+
+        if self._eulerStale:
+
+            w, x, y, z = self._quat
+
+            self._x[6]  = atan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y))
+            self._x[8]  = asin(max(-1, min(1, 2 * (w * y - z * x))))
+            self._x[10] = atan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))
+
+            self._eulerStale = False
+
+    def _rollout(self, motorvals):
+        '''
+        Steps through a (..., T, motorCount) array of motor values with
+        setMotors() and update(), recording states and statuses, then
+        restores the starting state
+        '''
+        snapshot = self.get_snapshot()
+
+        count = motorvals.shape[-2]
+        shape = motorvals.shape[:-2]
+
+        states = np.empty(shape + (count, 12), np.asarray(self._x).dtype)
+        statuses = np.empty(shape + (count,), dtype=int)
+
+        for k in range(count):
+            self.setMotors(motorvals[...,k,:])
+            self.update()
+            self.getState(states[...,k,:])
+            statuses[...,k] = self.getStatus()
+
+        self.set_snapshot(snapshot)
+
+        return states, statuses
+
+    def _touchDown(self):
+        '''
+        Judges a landing by the current velocity and attitude
+        '''
+
+        self._syncEuler()
+
+        # Big angles indicate a crash
+        phi   = self._x[self.STATE_PHI]
+        velx  = self._x[self.STATE_Y_DOT]
+        vely  = self._x[self.STATE_Z_DOT]
+        if vely > self.LANDING_VEL_Y or abs(velx)>self.LANDING_VEL_X or abs(phi)>self.LANDING_ANGLE: 
+            self._status = self.STATUS_CRASHED
+
+        # Small angles indicate leveling
+        else:
+            self._status = self.STATUS_LEVELING
+
+    def _vehicleParameters(self):
+        '''
+        Returns the Parameters, or an object with the same attributes holding one value per vehicle
+        '''
+        return self._p
+
+    def _computeStateDerivative(self, accelNED, netz, x=None, dxdt=None):
         '''
         Implements Equation 12 computing temporal first derivative of state.
         Should fill _dxdx[0..11] with appropriate values.
         accelNED acceleration in NED inertial frame
         netz accelNED[2] with gravitational constant added in
+        x, dxdt optional state to differentiate and array to fill, defaulting to _x and _dxdt
         '''
 
-        phidot = self._x[self.STATE_PHI_DOT]
-        thedot = self._x[self.STATE_THETA_DOT]
-        psidot = self._x[self.STATE_PSI_DOT]
+        x = self._x if x is None else x
+        dxdt = self._dxdt if dxdt is None else dxdt
+
+        phidot = x[self.STATE_PHI_DOT]
+        thedot = x[self.STATE_THETA_DOT]
+        psidot = x[self.STATE_PSI_DOT]
 
         p = self._p
 
-        self._dxdt[self.STATE_X]         = self._x[self.STATE_X_DOT]
-        self._dxdt[self.STATE_X_DOT]     = accelNED[0]         
-        self._dxdt[self.STATE_Y]         = self._x[self.STATE_Y_DOT]
-        self._dxdt[self.STATE_Y_DOT]     = accelNED[1] + self._perturb[1]
-        self._dxdt[self.STATE_Z]         = self._x[self.STATE_Z_DOT]
-        self._dxdt[self.STATE_Z_DOT]     = netz                
-        self._dxdt[self.STATE_PHI]       = phidot                                                                               
-        self._dxdt[self.STATE_PHI_DOT]   = psidot * thedot * (p.Iy - p.Iz) / p.Ix - p.Jr / p.Ix * thedot * self._Omega + self._U2 / p.Ix    
-        self._dxdt[self.STATE_THETA]     = thedot                                                                               
-        self._dxdt[self.STATE_THETA_DOT] = -(psidot * phidot * (p.Iz - p.Ix) / p.Iy + p.Jr / p.Iy * phidot * self._Omega + self._U3 / p.Iy) 
-        self._dxdt[self.STATE_PSI]       = psidot                                                                               
-        self._dxdt[self.STATE_PSI_DOT]   = thedot * phidot * (p.Ix - p.Iy) / p.Iz + self._U4 / p.Iz                                   
-
-    def _computeMotorSpeed(self, motorvals):
+        dxdt[self.STATE_X]         = x[self.STATE_X_DOT]
+        dxdt[self.STATE_X_DOT]     = accelNED[0]         
+        dxdt[self.STATE_Y]         = x[self.STATE_Y_DOT]
+        dxdt[self.STATE_Y_DOT]     = accelNED[1] + self._perturb[1]
+        dxdt[self.STATE_Z]         = x[self.STATE_Z_DOT]
+        dxdt[self.STATE_Z_DOT]     = netz                
+        dxdt[self.STATE_PHI]       = phidot                                                                               
+        dxdt[self.STATE_PHI_DOT]   = psidot * thedot * p.gyroX - p.JrIx * thedot * self._Omega + self._U2 * p.invIx
+        dxdt[self.STATE_THETA]     = thedot                                                                               
+        dxdt[self.STATE_THETA_DOT] = -(psidot * phidot * p.gyroY + p.JrIy * phidot * self._Omega + self._U3 * p.invIy)
+        dxdt[self.STATE_PSI]       = psidot                                                                               
+        dxdt[self.STATE_PSI_DOT]   = thedot * phidot * p.gyroZ + self._U4 * p.invIz
+
+    def _stateDerivative(self, x, dxdt):
+        '''
+        Derivative function for the higher-order integrators: fills dxdt with
+        the temporal first derivative at state x, including any perturbation,
+        holding the motors fixed
+        '''
+
+        accelNED = MultirotorDynamics._bodyZToInertial(-self._U1 * self._p.invm, (x[6], x[8], x[10]), self._accelNED)
+
+        self._computeStateDerivative(accelNED, accelNED[2] + self.g, x, dxdt)
+
+        dxdt[1::2] += self._perturb
+
+    def _computeMotorSpeed(self, motorvals, out=None):
         '''
         Computes motor speed base on motor value
         motorval motor values in [0,1]
+        out optional array to receive the result
         return motor speed in rad/s
         '''
-        return np.array(motorvals) * self._p.maxrpm * np.pi / 30
+        if out is None:
+            return np.array(motorvals, dtype=self._x.dtype) * self._p.maxOmega
+
+        # Copy first so that the scaling is always done in double precision
+        out[:] = motorvals
+        out *= self._p.maxOmega
+
+        return out
 
-    def _bodyZToInertial(bodyZ, rotation):
+    def _bodyZToInertial(bodyZ, rotation, out=None):
         '''
         _bodyToInertial method optimized for body X=Y=0
+        out optional array of length 3 to receive the result
         '''
     
         cph, cth, cps, sph, sth, sps = MultirotorDynamics._sincos(rotation)
 
         # This is the rightmost column of the body-to-inertial rotation matrix
-        R = np.array([sph * sps + cph * cps * sth, cph * sps * sth - cps * sph, cph * cth])
+        if out is None:
+            R = np.array([sph * sps + cph * cps * sth, cph * sps * sth - cps * sph, cph * cth])
+            return bodyZ * R
 
-        return bodyZ * R
+        out[0] = sph * sps + cph * cps * sth
+        out[1] = cph * sps * sth - cps * sph
+        out[2] = cph * cth
+        out *= bodyZ
+
+        return out
 
     def _inertialToBody(inertial, rotation):
     
@@ -296,15 +723,6 @@ class MultirotorDynamics:
 
         return np.dot(R, body)
 
-    def _eulerToQuaternion(euler):
-
-        cph, cth, cps, sph, sth, sps = MultirotorDynamics._sincos(euler/2)
-
-        return [[ cph * cth * cps + sph * sth * sps],
-                [cph * sth * sps - sph * cth * cps],
-                [-cph * sth * cps - sph * cth * sps],
-                [cph * cth * sps - sph * sth * cps]]
-
     def _sincos(angles):
 
         phi, the, psi = angles
@@ -0,0 +1,445 @@
+'''
+Batched multirotor dynamics: advances N vehicles at once using contiguous
+(N, 12) state and (N, motorCount) motor arrays.
+
+The per-vehicle flight-status state machine of MultirotorDynamics is
+reproduced using boolean masks, so a single call to update() steps the
+whole fleet without any Python-level branching on individual vehicles.
+
+Vehicle parameters are held in a packed (N, k) parameter table (see
+parameterTable), so vehicles may differ in their parameters as well as in
+their frames, and setParameters() can change them between episodes (e.g.
+for domain randomization) without affecting the vectorized update.
+
+With dtype=np.float32, all arrays are single-precision, halving the memory
+traffic of large batches.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+from types import SimpleNamespace
+
+import numpy as np
+
+from gym_copter.dynamics import MultirotorDynamics, Parameters, parameterTable, derivedParameters
+from gym_copter.dynamics import P_B, P_D, P_LB, P_M, P_MAXOMEGA, P_INVM, P_INVIX, P_INVIY, P_INVIZ, P_GYROX, P_GYROY, P_GYROZ, P_JRIX, P_JRIY
+from gym_copter.dynamics.integrators import makeIntegrator
+from gym_copter.dynamics.frames import mix
+
+class BatchMultirotorDynamics(MultirotorDynamics):
+    '''
+    Class for batched multirotor dynamics.
+    '''
+
+    def __init__(self, params, frame, vehicleCount, framesPerSecond, g=MultirotorDynamics.G, integrator='euler', substeps=1,
+                 dtype=float, contact='step'):
+        '''
+        Constructor
+        Initializes all vehicles on the ground at (0,0,0) with zero velocities.
+        params Parameters shared by all vehicles, or a sequence of one
+        Parameters per vehicle
+        frame a Frame shared by all vehicles, or a sequence of one Frame per
+        vehicle for a heterogeneous fleet; motor arrays then have as many
+        columns as the largest frame, and unused columns are ignored
+        integrator one of 'euler', 'semi-implicit', 'verlet', 'rk4', 'rk45'; with 'rk45'
+        the adaptive step size is shared by the whole batch
+        substeps number of physics steps per call to update()
+        dtype floating-point type of the state and all other arrays
+        contact 'step' or 'event', as for MultirotorDynamics
+        '''
+        if integrator == 'rk45' and np.finfo(dtype).eps > 1e-9:
+            raise ValueError('The rk45 integrator needs double precision')
+
+        if contact not in ('step', 'event'):
+            raise ValueError('Unknown contact %r; choose step or event' % contact)
+
+        self._p = params
+        self._frame = frame
+
+        # One row of parameters per vehicle
+        self._params = parameterTable(params, vehicleCount, dtype)
+
+        if hasattr(frame, 'motorCount') and isinstance(params, Parameters):
+            motorCount = frame.motorCount
+            self._mixer = frame.mixer(params).astype(dtype)
+
+        else:
+            frames = [frame] * vehicleCount if hasattr(frame, 'motorCount') else frame
+            params = [params] * vehicleCount if isinstance(params, Parameters) else params
+            motorCount = max(f.motorCount for f in frames)
+            self._mixer = np.zeros((vehicleCount, 5, motorCount), dtype)
+            for mixer, f, p in zip(self._mixer, frames, params):
+                mixer[:,:f.motorCount] = f.mixer(p)
+
+        # Motor presence, roll, pitch and yaw factors, for rebuilding mixers in setParameters()
+        if hasattr(frame, 'motorCount'):
+            self._factors = np.array([(1,) * motorCount, frame.roll, frame.pitch, frame.yaw], dtype=float)
+        else:
+            self._factors = np.zeros((vehicleCount, 4, motorCount))
+            for factors, f in zip(self._factors, frame):
+                factors[:,:f.motorCount] = (1,) * f.motorCount, f.roll, f.pitch, f.yaw
+
+        self._motorCount = motorCount
+        self._vehicleCount = vehicleCount
+        self._fps = framesPerSecond
+        self.g = g
+
+        self._integrator = integrator
+        self._integrate = makeIntegrator(integrator, (vehicleCount, 12), dtype)
+        self._substeps = substeps
+        self._contact = contact
+
+        self._omegas  = np.zeros((vehicleCount, motorCount), dtype)
+
+        self._x    = np.zeros((vehicleCount, 12), dtype)
+        self._dxdt = np.zeros((vehicleCount, 12), dtype)
+
+        self._status = np.full(vehicleCount, self.STATUS_LANDED)
+
+        # Values computed in Equation 6, one per vehicle
+        self._U1 = np.zeros(vehicleCount, dtype)
+        self._U2 = np.zeros(vehicleCount, dtype)
+        self._U3 = np.zeros(vehicleCount, dtype)
+        self._U4 = np.zeros(vehicleCount, dtype)
+        self._Omega = np.zeros(vehicleCount, dtype)
+
+        # Initialize inertial frame acceleration in NED coordinates
+        self._inertialAccel = np.tile(MultirotorDynamics._bodyZToInertial(-self.g, (0,0,0)), (vehicleCount,1)).astype(dtype)
+
+        # No perturbation yet
+        self._perturb = np.zeros((vehicleCount, 6), dtype)
+
+    def setMotors(self, motorvals):
+        '''
+        Uses motor values to implement Equation 6 for every vehicle.
+        motorvals (N, motorCount) array in interval [0,1]
+        '''
+
+        self._omegas = self._computeMotorSpeed(motorvals)
+
+        # Thrust, roll, pitch, yaw and overall torque for all vehicles with one product
+        self._U1, self._U2, self._U3, self._U4, self._Omega = mix(self._mixer, self._omegas).T
+
+    def update(self, active=None):
+        '''
+        Updates state of all vehicles.
+        active optional boolean mask restricting the update to a subset of vehicles
+        '''
+
+        x = self._x
+
+        # Rotate the orthogonal thrust vector into the inertial frame; result is (N,3)
+        accelNED = MultirotorDynamics._bodyZToInertial(-self._U1 * self._params[:,P_INVM], (x[:,6], x[:,8], x[:,10])).T
+
+        netz = accelNED[:,2] + self.g
+
+        landed = self._status == self.STATUS_LANDED
+        if active is not None:
+            landed &= active
+
+        # Landed vehicles become airborne when downward acceleration has become negative
+        self._status[landed & (netz < 0)] = self.STATUS_AIRBORNE
+
+        leveling = self._status == self.STATUS_LEVELING
+        airborne = self._status == self.STATUS_AIRBORNE
+        if active is not None:
+            leveling &= active
+            airborne &= active
+
+        # Leveling mode: change roll, pitch angles for rendering
+        x[leveling, self.STATE_PHI] = 0
+        x[leveling, self.STATE_THETA] = 0
+        self._status[leveling] = self.STATUS_LANDED
+
+        dt = 1./(self._fps * self._substeps)
+
+        touched = np.zeros(self._vehicleCount, dtype=bool)
+
+        for k in range(self._substeps):
+
+            # Later physics steps need acceleration at the new attitude
+            if k > 0:
+                accelNED = MultirotorDynamics._bodyZToInertial(-self._U1 * self._params[:,P_INVM], (x[:,6], x[:,8], x[:,10])).T
+                netz = accelNED[:,2] + self.g
+
+            # Airborne vehicles that have descended to the ground
+            touchdown = airborne & (x[:,self.STATE_Z] > 0) & (x[:,self.STATE_Z_DOT] > 0)
+
+            self._touchDown(x, touchdown)
+
+            touched |= touchdown
+
+            # Remaining airborne vehicles get their dynamics updated; the others sit out later physics steps
+            airborne = airborne & ~touchdown
+
+            if not airborne.any():
+                break
+
+            dxdt = self._computeStateDerivative(accelNED, netz)
+
+            # Add instantaneous perturbation
+            dxdt[:,1::2] += self._perturb
+
+            self._dxdt[airborne] = dxdt[airborne]
+
+            # Once airborne, inertial-frame acceleration is same as NED acceleration
+            self._inertialAccel[airborne] = accelNED[airborne]
+
+            # Compute state as temporal integral of first temporal derivative
+            xnew = x.copy()
+            self._integrate(self._stateDerivative, xnew, dxdt, dt, airborne)
+
+            # Event contact: back up to where this step crossed the ground, if it started above it, and judge the landing there
+            if self._contact == 'event':
+                crossed = airborne & (x[:,self.STATE_Z] <= 0) & (xnew[:,self.STATE_Z] > 0)
+                if crossed.any():
+                    x0, x1 = x[crossed], xnew[crossed]
+                    z0 = x0[:,self.STATE_Z]
+                    tau = z0 / (z0 - x1[:,self.STATE_Z])
+                    x1 -= x0
+                    x1 *= tau[:,np.newaxis]
+                    x1 += x0
+                    xnew[crossed] = x1
+                    self._touchDown(xnew, crossed)
+                    touched |= crossed
+
+            x[airborne] = xnew[airborne]
+
+            if self._contact == 'event':
+                airborne &= ~crossed
+
+        # Reset instantaneous perturbation, except for vehicles that just touched down
+        reset = ~touched
+        if active is not None:
+            reset &= active
+        self._perturb[reset] = 0
+
+    def reinit(self, state=None, index=None):
+        '''
+        Returns all vehicles, or those selected by index, to the condition
+        they were constructed in, keeping their parameters; see
+        MultirotorDynamics.reinit()
+        state optional states to set afterwards, as with setState()
+        '''
+        whole = index is None
+        index = slice(None) if whole else index
+
+        self._omegas[index] = 0
+        self._x[index] = 0
+        self._dxdt[index] = 0
+        self._perturb[index] = 0
+
+        self._status[index] = self.STATUS_LANDED
+
+        for U in (self._U1, self._U2, self._U3, self._U4, self._Omega):
+            U[index] = 0
+
+        self._inertialAccel[index] = MultirotorDynamics._bodyZToInertial(-self.g, (0,0,0))
+
+        # The adaptive step size is shared by the batch, so only a full reinit forgets it
+        if whole and hasattr(self._integrate, 'h'):
+            self._integrate.h = np.nan
+
+        if state is not None:
+            self.setState(state, index)
+
+    def getState(self, out=None):
+        '''
+        Returns a copy of the (N,12) state array, or copies it into the array out
+        '''
+        if out is None:
+            return self._x.copy()
+
+        out[...] = self._x
+
+        return out
+
+    def setState(self, state, index=None):
+        '''
+        Sets the states of all vehicles, or of those selected by index, to the values in an array
+        '''
+        index = slice(None) if index is None else index
+        self._x[index] = state
+        self._status[index] = np.where(self._x[index, self.STATE_Z] < 0, self.STATUS_AIRBORNE, self.STATUS_LANDED)
+
+    def getStatus(self):
+        '''
+        Returns a copy of the (N,) flight-status array
+        '''
+        return self._status.copy()
+
+    def perturb(self, force, index=None):
+        '''
+        force (N,6) array, or a (6,) array applied to every vehicle
+        index optional index or boolean mask restricting the perturbation to some vehicles
+        '''
+        index = slice(None) if index is None else index
+        self._perturb[index] = np.asarray(force) / self._params[index,P_M][...,np.newaxis]
+
+    def setParameters(self, index=None, **values):
+        '''
+        Changes the parameters of all vehicles, or of those selected by
+        index, recomputing their derived coefficients and mixer matrices.
+        values Parameters constructor arguments by name (b, d, m, l, Ix, Iy,
+        Iz, Jr, maxrpm), each a scalar or an array with one value per
+        selected vehicle; parameters not given keep their current values
+        '''
+        index = slice(None) if index is None else index
+
+        unknown = set(values) - set(Parameters.ARGUMENTS)
+        if unknown:
+            raise TypeError('Unknown parameters: ' + ', '.join(sorted(unknown)))
+
+        current = self._params[index]
+
+        args = [np.asarray(values[name], dtype=float) if name in values else current[...,k].astype(float)
+                for k, name in enumerate(Parameters.ARGUMENTS)]
+
+        row = args + list(derivedParameters(*args))
+
+        self._params[index] = np.stack(np.broadcast_arrays(*row), axis=-1)
+
+        # Vehicles now need mixers of their own
+        if self._mixer.ndim == 2:
+            self._mixer = np.tile(self._mixer, (self._vehicleCount, 1, 1))
+
+        factors = self._factors if self._factors.ndim == 2 else self._factors[index]
+
+        b, d, lb = (np.asarray(row[k])[...,np.newaxis] for k in (P_B, P_D, P_LB))
+
+        self._mixer[index,0] = b * factors[...,0,:]
+        self._mixer[index,1] = lb * factors[...,1,:]
+        self._mixer[index,2] = lb * factors[...,2,:]
+        self._mixer[index,3] = d * factors[...,3,:]
+        self._mixer[index,4] = factors[...,3,:]
+
+    def rollout(self, motorvals):
+        '''
+        Runs one open-loop sequence of motor values per vehicle from the
+        current states, leaving the simulator state unchanged.
+        motorvals (N, T, motorCount) array
+        returns (N, T, 12) states and (N, T) flight statuses after each update()
+        '''
+        return self._rollout(np.asarray(motorvals))
+
+    def batch(self, vehicleCount):
+        '''
+        Not supported: a batch is already batched
+        '''
+        raise ValueError('BatchMultirotorDynamics cannot be batched again')
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as an (N, snapshotSize()) array,
+        one row per vehicle laid out as in MultirotorDynamics.get_snapshot()
+        out optional array to fill
+        '''
+        if out is None:
+            out = np.empty((self._vehicleCount, self.snapshotSize()))
+
+        m = self._motorCount
+
+        out[:,0:12]  = self._x
+        out[:,12:24] = self._dxdt
+        out[:,24:27] = self._inertialAccel
+        out[:,27:33] = self._perturb
+        out[:,33:33+m] = self._omegas
+        out[:,33+m] = self._U1
+        out[:,34+m] = self._U2
+        out[:,35+m] = self._U3
+        out[:,36+m] = self._U4
+        out[:,37+m] = self._Omega
+        out[:,38+m] = self._status
+        out[:,39+m] = getattr(self._integrate, 'h', np.nan)
+
+        return out
+
+    def set_snapshot(self, snapshot):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        m = self._motorCount
+
+        self._x[:]             = snapshot[:,0:12]
+        self._dxdt[:]          = snapshot[:,12:24]
+        self._inertialAccel[:] = snapshot[:,24:27]
+        self._perturb[:]       = snapshot[:,27:33]
+        self._omegas[:]        = snapshot[:,33:33+m]
+        self._U1[:]            = snapshot[:,33+m]
+        self._U2[:]            = snapshot[:,34+m]
+        self._U3[:]            = snapshot[:,35+m]
+        self._U4[:]            = snapshot[:,36+m]
+        self._Omega[:]         = snapshot[:,37+m]
+        self._status[:]        = snapshot[:,38+m]
+
+        # The adaptive step size is shared by the batch
+        if hasattr(self._integrate, 'h'):
+            self._integrate.h = snapshot[0,39+m]
+
+    def _computeStateDerivative(self, accelNED, netz, x=None, dxdt=None):
+        '''
+        Implements Equation 12 for all vehicles, returning an (N,12) array.
+        accelNED (N,3) acceleration in NED inertial frame
+        netz accelNED[:,2] with gravitational constant added in
+        x, dxdt optional states to differentiate and array to fill, defaulting to _x and a new array
+        '''
+
+        x = self._x if x is None else x
+
+        phidot = x[:,self.STATE_PHI_DOT]
+        thedot = x[:,self.STATE_THETA_DOT]
+        psidot = x[:,self.STATE_PSI_DOT]
+
+        P = self._params
+
+        dxdt = np.empty_like(x) if dxdt is None else dxdt
+
+        dxdt[:,self.STATE_X]         = x[:,self.STATE_X_DOT]
+        dxdt[:,self.STATE_X_DOT]     = accelNED[:,0]
+        dxdt[:,self.STATE_Y]         = x[:,self.STATE_Y_DOT]
+        dxdt[:,self.STATE_Y_DOT]     = accelNED[:,1] + self._perturb[:,1]
+        dxdt[:,self.STATE_Z]         = x[:,self.STATE_Z_DOT]
+        dxdt[:,self.STATE_Z_DOT]     = netz
+        dxdt[:,self.STATE_PHI]       = phidot
+        dxdt[:,self.STATE_PHI_DOT]   = psidot * thedot * P[:,P_GYROX] - P[:,P_JRIX] * thedot * self._Omega + self._U2 * P[:,P_INVIX]
+        dxdt[:,self.STATE_THETA]     = thedot
+        dxdt[:,self.STATE_THETA_DOT] = -(psidot * phidot * P[:,P_GYROY] + P[:,P_JRIY] * phidot * self._Omega + self._U3 * P[:,P_INVIY])
+        dxdt[:,self.STATE_PSI]       = psidot
+        dxdt[:,self.STATE_PSI_DOT]   = thedot * phidot * P[:,P_GYROZ] + self._U4 * P[:,P_INVIZ]
+
+        return dxdt
+
+    def _touchDown(self, x, touchdown):
+        '''
+        Judges the landings of the vehicles selected by a boolean mask, by their velocities and attitudes in x
+        '''
+
+        # Big angles or velocities indicate a crash, small ones indicate leveling
+        crashed = touchdown & ((x[:,self.STATE_Z_DOT] > self.LANDING_VEL_Y) |
+                               (np.abs(x[:,self.STATE_Y_DOT]) > self.LANDING_VEL_X) |
+                               (np.abs(x[:,self.STATE_PHI]) > self.LANDING_ANGLE))
+        self._status[crashed] = self.STATUS_CRASHED
+        self._status[touchdown & ~crashed] = self.STATUS_LEVELING
+
+    def _vehicleParameters(self):
+
+        return SimpleNamespace(**{name: self._params[:,k] for k, name in enumerate(Parameters.COLUMNS)})
+
+    def _computeMotorSpeed(self, motorvals):
+        '''
+        Computes the (N, motorCount) motor speeds in rad/s for motor values in [0,1]
+        '''
+        return np.array(motorvals, dtype=self._x.dtype) * self._params[:,P_MAXOMEGA,np.newaxis]
+
+    def _stateDerivative(self, x, dxdt):
+        '''
+        Derivative function for the higher-order integrators, for all vehicles
+        '''
+
+        accelNED = MultirotorDynamics._bodyZToInertial(-self._U1 * self._params[:,P_INVM], (x[:,6], x[:,8], x[:,10])).T
+
+        self._computeStateDerivative(accelNED, accelNED[:,2] + self.g, x, dxdt)
+
+        dxdt[:,1::2] += self._perturb
@@ -8,29 +8,53 @@ MIT License
 '''
 
 from gym_copter.dynamics import Parameters
-from gym_copter.dynamics.quadxap import QuadXAPDynamics
+from gym_copter.dynamics.quadxap import QuadXAPDynamics, BatchQuadXAPDynamics, ScalarQuadXAPDynamics, PlanarQuadXAPDynamics, VerticalQuadXAPDynamics
+
+PARAMS = Parameters(
+
+    # Estimated
+    5.E-06, # b force constatnt [F=b*w^2]
+    2.E-06, # d torque constant [T=d*w^2]
+
+    # https:#www.dji.com/phantom-4/info
+    1.380,  # mass [kg]
+    0.350,  # arm length [m]
+
+    # Estimated
+    2,      # Ix [kg*m^2] 
+    2,      # Iy [kg*m^2] 
+    3,      # Iz [kg*m^2] 
+    38E-04, # Jr prop inertial [kg*m^2] 
+
+    15000   # maxrpm
+    )
 
 class DJIPhantomDynamics(QuadXAPDynamics):
 
-    def __init__(self, framesPerSecond, g=QuadXAPDynamics.G):
+    def __init__(self, framesPerSecond, g=QuadXAPDynamics.G, integrator='euler', substeps=1, attitude='euler', contact='step'):
+
+        QuadXAPDynamics.__init__(self, PARAMS, framesPerSecond, g, integrator, substeps, attitude, contact)
+
+class BatchDJIPhantomDynamics(BatchQuadXAPDynamics):
+
+    def __init__(self, vehicleCount, framesPerSecond, g=BatchQuadXAPDynamics.G, integrator='euler', substeps=1, dtype=float, contact='step'):
+
+        BatchQuadXAPDynamics.__init__(self, PARAMS, vehicleCount, framesPerSecond, g, integrator, substeps, dtype, contact)
+
+class ScalarDJIPhantomDynamics(ScalarQuadXAPDynamics):
+
+    def __init__(self, framesPerSecond, g=ScalarQuadXAPDynamics.G, integrator='euler', substeps=1, contact='step'):
+
+        ScalarQuadXAPDynamics.__init__(self, PARAMS, framesPerSecond, g, integrator, substeps, contact)
 
-        params = Parameters(
+class PlanarDJIPhantomDynamics(PlanarQuadXAPDynamics):
 
-            # Estimated
-            5.E-06, # b force constatnt [F=b*w^2]
-            2.E-06, # d torque constant [T=d*w^2]
+    def __init__(self, framesPerSecond, g=PlanarQuadXAPDynamics.G, integrator='euler', substeps=1, contact='step'):
 
-            # https:#www.dji.com/phantom-4/info
-            1.380,  # mass [kg]
-            0.350,  # arm length [m]
+        PlanarQuadXAPDynamics.__init__(self, PARAMS, framesPerSecond, g, integrator, substeps, contact)
 
-            # Estimated
-            2,      # Ix [kg*m^2] 
-            2,      # Iy [kg*m^2] 
-            3,      # Iz [kg*m^2] 
-            38E-04, # Jr prop inertial [kg*m^2] 
+class VerticalDJIPhantomDynamics(VerticalQuadXAPDynamics):
 
-            15000   # maxrpm
-            )
+    def __init__(self, framesPerSecond, g=VerticalQuadXAPDynamics.G, integrator='euler', substeps=1, contact='step'):
 
-        QuadXAPDynamics.__init__(self, params, framesPerSecond, g)
+        VerticalQuadXAPDynamics.__init__(self, PARAMS, framesPerSecond, g, integrator, substeps, contact)
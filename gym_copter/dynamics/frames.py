@@ -0,0 +1,103 @@
+'''
+Frame descriptions for multirotors.
+
+A frame is described by a roll, pitch and yaw factor for each motor, in the
+style of the ArduPilot motor matrices.  Together with the vehicle
+parameters, these give a mixer matrix that turns motor speeds into the
+values [U1, U2, U3, U4, Omega] of Equation 6 with a single product:
+
+    U1    = sum_i b * omega_i^2
+    U2    = sum_i l * b * roll_i * omega_i^2     (roll right)
+    U3    = sum_i l * b * pitch_i * omega_i^2    (pitch forward)
+    U4    = sum_i d * yaw_i * omega_i^2          (yaw cw)
+    Omega = sum_i yaw_i * omega_i                (torque cw)
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+class Frame:
+    '''
+    Motor layout: one roll, pitch and yaw factor per motor.  Roll factors
+    are positive for motors on the left, pitch factors positive for motors
+    in the rear, and yaw factors +1 for counter-clockwise propellers and -1
+    for clockwise ones.
+    '''
+
+    def __init__(self, roll, pitch, yaw):
+
+        self.roll  = tuple(roll)
+        self.pitch = tuple(pitch)
+        self.yaw   = tuple(yaw)
+
+        self.motorCount = len(self.yaw)
+
+    def mixer(self, params):
+        '''
+        Returns the 5 x motorCount mixer matrix for the specified Parameters.
+        Rows 0-3 apply to squared motor speeds, row 4 to the speeds themselves.
+        '''
+
+        p = params
+
+        return np.array([[p.b] * self.motorCount,
+                         [p.lb * r for r in self.roll],
+                         [p.lb * q for q in self.pitch],
+                         [p.d * y for y in self.yaw],
+                         self.yaw], dtype=float)
+
+    def motorDirection(self, i):
+        '''
+        motor direction for animation
+        '''
+        return -self.yaw[i]
+
+def mix(mixer, omegas, out=None, work=None):
+    '''
+    Applies a mixer matrix, returning [U1, U2, U3, U4, Omega].
+    mixer (5, motorCount) matrix, or (N, 5, motorCount) for a batch of vehicles
+    omegas motor speeds, (motorCount,) or (N, motorCount)
+    out, work optional preallocated result and (..., 5, motorCount) work arrays
+    '''
+
+    if work is None:
+        work = np.empty(np.broadcast_shapes(mixer.shape[:-2], omegas.shape[:-1]) + mixer.shape[-2:],
+                        np.result_type(mixer, omegas))
+
+    # Four rows of squared motor speeds, one row of speeds
+    omegas = omegas[...,np.newaxis,:]
+    np.square(omegas, out=work[...,:4,:])
+    work[...,4:,:] = omegas
+
+    work *= mixer
+
+    return work.sum(axis=-1, out=out)
+
+# ArduPilot quad-X:  3cw 1ccw / 2ccw 4cw
+QUADXAP = Frame(roll  = (-1, +1, +1, -1),
+                pitch = (-1, +1, -1, +1),
+                yaw   = (+1, +1, -1, -1))
+
+# ArduPilot quad-+: motor 1 right, 2 left, 3 front, 4 rear
+QUADPLUS = Frame(roll  = (-1, +1,  0,  0),
+                 pitch = ( 0,  0, -1, +1),
+                 yaw   = (+1, +1, -1, -1))
+
+_S30 = 0.5
+_C30 = np.sqrt(3) / 2
+
+# ArduPilot hexa-X: motors at 90, -90, -30, 150, 30, -150 degrees
+HEXAX = Frame(roll  = (-1, +1, +_S30, -_S30, -_S30, +_S30),
+              pitch = ( 0,  0, -_C30, +_C30, -_C30, +_C30),
+              yaw   = (-1, +1, -1, +1, +1, -1))
+
+_S22 = np.sin(np.pi/8)
+_C22 = np.cos(np.pi/8)
+
+# ArduPilot octo-X: motors at 22.5, -157.5, 67.5, 157.5, -22.5, -112.5, -67.5, 112.5 degrees
+OCTOX = Frame(roll  = (-_S22, +_S22, -_C22, -_S22, +_S22, +_C22, +_C22, -_C22),
+              pitch = (-_C22, +_C22, -_S22, +_C22, -_C22, +_S22, -_S22, +_S22),
+              yaw   = (-1, -1, +1, +1, +1, +1, -1, -1))
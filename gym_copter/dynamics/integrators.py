@@ -0,0 +1,226 @@
+'''
+Numerical integrators for multirotor dynamics.
+
+Each integrator advances a state array x in place by a time step dt, given
+a derivative function f(x, out) that writes the temporal first derivative of
+x into out, and the derivative dxdt = f(x) already evaluated at the start of
+the step.  Batched states may pass a boolean mask rows selecting the
+vehicles actually being advanced; the others are integrated too, but must
+not influence the step (the adaptive integrator ignores them when judging
+its error).  States use the interleaved position/velocity layout of
+MultirotorDynamics (x[0::2] positions, x[1::2] velocities), and may carry
+leading batch dimensions.  Scratch buffers are allocated once, in the
+constructor, with the dtype of the states.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+class Euler:
+    '''
+    Explicit (forward) Euler
+    '''
+
+    def __init__(self, shape, dtype=float):
+
+        self._dx = np.zeros(shape, dtype)
+
+    def __call__(self, f, x, dxdt, dt, rows=None):
+
+        x += np.multiply(dt, dxdt, out=self._dx)
+
+class SemiImplicitEuler:
+    '''
+    Semi-implicit (symplectic) Euler: velocities are updated first, and the
+    new velocities are used to update positions
+    '''
+
+    def __init__(self, shape, dtype=float):
+
+        self._dv = np.zeros(shape[:-1] + (shape[-1]//2,), dtype)
+
+    def __call__(self, f, x, dxdt, dt, rows=None):
+
+        x[...,1::2] += np.multiply(dt, dxdt[...,1::2], out=self._dv)
+        x[...,0::2] += np.multiply(dt, x[...,1::2], out=self._dv)
+
+class VelocityVerlet:
+    '''
+    Velocity Verlet (kick-drift-kick leapfrog): velocities take a half step
+    with the derivative at the start of the step, positions a full step with
+    the half-step velocities, and velocities a second half step with the
+    derivative at the new positions.  Because the angular accelerations
+    depend on the angular rates (gyroscopic terms), that derivative is
+    evaluated with the velocities predicted to the end of the step, which
+    keeps the method second-order for them too.  Symplectic for
+    position-dependent accelerations and exact for constant ones, at the
+    cost of one extra derivative evaluation per step.
+    '''
+
+    def __init__(self, shape, dtype=float):
+
+        self._dv = np.zeros(shape[:-1] + (shape[-1]//2,), dtype)
+        self._k2 = np.zeros(shape, dtype)
+
+    def __call__(self, f, x, dxdt, dt, rows=None):
+
+        dv = self._dv
+
+        # Half kick, full drift, then predict velocities at the end of the step
+        x[...,1::2] += np.multiply(dt/2, dxdt[...,1::2], out=dv)
+        x[...,0::2] += np.multiply(dt, x[...,1::2], out=dv)
+        x[...,1::2] += np.multiply(dt/2, dxdt[...,1::2], out=dv)
+
+        f(x, self._k2)
+
+        # Replace the predicted second half kick with the one using the new derivative
+        np.subtract(self._k2[...,1::2], dxdt[...,1::2], out=dv)
+        x[...,1::2] += np.multiply(dt/2, dv, out=dv)
+
+class RK4:
+    '''
+    Classical fourth-order Runge-Kutta
+    '''
+
+    def __init__(self, shape, dtype=float):
+
+        self._k2 = np.zeros(shape, dtype)
+        self._k3 = np.zeros(shape, dtype)
+        self._k4 = np.zeros(shape, dtype)
+        self._xk = np.zeros(shape, dtype)
+
+    def __call__(self, f, x, k1, dt, rows=None):
+
+        k2, k3, k4, xk = self._k2, self._k3, self._k4, self._xk
+
+        np.multiply(dt/2, k1, out=xk)
+        xk += x
+        f(xk, k2)
+
+        np.multiply(dt/2, k2, out=xk)
+        xk += x
+        f(xk, k3)
+
+        np.multiply(dt, k3, out=xk)
+        xk += x
+        f(xk, k4)
+
+        # k1 + 2*k2 + 2*k3 + k4, summed in that order
+        np.multiply(2, k2, out=xk)
+        xk += k1
+        k3 *= 2
+        xk += k3
+        xk += k4
+        xk *= dt/6
+
+        x += xk
+
+class RK45:
+    '''
+    Adaptive Dormand-Prince 5(4) Runge-Kutta with local error control.
+    Each call covers the whole interval dt with as many internal steps as
+    the tolerances require; the step size to try next is remembered across
+    calls in the attribute h (NaN before the first call).
+    '''
+
+    A = ((),
+         (1/5,),
+         (3/40, 9/40),
+         (44/45, -56/15, 32/9),
+         (19372/6561, -25360/2187, 64448/6561, -212/729),
+         (9017/3168, -355/33, 46732/5247, 49/176, -5103/18656))
+
+    # Fifth-order weights
+    B = (35/384, 0, 500/1113, 125/192, -2187/6784, 11/84)
+
+    # Difference between fifth- and fourth-order weights, for k1..k7
+    E = (71/57600, 0, -71/16695, 71/1920, -17253/339200, 22/525, -1/40)
+
+    SAFETY      = 0.9
+    MIN_FACTOR  = 0.2
+    MAX_FACTOR  = 5.0
+
+    def __init__(self, shape, dtype=float, rtol=1e-6, atol=1e-9):
+
+        self.rtol = rtol
+        self.atol = atol
+
+        self._k = [np.zeros(shape, dtype) for _ in range(7)]
+        self._xk = np.zeros(shape, dtype)
+        self._xnew = np.zeros(shape, dtype)
+        self._err = np.zeros(shape, dtype)
+        self._scale = np.zeros(shape, dtype)
+        self._tmp = np.zeros(shape, dtype)
+        self.h = np.nan
+
+    def __call__(self, f, x, dxdt, dt, rows=None):
+
+        k, xk, xnew = self._k, self._xk, self._xnew
+        err, scale, tmp = self._err, self._scale, self._tmp
+
+        k[0][...] = dxdt
+
+        h = dt if np.isnan(self.h) else min(self.h, dt)
+        t = 0
+
+        while dt - t > 1e-12 * dt:
+
+            h = min(h, dt - t)
+
+            # Stages 2 through 6
+            for i in range(1, 6):
+                xk[...] = x
+                for j, a in enumerate(self.A[i]):
+                    xk += np.multiply(h * a, k[j], out=tmp)
+                f(xk, k[i])
+
+            # Fifth-order solution, and derivative there for error estimate (FSAL)
+            xnew[...] = x
+            for b, ki in zip(self.B, k):
+                if b != 0:
+                    xnew += np.multiply(h * b, ki, out=tmp)
+            f(xnew, k[6])
+
+            np.multiply(self.E[0], k[0], out=err)
+            for e, ki in zip(self.E[1:], k[1:]):
+                if e != 0:
+                    err += np.multiply(e, ki, out=tmp)
+            err *= h
+
+            # Error relative to atol + rtol * max(|x|, |xnew|), over the rows being advanced
+            np.maximum(np.abs(x, out=tmp), np.abs(xnew, out=scale), out=scale)
+            scale *= self.rtol
+            scale += self.atol
+            np.abs(err, out=err)
+            err /= scale
+            errnorm = np.max(err if rows is None else err[rows])
+
+            if errnorm <= 1:
+                t += h
+                x[...] = xnew
+                k[0][...] = k[6]
+
+            factor = self.MAX_FACTOR if errnorm == 0 else self.SAFETY * errnorm**-0.2
+            h *= min(self.MAX_FACTOR, max(self.MIN_FACTOR, factor))
+
+        self.h = h
+
+INTEGRATORS = {
+    'euler'         : Euler,
+    'semi-implicit' : SemiImplicitEuler,
+    'verlet'        : VelocityVerlet,
+    'rk4'           : RK4,
+    'rk45'          : RK45,
+}
+
+def makeIntegrator(name, shape, dtype=float):
+    '''
+    Returns an integrator of the specified name for states of the specified shape and dtype
+    '''
+    if name not in INTEGRATORS:
+        raise ValueError('Unknown integrator %r; choose one of %s' % (name, ', '.join(INTEGRATORS)))
+
+    return INTEGRATORS[name](shape, dtype)
@@ -0,0 +1,93 @@
+'''
+Analytic Jacobians of Equation 12, for linearizing the multirotor dynamics
+(e.g. for LQR or iLQR) without finite differences.
+
+The state derivative f(x, u) of an airborne vehicle is differentiated with
+respect to the state x, the values u = [U1, U2, U3, U4, Omega] of Equation 6,
+and, through the mixer matrix (see frames.py), the motor values.  The
+perturbation force is constant in x and u, and so does not appear.  All
+arrays may carry leading batch dimensions.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+def jacobians(params, mixer, x, U, omegas):
+    '''
+    Returns (A, B, C), the Jacobians of the state derivative with respect to
+    the state, to [U1, U2, U3, U4, Omega], and to the motor values.
+    params vehicle Parameters, or an object with the same attributes holding
+    (...) arrays of per-vehicle values
+    mixer (..., 5, motorCount) mixer matrix
+    x (..., 12) state
+    U (..., 5) values of Equation 6
+    omegas (..., motorCount) motor speeds in rad/s
+    returns (..., 12, 12), (..., 12, 5) and (..., 12, motorCount) arrays
+    '''
+
+    p = params
+
+    shape = x.shape[:-1]
+
+    A = np.zeros(shape + (12, 12))
+    B = np.zeros(shape + (12, 5))
+
+    phi,    theta,  psi    = x[...,6], x[...,8], x[...,10]
+    phidot, thedot, psidot = x[...,7], x[...,9], x[...,11]
+
+    cph, cth, cps = np.cos(phi), np.cos(theta), np.cos(psi)
+    sph, sth, sps = np.sin(phi), np.sin(theta), np.sin(psi)
+
+    # Acceleration along the body Z axis, negated for NED
+    bodyZ = -U[...,0] * p.invm
+
+    # Each position's derivative is its velocity
+    for k in range(0, 12, 2):
+        A[...,k,k+1] = 1
+
+    # Thrust rotated into the inertial frame, differentiated with respect to the Euler angles
+    A[...,1,6]  = bodyZ * (cph * sps - sph * cps * sth)
+    A[...,1,8]  = bodyZ * (cph * cps * cth)
+    A[...,1,10] = bodyZ * (sph * cps - cph * sps * sth)
+
+    A[...,3,6]  = bodyZ * (-sph * sps * sth - cps * cph)
+    A[...,3,8]  = bodyZ * (cph * sps * cth)
+    A[...,3,10] = bodyZ * (cph * cps * sth + sps * sph)
+
+    A[...,5,6]  = -bodyZ * sph * cth
+    A[...,5,8]  = -bodyZ * cph * sth
+
+    # Gyroscopic terms of the angular accelerations
+    A[...,7,9]   = psidot * p.gyroX - p.JrIx * U[...,4]
+    A[...,7,11]  = thedot * p.gyroX
+
+    A[...,9,7]   = -(psidot * p.gyroY + p.JrIy * U[...,4])
+    A[...,9,11]  = -phidot * p.gyroY
+
+    A[...,11,7]  = thedot * p.gyroZ
+    A[...,11,9]  = phidot * p.gyroZ
+
+    # Thrust enters the linear accelerations, torques the angular ones
+    B[...,1,0] = -(sph * sps + cph * cps * sth) * p.invm
+    B[...,3,0] = -(cph * sps * sth - cps * sph) * p.invm
+    B[...,5,0] = -(cph * cth) * p.invm
+
+    B[...,7,1]  = p.invIx
+    B[...,7,4]  = -p.JrIx * thedot
+    B[...,9,2]  = -p.invIy
+    B[...,9,4]  = -p.JrIy * phidot
+    B[...,11,3] = p.invIz
+
+    # Chain rule through the mixer: rows 0-3 use squared motor speeds, row 4
+    # the speeds themselves, and speeds are proportional to motor values
+    dUdomega = np.empty(np.broadcast_shapes(mixer.shape, omegas.shape[:-1] + (5, omegas.shape[-1])))
+    dUdomega[...,:4,:] = 2 * omegas[...,np.newaxis,:]
+    dUdomega[...,4,:] = 1
+    dUdomega *= mixer
+
+    C = B @ (dUdomega * np.asarray(p.maxOmega)[...,np.newaxis,np.newaxis])
+
+    return A, B, C
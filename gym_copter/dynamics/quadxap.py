@@ -16,36 +16,55 @@ MIT License
 #include "MultirotorDynamics.hpp"
 
 from gym_copter.dynamics import MultirotorDynamics
+from gym_copter.dynamics.batch import BatchMultirotorDynamics
+from gym_copter.dynamics.scalar import ScalarMultirotorDynamics
+from gym_copter.dynamics.reduced import PlanarMultirotorDynamics, VerticalMultirotorDynamics
+from gym_copter.dynamics.frames import QUADXAP
 
 class QuadXAPDynamics(MultirotorDynamics):
 
-    def __init__(self, params, framesPerSecond, g):
+    def __init__(self, params, framesPerSecond, g, integrator='euler', substeps=1, attitude='euler', contact='step'):
 
-        MultirotorDynamics.__init__(self, params, 4, framesPerSecond, g)
+        MultirotorDynamics.__init__(self, params, QUADXAP, framesPerSecond, g, integrator, substeps, attitude, contact)
 
-    def u2(self,  o):
+    def motorDirection(i):
         '''
-        roll right
+        motor direction for animation
         '''
-        return (o[1] + o[2]) - (o[0] + o[3]);
-   
+        return QUADXAP.motorDirection(i)
 
-    def u3(self,  o):
-        '''
-        pitch forward
-        '''
-        return (o[1] + o[3]) - (o[0] + o[2]);
-   
+class BatchQuadXAPDynamics(BatchMultirotorDynamics):
+    '''
+    Batched version of QuadXAPDynamics.
+    '''
 
-    def u4(self,  o):
-        '''
-        yaw cw
-        '''
-        return (o[0] + o[1]) - (o[2] + o[3]);
+    def __init__(self, params, vehicleCount, framesPerSecond, g, integrator='euler', substeps=1, dtype=float, contact='step'):
 
-    def motorDirection(i):
-        '''
-        motor direction for animation
-        '''
-        dir = (-1, -1, +1, +1)
-        return dir[i];
+        BatchMultirotorDynamics.__init__(self, params, QUADXAP, vehicleCount, framesPerSecond, g, integrator, substeps, dtype, contact)
+
+class ScalarQuadXAPDynamics(ScalarMultirotorDynamics):
+    '''
+    Pure-scalar version of QuadXAPDynamics.
+    '''
+
+    def __init__(self, params, framesPerSecond, g, integrator='euler', substeps=1, contact='step'):
+
+        ScalarMultirotorDynamics.__init__(self, params, QUADXAP, framesPerSecond, g, integrator, substeps, contact)
+
+class PlanarQuadXAPDynamics(PlanarMultirotorDynamics):
+    '''
+    Y/Z/roll-only version of QuadXAPDynamics.
+    '''
+
+    def __init__(self, params, framesPerSecond, g, integrator='euler', substeps=1, contact='step'):
+
+        PlanarMultirotorDynamics.__init__(self, params, QUADXAP, framesPerSecond, g, integrator, substeps, contact)
+
+class VerticalQuadXAPDynamics(VerticalMultirotorDynamics):
+    '''
+    Vertical-only version of QuadXAPDynamics.
+    '''
+
+    def __init__(self, params, framesPerSecond, g, integrator='euler', substeps=1, contact='step'):
+
+        VerticalMultirotorDynamics.__init__(self, params, QUADXAP, framesPerSecond, g, integrator, substeps, contact)
@@ -0,0 +1,91 @@
+'''
+Quaternion routines for multirotor attitude.
+
+Quaternions are arrays [w, x, y, z] (Hamilton convention) rotating body-frame
+vectors into the NED inertial frame.  Euler angles [phi, theta, psi] are
+roll, pitch and yaw, applied in yaw-pitch-roll (Z-Y-X) order, as in
+MultirotorDynamics.  Except for quaternionRotate, which is meant for the
+per-step update of a single vehicle, all routines accept arrays with
+leading batch dimensions.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+from math import sqrt
+
+import numpy as np
+
+def eulerToQuaternion(euler):
+    '''
+    Returns the quaternion for an array of Euler angles [phi, theta, psi]
+    '''
+
+    euler = np.asarray(euler, dtype=float)
+
+    half = euler / 2
+    cph, cth, cps = np.cos(half[...,0]), np.cos(half[...,1]), np.cos(half[...,2])
+    sph, sth, sps = np.sin(half[...,0]), np.sin(half[...,1]), np.sin(half[...,2])
+
+    return np.stack((cph * cth * cps + sph * sth * sps,
+                     sph * cth * cps - cph * sth * sps,
+                     cph * sth * cps + sph * cth * sps,
+                     cph * cth * sps - sph * sth * cps), axis=-1)
+
+def quaternionToEuler(q):
+    '''
+    Returns the Euler angles [phi, theta, psi] for a unit quaternion
+    '''
+
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+
+    return np.stack((np.arctan2(2 * (w * x + y * z), 1 - 2 * (x * x + y * y)),
+                     np.arcsin(np.clip(2 * (w * y - z * x), -1, 1)),
+                     np.arctan2(2 * (w * z + x * y), 1 - 2 * (y * y + z * z))), axis=-1)
+
+def quaternionProduct(q, r):
+    '''
+    Returns the Hamilton product q r
+    '''
+
+    w1, x1, y1, z1 = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+    w2, x2, y2, z2 = np.moveaxis(np.asarray(r, dtype=float), -1, 0)
+
+    return np.stack((w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+                     w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+                     w1 * y2 - x1 * z2 + y1 * w2 + z1 * x2,
+                     w1 * z2 + x1 * y2 - y1 * x2 + z1 * w2), axis=-1)
+
+def quaternionToRotation(q):
+    '''
+    Returns the 3 x 3 body-to-inertial rotation matrix for a unit quaternion
+    '''
+
+    w, x, y, z = np.moveaxis(np.asarray(q, dtype=float), -1, 0)
+
+    R = np.stack((1 - 2 * (y * y + z * z), 2 * (x * y - w * z),     2 * (x * z + w * y),
+                  2 * (x * y + w * z),     1 - 2 * (x * x + z * z), 2 * (y * z - w * x),
+                  2 * (x * z - w * y),     2 * (y * z + w * x),     1 - 2 * (x * x + y * y)), axis=-1)
+
+    return R.reshape(R.shape[:-1] + (3, 3))
+
+def quaternionRotate(q, rotation):
+    '''
+    Applies a small body-frame rotation vector to a single unit quaternion,
+    using the first-order product q [1, rotation/2] followed by
+    renormalization, which involves no trigonometric functions.  Works on
+    plain Python floats and returns a list.
+    '''
+
+    w, x, y, z = q
+    a, b, c = rotation[0] / 2, rotation[1] / 2, rotation[2] / 2
+
+    w, x, y, z = (w - x * a - y * b - z * c,
+                  x + w * a + y * c - z * b,
+                  y + w * b - x * c + z * a,
+                  z + w * c + x * b - y * a)
+
+    norm = sqrt(w * w + x * x + y * y + z * z)
+
+    return [w / norm, x / norm, y / norm, z / norm]
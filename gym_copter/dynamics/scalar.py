@@ -0,0 +1,314 @@
+'''
+Pure-scalar single-vehicle multirotor dynamics.
+
+For a single vehicle, NumPy's per-call overhead on 3- and 12-element arrays
+dominates the cost of an update.  This implementation keeps the state in
+plain Python lists of floats and uses the math module instead, performing
+the same floating-point operations in the same order as MultirotorDynamics
+so that trajectories are bit-for-bit identical.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+from math import sin, cos
+
+from gym_copter.dynamics import MultirotorDynamics
+
+def _sum(values):
+    '''
+    Sums a list of floats in the same order as NumPy's pairwise summation
+    (sequential below eight values, eight interleaved partial sums above)
+    '''
+
+    n = len(values)
+
+    if n < 8:
+        total = 0.
+        for value in values:
+            total += value
+        return total
+
+    r = values[:8]
+    i = 8
+    while i + 8 <= n:
+        for j in range(8):
+            r[j] += values[i+j]
+        i += 8
+
+    total = ((r[0] + r[1]) + (r[2] + r[3])) + ((r[4] + r[5]) + (r[6] + r[7]))
+
+    for value in values[i:]:
+        total += value
+
+    return total
+
+class ScalarMultirotorDynamics(MultirotorDynamics):
+    '''
+    Class for scalar multirotor dynamics.
+    '''
+
+    def __init__(self, params, frame, framesPerSecond, g=MultirotorDynamics.G, integrator='euler', substeps=1, contact='step'):
+        '''
+        Constructor
+        Initializes kinematic pose, with flag for whether we're airbone (helps with testing gravity).
+        frame Frame object describing the motor layout
+        Only the 'euler' integrator is supported.
+        substeps number of physics steps per call to update()
+        contact 'step' or 'event', as for MultirotorDynamics
+        '''
+        if integrator != 'euler':
+            raise ValueError('ScalarMultirotorDynamics supports only the euler integrator, not %r' % integrator)
+
+        if contact not in ('step', 'event'):
+            raise ValueError('Unknown contact %r; choose step or event' % contact)
+
+        self._p = params
+        self._frame = frame
+        self._motorCount = motorCount = frame.motorCount
+        self._mixer = frame.mixer(params).tolist()
+        self._fps = framesPerSecond
+        self.g = g
+
+        # Euler steps are inlined in update(), so there is no integrator object
+        self._integrator = integrator
+        self._integrate = None
+        self._substeps = substeps
+        self._contact = contact
+
+        self._omegas  = [0.] * motorCount
+
+        # Always start at location (0,0,0) with zero velocities
+        self._x    = [0.] * 12
+        self._dxdt = [0.] * 12
+
+        # Start on ground
+        self._status = self.STATUS_LANDED
+
+        # Values computed in Equation 6
+        self._U1 = 0     # total thrust
+        self._U2 = 0     # roll thrust right
+        self._U3 = 0     # pitch thrust forward
+        self._U4 = 0     # yaw thrust clockwise
+        self._Omega = 0  # torque clockwise
+
+        # Initialize inertial frame acceleration in NED coordinates
+        self._inertialAccel = ScalarMultirotorDynamics._bodyZToInertial(-self.g, (0,0,0))
+
+        # No perturbation yet
+        self._perturb = [0.] * 6
+
+    def setMotors(self, motorvals):
+        '''
+        Uses motor values to implement Equation 6.
+        motorvals in interval [0,1]
+        '''
+
+        # Convert the  motor values to radians per second
+        omegas = self._omegas = self._computeMotorSpeed(motorvals) #rad/s
+        omegas2 = [omega*omega for omega in omegas]
+
+        # Apply the mixer matrix row by row, summing as frames.mix does
+        m1, m2, m3, m4, m5 = self._mixer
+        self._U1    = _sum([c*o for c, o in zip(m1, omegas2)])
+        self._U2    = _sum([c*o for c, o in zip(m2, omegas2)])
+        self._U3    = _sum([c*o for c, o in zip(m3, omegas2)])
+        self._U4    = _sum([c*o for c, o in zip(m4, omegas2)])
+        self._Omega = _sum([c*o for c, o in zip(m5, omegas)])
+
+    def update(self):
+        '''
+        Updates state.
+        '''
+
+        x = self._x
+
+        # Use the current Euler angles to rotate the orthogonal thrust vector into the inertial frame.
+        # Negate to use NED.
+        accelNED = ScalarMultirotorDynamics._bodyZToInertial(-self._U1 * self._p.invm, (x[6], x[8], x[10]))
+
+        # Compute net vertical acceleration by subtracting gravity
+        netz = accelNED[2] + self.g
+
+        # If we're not airborne, we become airborne when downward acceleration has become negative
+        if self._status == self.STATUS_LANDED:
+            if netz < 0:
+                self._status = self.STATUS_AIRBORNE
+
+        # Leveling mode: change roll, pitch angles for  rendering
+        if self._status == self.STATUS_LEVELING:
+
+                x[self.STATE_PHI] = 0.
+                x[self.STATE_THETA] = 0.
+                self._status = self.STATUS_LANDED
+
+        # Once airborne, we can update dynamics, in one or more physics steps
+        elif self._status == self.STATUS_AIRBORNE:
+
+            dxdt = self._dxdt
+            perturb = self._perturb
+            dt = 1./(self._fps * self._substeps)
+
+            for j in range(self._substeps):
+
+                # Later physics steps need acceleration at the new attitude
+                if j > 0:
+                    accelNED = ScalarMultirotorDynamics._bodyZToInertial(-self._U1 * self._p.invm, (x[6], x[8], x[10]))
+                    netz = accelNED[2] + self.g
+
+                # If we've descended to the ground
+                if x[self.STATE_Z] > 0 and x[self.STATE_Z_DOT] > 0:
+                    self._touchDown()
+                    return
+
+                # Compute the state derivatives using Equation 12
+                self._computeStateDerivative(accelNED, netz)
+
+                # Add instantaneous perturbation
+                for k in range(6):
+                    dxdt[2*k+1] += perturb[k]
+
+                if self._contact == 'event':
+                    x0 = x[:]
+
+                # Compute state as first temporal integral of first temporal derivative
+                for k in range(12):
+                    x[k] += dt * dxdt[k]
+
+                # Once airborne, inertial-frame acceleration is same as NED acceleration
+                self._inertialAccel = accelNED
+
+                # Event contact: back up to where this step crossed the ground, if it started above it, and judge the landing there
+                if self._contact == 'event' and x0[self.STATE_Z] <= 0 < x[self.STATE_Z]:
+                    tau = x0[self.STATE_Z] / (x0[self.STATE_Z] - x[self.STATE_Z])
+                    for k in range(12):
+                        x[k] = (x[k] - x0[k]) * tau + x0[k]
+                    self._touchDown()
+                    return
+
+        # Reset instantaneous perturbation
+        self._perturb = [0.] * 6
+
+    def getState(self, out=None):
+        '''
+        Returns a copy of the state vector as a tuple, or copies it into the
+        array out (of length 12) and returns that array
+        '''
+        if out is None:
+            return tuple(self._x)
+
+        out[:] = self._x
+
+        return out
+
+    def reinit(self, state=None):
+        '''
+        Returns the vehicle to the condition it was constructed in, reusing
+        the state lists; see MultirotorDynamics.reinit()
+        '''
+        self._x[:] = self._dxdt[:] = [0.] * 12
+        self._omegas = [0.] * self._motorCount
+        self._perturb = [0.] * 6
+
+        self._status = self.STATUS_LANDED
+
+        self._U1 = self._U2 = self._U3 = self._U4 = self._Omega = 0
+
+        self._inertialAccel = ScalarMultirotorDynamics._bodyZToInertial(-self.g, (0,0,0))
+
+        if state is not None:
+            self.setState(state)
+
+    def setState(self, state):
+        '''
+        Sets the state to the values specified in a sequence
+        '''
+        self._x = [float(value) for value in state]
+        self._status = self.STATUS_AIRBORNE if self._x[self.STATE_Z] < 0 else self.STATUS_LANDED
+
+    def perturb(self, force):
+
+        m = self._p.m
+
+        self._perturb = [float(f) / m for f in force]
+
+    def batch(self, vehicleCount):
+        '''
+        Not supported: the scalar and reduced models have no batched counterpart
+        '''
+        raise ValueError('%s has no batched counterpart' % type(self).__name__)
+
+    def set_snapshot(self, snapshot):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        m = self._motorCount
+
+        values = snapshot.tolist()
+
+        self._x[:]          = values[0:12]
+        self._dxdt[:]       = values[12:24]
+        self._inertialAccel = values[24:27]
+        self._perturb       = values[27:33]
+        self._omegas        = values[33:33+m]
+
+        self._U1, self._U2, self._U3, self._U4, self._Omega = values[33+m:38+m]
+
+        self._status = int(values[38+m])
+
+    def _computeStateDerivative(self, accelNED, netz):
+        '''
+        Implements Equation 12 computing temporal first derivative of state.
+        Should fill _dxdx[0..11] with appropriate values.
+        accelNED acceleration in NED inertial frame
+        netz accelNED[2] with gravitational constant added in
+        '''
+
+        x = self._x
+        dxdt = self._dxdt
+
+        phidot = x[self.STATE_PHI_DOT]
+        thedot = x[self.STATE_THETA_DOT]
+        psidot = x[self.STATE_PSI_DOT]
+
+        p = self._p
+
+        dxdt[self.STATE_X]         = x[self.STATE_X_DOT]
+        dxdt[self.STATE_X_DOT]     = accelNED[0]
+        dxdt[self.STATE_Y]         = x[self.STATE_Y_DOT]
+        dxdt[self.STATE_Y_DOT]     = accelNED[1] + self._perturb[1]
+        dxdt[self.STATE_Z]         = x[self.STATE_Z_DOT]
+        dxdt[self.STATE_Z_DOT]     = netz
+        dxdt[self.STATE_PHI]       = phidot
+        dxdt[self.STATE_PHI_DOT]   = psidot * thedot * p.gyroX - p.JrIx * thedot * self._Omega + self._U2 * p.invIx
+        dxdt[self.STATE_THETA]     = thedot
+        dxdt[self.STATE_THETA_DOT] = -(psidot * phidot * p.gyroY + p.JrIy * phidot * self._Omega + self._U3 * p.invIy)
+        dxdt[self.STATE_PSI]       = psidot
+        dxdt[self.STATE_PSI_DOT]   = thedot * phidot * p.gyroZ + self._U4 * p.invIz
+
+    def _computeMotorSpeed(self, motorvals):
+        '''
+        Computes motor speed base on motor value
+        motorval motor values in [0,1]
+        return motor speed in rad/s
+        '''
+        maxOmega = self._p.maxOmega
+
+        return [float(m) * maxOmega for m in motorvals]
+
+    def _bodyZToInertial(bodyZ, rotation):
+        '''
+        _bodyToInertial method optimized for body X=Y=0
+        '''
+
+        cph, cth, cps, sph, sth, sps = ScalarMultirotorDynamics._sincos(rotation)
+
+        # This is the rightmost column of the body-to-inertial rotation matrix
+        return [bodyZ * (sph * sps + cph * cps * sth), bodyZ * (cph * sps * sth - cps * sph), bodyZ * (cph * cth)]
+
+    def _sincos(angles):
+
+        phi, the, psi = angles
+
+        return cos(phi), cos(the), cos(psi), sin(phi), sin(the), sin(psi)
@@ -9,3 +9,9 @@ from gym_copter.envs.lander2d  import Lander2D
 from gym_copter.envs.lander3d  import Lander3D
 from gym_copter.envs.distance  import Distance
 from gym_copter.envs.takeoff  import Takeoff
+from gym_copter.envs.veclander1d  import VecLander1D
+from gym_copter.envs.veclander2d  import VecLander2D
+from gym_copter.envs.veclander3d  import VecLander3D
+from gym_copter.envs.vecdistance  import VecDistance
+from gym_copter.envs.vectakeoff  import VecTakeoff
+from gym_copter.envs.subprocenv  import SubprocVecEnv
@@ -0,0 +1,43 @@
+'''
+Options shared by the gym_copter environments
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+def check_action_repeat(action_repeat):
+    '''
+    Returns action_repeat, the number of dynamics updates each step() applies
+    its action for, raising ValueError unless it is an integer of at least 1
+    '''
+
+    if not isinstance(action_repeat, (int, np.integer)) or action_repeat < 1:
+        raise ValueError('action_repeat must be an integer of at least 1, not %r' % (action_repeat,))
+
+    return action_repeat
+
+def init_physics(env, dynamics_class, integrator, substeps, action_repeat, contact=None):
+    '''
+    Sets the physics options of a single-copter environment
+    '''
+
+    # Any class with the DJIPhantomDynamics constructor, e.g. ScalarDJIPhantomDynamics,
+    # or for the 1D and 2D landers the reduced-order Vertical and PlanarDJIPhantomDynamics
+    env.dynamics_class = dynamics_class
+
+    # Built on the first reset() and reused afterwards
+    env.dynamics = None
+
+    # Physics can run at a multiple of the control rate, with a higher-order integrator
+    env.integrator = integrator
+    env.substeps = substeps
+
+    # 'event' judges landings at the exact moment of ground contact, whatever the frame rate
+    if contact is not None:
+        env.contact = contact
+
+    # Each step() applies its action for this many dynamics updates
+    env.action_repeat = check_action_repeat(action_repeat)
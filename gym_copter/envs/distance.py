@@ -14,19 +14,31 @@ from gym import spaces
 from gym.utils import seeding, EzPickle
 
 from gym_copter.dynamics.djiphantom import DJIPhantomDynamics
+from gym_copter.envs import common, snapshot, vecenv
+from gym_copter.envs.observation import ObservationBuffer
 
 class Distance(gym.Env, EzPickle):
 
     FRAMES_PER_SECOND = 50
 
+    # Observation is all state values except yaw and its derivative
+    OBSERVATION = tuple(range(10))
+
     metadata = {
         'render.modes': ['human', 'rgb_array'],
         'video.frames_per_second' : FRAMES_PER_SECOND
     }
 
-    def __init__(self):
+    def __init__(self, dynamics_class=DJIPhantomDynamics, integrator='euler', substeps=1, action_repeat=1, reuse_observations=False):
+
+        EzPickle.__init__(self, dynamics_class, integrator, substeps, action_repeat, reuse_observations)
+
+        common.init_physics(self, dynamics_class, integrator, substeps, action_repeat)
+
+        # Observations are copied from the dynamics into preallocated buffers; with
+        # reuse_observations, step() returns the same read-only array every time
+        self._observation = ObservationBuffer(self.OBSERVATION, reuse_observations)
 
-        EzPickle.__init__(self)
         self.seed()
 
         # Observation is all state values except yaw and its derivative
@@ -49,32 +61,51 @@ class Distance(gym.Env, EzPickle):
 
         self.prev_shaping = None
 
-        # Create cusom dynamics model
-        self.dynamics = DJIPhantomDynamics(self.FRAMES_PER_SECOND)
+        # Create cusom dynamics model once, then reuse it
+        if self.dynamics is None:
+            self.dynamics = self.dynamics_class(self.FRAMES_PER_SECOND, integrator=self.integrator, substeps=self.substeps)
 
         # Initialize custom dynamics
         state = np.zeros(12)
-        self.dynamics.setState(state)
+        self.dynamics.reinit(state)
 
-        return self.step(np.array([0, 0, 0, 0]))[0]
+        self._step(np.array([0, 0, 0, 0]))
+
+        return self._observation()
 
     def step(self, action):
 
+        # Apply the action for several dynamics updates, stopping early once the episode is done
+        reward = 0
+        for k in range(self.action_repeat):
+            r, done = self._step(action, k > 0)
+            reward += r
+            if done:
+                break
+
+        return self._observation(), reward, done, {}
+
+    def _step(self, action, repeat=False):
+        '''
+        Applies an action for one dynamics update, leaving the new state in the observation buffer;
+        returns the reward and done flag.
+        repeat True when the motors are already set from the same action
+        '''
+
         # Abbreviation
         d = self.dynamics
 
-        d.setMotors(action)
+        if not repeat:
+            d.setMotors(action)
         d.update()
 
         # Get new state from dynamics
-        posx, velx, posy, vely, posz, velz, phi, velphi, theta, veltheta, psi, _ = d.getState()
+        x = d.getState(self._observation.state)
+        posx, posy, posz, phi, theta, psi = x[0], x[2], x[4], x[6], x[8], x[10]
 
         # Set pose in display
         self.pose = posx, posy, posz, phi, theta, psi
 
-        # Convert state to usable form
-        state = np.array([posx, velx, posy, vely, posz, velz, phi, velphi, theta, veltheta])
-
         # Reward is a simple penalty for overall distance and velocity
         shaping = np.sqrt(posx**2 + posy**2) 
                                                                   
@@ -84,7 +115,19 @@ class Distance(gym.Env, EzPickle):
 
         done = False
 
-        return np.array(state, dtype=np.float32), reward, done, {}
+        return reward, done
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as a flat array (see snapshot.py)
+        '''
+        return snapshot.get_snapshot(self, out)
+
+    def set_snapshot(self, state):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        snapshot.set_snapshot(self, state)
 
     def render(self, mode='human'):
 
@@ -125,17 +168,20 @@ def heuristic(env, s):
          a: The heuristic to be fed into the step function defined above to determine the next step and reward.
     """
 
-    _, _, _, _, posz, _, _, _, theta, _ = s
+    return heuristic_batch(env, np.asarray(s)[np.newaxis])[0]
+
+def heuristic_batch(env, s):
+    '''
+    Vectorized heuristic(): returns the (N,4) actions for an (N,10) array of states
+    '''
 
+    posz, theta = s[:,4], s[:,8]
 
-    action = np.zeros(4)
+    # Pitch forward at shallow pitch, otherwise hold
+    action = np.where((theta < np.pi/8)[:,np.newaxis], [.505, .5, .505, .5], 0.55)
 
-    if posz > -3:
-        action = 0.6 * np.ones(4) # below 2m, takeoff
-    elif theta < np.pi/8:            
-        action = np.array([.505, .5, .505, .5]) # shallow pitch; pitch forward
-    else:
-        action = 0.55*np.ones(4)
+    # Below 2m, takeoff
+    action[posz > -3] = 0.6
 
     return action
 
@@ -171,6 +217,18 @@ def heuristic_distance(env, renderer=None, seed=None):
     env.close()
     return total_reward
 
+def heuristic_distance_batch(num_episodes=1000, seed=None, **kwargs):
+    '''
+    Runs num_episodes episodes of the heuristic at once in a VecDistance,
+    constructed with any further keyword arguments; returns the per-episode
+    results of vecenv.evaluate()
+    '''
+    from gym_copter.envs.vecdistance import VecDistance
+
+    env = VecDistance(num_episodes, **kwargs)
+
+    return vecenv.evaluate(env, lambda s: heuristic_batch(env, s), seed)
+
 
 if __name__ == '__main__':
 
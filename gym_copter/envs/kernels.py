@@ -0,0 +1,205 @@
+'''
+Fused step kernel for VecLander3D: mixer, motor speeds, Equation 6,
+dynamics update, observation, shaping reward and termination in a single
+compiled loop over the batch.
+
+Compiled with Numba when it is installed; compiled code is cached on disk
+(under __pycache__, or NUMBA_CACHE_DIR if set) so that worker processes
+load it instead of paying the JIT cost at startup.  When Numba is missing,
+HAVE_NUMBA is False and callers should fall back to the NumPy path.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+try:
+    import numba
+    HAVE_NUMBA = True
+except ImportError:
+    numba = None
+    HAVE_NUMBA = False
+
+from gym_copter.dynamics import MultirotorDynamics
+from gym_copter.dynamics import P_MAXOMEGA, P_INVM, P_INVIX, P_INVIY, P_INVIZ, P_GYROX, P_GYROY, P_GYROZ, P_JRIX, P_JRIY
+
+STATUS_CRASHED  = MultirotorDynamics.STATUS_CRASHED
+STATUS_LANDED   = MultirotorDynamics.STATUS_LANDED
+STATUS_LEVELING = MultirotorDynamics.STATUS_LEVELING
+STATUS_AIRBORNE = MultirotorDynamics.STATUS_AIRBORNE
+
+# Positions in the constants array passed to lander3d_step
+(K_G, K_DT,
+ K_LANDING_VEL_X, K_LANDING_VEL_Y, K_LANDING_ANGLE,
+ K_XY_PENALTY, K_ANGLE_PENALTY, K_BOUNDS, K_MAX_ANGLE,
+ K_OUT_OF_BOUNDS_PENALTY, K_LANDING_RADIUS, K_INSIDE_RADIUS_BONUS) = range(12)
+
+def lander3d_constants(env):
+    '''
+    Packs the gravity, time step and reward constants of a VecLander3D into
+    an array for lander3d_step; vehicle parameters come from the dynamics'
+    parameter table
+    '''
+
+    d = env.dynamics
+
+    return np.array([d.g, 1./d._fps,
+                     d.LANDING_VEL_X, d.LANDING_VEL_Y, d.LANDING_ANGLE,
+                     env.XY_PENALTY_FACTOR, env.ANGLE_PENALTY_FACTOR, env.BOUNDS, env.max_angle,
+                     env.OUT_OF_BOUNDS_PENALTY, env.LANDING_RADIUS, env.INSIDE_RADIUS_BONUS])
+
+def _lander3d_step(actions, x, dxdt, status, accel, perturb, omegas, U1, U2, U3, U4, Omega, mixer, params, k, prev_shaping, reward, done):
+    '''
+    Steps every quad-X vehicle in the batch, updating x, dxdt, status,
+    accel, perturb, omegas, U1..U4, Omega and prev_shaping in place and
+    filling reward and done.  params is the (N,k) parameter table of the dynamics, and
+    mixer a (1,5,4) mixer shared by all vehicles or an (N,5,4) one per
+    vehicle.  Computes the same quantities as the NumPy path, but not bit
+    for bit: sums run in a different order, the mixer always runs in double
+    precision, and sin and cos come from a different implementation.  The
+    two paths agree to rounding error at first, and after 600 steps differ
+    by about 1e-5 in states and rewards.
+    '''
+
+    motors = np.empty(4)
+    U = np.empty(5)
+    d = np.empty(12)
+
+    shared = mixer.shape[0] == 1
+
+    for i in range(x.shape[0]):
+
+        oldstatus = status[i]
+
+        # Mixer: stop motors after safe landing, otherwise map throttle demand from [-1,+1] to [0,1]
+        if oldstatus == STATUS_LANDED:
+            motors[:] = 0
+        else:
+            t = (actions[i,0] + 1) / 2
+            r = actions[i,1]
+            p = actions[i,2]
+            motors[0] = t-r-p
+            motors[1] = t+r+p
+            motors[2] = t+r-p
+            motors[3] = t-r+p
+            for j in range(4):
+                motors[j] = min(max(motors[j], 0.), 1.)
+
+        # Motor speeds in rad/s, then Equation 6 via the mixer matrix
+        for j in range(4):
+            omegas[i,j] = motors[j] * params[i,P_MAXOMEGA]
+        m = 0 if shared else i
+        for row in range(5):
+            total = 0.
+            for j in range(4):
+                omega = omegas[i,j]
+                total += mixer[m,row,j] * (omega * omega if row < 4 else omega)
+            U[row] = total
+        U1[i] = U[0]
+        U2[i] = U[1]
+        U3[i] = U[2]
+        U4[i] = U[3]
+        Omega[i] = U[4]
+
+        if oldstatus != STATUS_LANDED:
+
+            cph = np.cos(x[i,6])
+            cth = np.cos(x[i,8])
+            cps = np.cos(x[i,10])
+            sph = np.sin(x[i,6])
+            sth = np.sin(x[i,8])
+            sps = np.sin(x[i,10])
+
+            bodyZ = -U[0] * params[i,P_INVM]
+            a0 = bodyZ * (sph * sps + cph * cps * sth)
+            a1 = bodyZ * (cph * sps * sth - cps * sph)
+            a2 = bodyZ * (cph * cth)
+
+            netz = a2 + k[K_G]
+
+            st = status[i]
+
+            resetPerturb = True
+
+            if st == STATUS_LEVELING:
+                x[i,6] = 0
+                x[i,8] = 0
+                st = STATUS_LANDED
+
+            elif st == STATUS_AIRBORNE:
+
+                if x[i,4] > 0 and x[i,5] > 0:
+                    if (x[i,5] > k[K_LANDING_VEL_Y] or abs(x[i,3]) > k[K_LANDING_VEL_X] or
+                            abs(x[i,6]) > k[K_LANDING_ANGLE]):
+                        st = STATUS_CRASHED
+                    else:
+                        st = STATUS_LEVELING
+                    resetPerturb = False
+
+                else:
+
+                    phidot = x[i,7]
+                    thedot = x[i,9]
+                    psidot = x[i,11]
+
+                    d[0]  = x[i,1]
+                    d[1]  = a0
+                    d[2]  = x[i,3]
+                    d[3]  = a1 + perturb[i,1]
+                    d[4]  = x[i,5]
+                    d[5]  = netz
+                    d[6]  = phidot
+                    d[7]  = psidot * thedot * params[i,P_GYROX] - params[i,P_JRIX] * thedot * U[4] + U[1] * params[i,P_INVIX]
+                    d[8]  = thedot
+                    d[9]  = -(psidot * phidot * params[i,P_GYROY] + params[i,P_JRIY] * phidot * U[4] + U[2] * params[i,P_INVIY])
+                    d[10] = psidot
+                    d[11] = thedot * phidot * params[i,P_GYROZ] + U[3] * params[i,P_INVIZ]
+
+                    for j in range(6):
+                        d[2*j+1] += perturb[i,j]
+
+                    for j in range(12):
+                        dxdt[i,j] = d[j]
+                        x[i,j] += k[K_DT] * d[j]
+
+                    accel[i,0] = a0
+                    accel[i,1] = a1
+                    accel[i,2] = a2
+
+            if resetPerturb:
+                for j in range(6):
+                    perturb[i,j] = 0
+
+            status[i] = st
+
+        # Reward is a simple penalty for overall distance and angle and their first derivatives
+        xy = 0.
+        for j in range(6):
+            xy += x[i,j] * x[i,j]
+        ang = 0.
+        for j in range(6, 10):
+            ang += x[i,j] * x[i,j]
+        shaping = -(k[K_XY_PENALTY] * np.sqrt(xy) + k[K_ANGLE_PENALTY] * np.sqrt(ang))
+
+        rew = shaping - prev_shaping[i]
+        prev_shaping[i] = shaping
+
+        posx = x[i,0]
+        posy = x[i,2]
+
+        # Lose bigly if we go out of bounds or for excess roll or pitch
+        failed = (abs(posx) >= k[K_BOUNDS] or abs(posy) >= k[K_BOUNDS] or
+                  abs(x[i,6]) >= k[K_MAX_ANGLE] or abs(x[i,8]) >= k[K_MAX_ANGLE])
+        if failed:
+            rew = -k[K_OUT_OF_BOUNDS_PENALTY]
+
+        # Win bigly we land safely between the flags
+        if oldstatus == STATUS_LANDED and posx**2 + posy**2 < k[K_LANDING_RADIUS]**2:
+            rew += k[K_INSIDE_RADIUS_BONUS]
+
+        reward[i] = rew
+        done[i] = failed or oldstatus == STATUS_LANDED or oldstatus == STATUS_CRASHED
+
+lander3d_step = numba.njit(cache=True)(_lander3d_step) if HAVE_NUMBA else None
@@ -14,6 +14,8 @@ from gym import spaces
 from gym.utils import seeding, EzPickle
 
 from gym_copter.dynamics.djiphantom import DJIPhantomDynamics
+from gym_copter.envs import common, snapshot, vecenv
+from gym_copter.envs.observation import ObservationBuffer
 
 class Lander1D(gym.Env, EzPickle):
     
@@ -25,14 +27,24 @@ class Lander1D(gym.Env, EzPickle):
     SAFE_LANDING_BONUS    = 100
     FRAMES_PER_SECOND     = 50
 
+    # Observation is altitude and its rate of change
+    OBSERVATION = (4, 5)
+
     metadata = {
         'render.modes': ['human', 'rgb_array'],
         'video.frames_per_second' : FRAMES_PER_SECOND
     }
 
-    def __init__(self):
+    def __init__(self, dynamics_class=DJIPhantomDynamics, integrator='euler', substeps=1, contact='step', action_repeat=1, reuse_observations=False):
+
+        EzPickle.__init__(self, dynamics_class, integrator, substeps, contact, action_repeat, reuse_observations)
+
+        common.init_physics(self, dynamics_class, integrator, substeps, action_repeat, contact)
+
+        # Observations are copied from the dynamics into preallocated buffers; with
+        # reuse_observations, step() returns the same read-only array every time
+        self._observation = ObservationBuffer(self.OBSERVATION, reuse_observations)
 
-        EzPickle.__init__(self)
         self.viewer = None
 
         self.prev_reward = None
@@ -56,20 +68,41 @@ class Lander1D(gym.Env, EzPickle):
 
         self.prev_shaping = None
 
-        # Create cusom dynamics model
-        self.dynamics = DJIPhantomDynamics(self.FRAMES_PER_SECOND)
+        # Create cusom dynamics model once, then reuse it
+        if self.dynamics is None:
+            self.dynamics = self.dynamics_class(self.FRAMES_PER_SECOND, integrator=self.integrator, substeps=self.substeps,
+                                                contact=self.contact)
 
         # Initialize custom dynamics with random perturbation
         state = np.zeros(12)
         d = self.dynamics
         state[d.STATE_Y] =  0
         state[d.STATE_Z] = -self.INITIAL_ALTITUDE
-        self.dynamics.setState(state)
+        self.dynamics.reinit(state)
 
-        return self.step(np.array([0]))[0]
+        self._step(np.array([0]))
+
+        return self._observation()
 
     def step(self, action):
 
+        # Apply the action for several dynamics updates, stopping early once the episode is done
+        reward = 0
+        for k in range(self.action_repeat):
+            r, done = self._step(action, k > 0)
+            reward += r
+            if done:
+                break
+
+        return self._observation(), reward, done, {}
+
+    def _step(self, action, repeat=False):
+        '''
+        Applies an action for one dynamics update, leaving the new state in the observation buffer;
+        returns the reward and done flag.
+        repeat True when the motors are already set from the same action
+        '''
+
         # Abbreviation
         d = self.dynamics
         status = d.getStatus()
@@ -83,22 +116,21 @@ class Lander1D(gym.Env, EzPickle):
         else:
 
             # Keep action in interval [0,1]
-            t = np.clip(action[0], 0, 1)
-            d.setMotors([t, t, t, t])
-            self.spinning = t > 0
+            if not repeat:
+                t = np.clip(action[0], 0, 1)
+                d.setMotors([t, t, t, t])
+                self.spinning = t > 0
             d.update()
 
         # Get new state from dynamics
-        _, _, posy, _, posz, velz, phi, _ = d.getState()[:8]
+        x = d.getState(self._observation.state)
+        posy, posz, phi = x[2], x[4], x[6]
 
         # Set lander pose for renderer
         self.pose = posy, posz, phi
 
-        # Convert state to usable form
-        state = np.array([posz, velz])
-
         # Reward is a simple penalty for overall distance and velocity
-        shaping = -self.PENALTY_FACTOR * np.sqrt(np.sum(state[0:4]**2))
+        shaping = -self.PENALTY_FACTOR * np.sqrt(np.sum(x[4:6]**2))
                                                                   
         reward = (shaping - self.prev_shaping) if (self.prev_shaping is not None) else 0
 
@@ -125,7 +157,29 @@ class Lander1D(gym.Env, EzPickle):
                 # Crashed!
                 done = True
 
-        return np.array(state, dtype=np.float32), reward, done, {}
+        return reward, done
+
+    def rollout(self, actions):
+        '''
+        Runs a (T,1) open-loop action sequence, or (N,T,1) for N sequences
+        stepped together, from the current state without changing it;
+        returns the observation, reward and done arrays (see vecenv.py)
+        '''
+        from gym_copter.envs.veclander1d import VecLander1D
+
+        return vecenv.rollout(self, actions, VecLander1D)
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as a flat array (see snapshot.py)
+        '''
+        return snapshot.get_snapshot(self, out)
+
+    def set_snapshot(self, state):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        snapshot.set_snapshot(self, state)
 
     def render(self, mode='human'):
 
@@ -175,6 +229,12 @@ def heuristic(s):
 
     return [hover_todo]
 
+def heuristic_batch(s):
+    '''
+    Vectorized heuristic(): returns the (N,1) actions for an (N,2) array of states
+    '''
+    return np.column_stack(heuristic(np.transpose(s)))
+
 def demo_heuristic_lander(env, render=False, save=False):
 
     from time import sleep
@@ -206,6 +266,16 @@ def demo_heuristic_lander(env, render=False, save=False):
     env.close()
     return total_reward
 
+def heuristic_lander_batch(num_episodes=1000, seed=None, **kwargs):
+    '''
+    Runs num_episodes episodes of the heuristic at once in a VecLander1D,
+    constructed with any further keyword arguments; returns the per-episode
+    results of vecenv.evaluate()
+    '''
+    from gym_copter.envs.veclander1d import VecLander1D
+
+    return vecenv.evaluate(VecLander1D(num_episodes, **kwargs), heuristic_batch, seed)
+
 
 if __name__ == '__main__':
 
@@ -16,6 +16,9 @@ from gym import spaces
 from gym.utils import seeding, EzPickle
 
 from gym_copter.dynamics.djiphantom import DJIPhantomDynamics
+from gym_copter.envs import common, snapshot, vecenv
+from gym_copter.envs.noise import ResetNoise
+from gym_copter.envs.observation import ObservationBuffer
 
 class Lander2D(gym.Env, EzPickle):
     
@@ -29,14 +32,30 @@ class Lander2D(gym.Env, EzPickle):
     INSIDE_RADIUS_BONUS   = 100
     FRAMES_PER_SECOND     = 50
 
+    # Observation is Y, Z and roll, and their first derivatives
+    OBSERVATION = (2, 3, 4, 5, 6, 7)
+
+    # Initial push sideways and downward
+    RESET_NOISE = (2, 'uniform', -INITIAL_RANDOM_FORCE, +INITIAL_RANDOM_FORCE)
+
     metadata = {
         'render.modes': ['human', 'rgb_array'],
         'video.frames_per_second' : FRAMES_PER_SECOND
     }
 
-    def __init__(self):
+    def __init__(self, dynamics_class=DJIPhantomDynamics, integrator='euler', substeps=1, contact='step', action_repeat=1, reuse_observations=False):
+
+        EzPickle.__init__(self, dynamics_class, integrator, substeps, contact, action_repeat, reuse_observations)
+
+        common.init_physics(self, dynamics_class, integrator, substeps, action_repeat, contact)
+
+        # Observations are copied from the dynamics into preallocated buffers; with
+        # reuse_observations, step() returns the same read-only array every time
+        self._observation = ObservationBuffer(self.OBSERVATION, reuse_observations)
+
+        # Reset noise comes from the environment's own stream, drawn in blocks
+        self._noise = ResetNoise(1, *self.RESET_NOISE)
 
-        EzPickle.__init__(self)
         self.seed()
         self.viewer = None
 
@@ -57,29 +76,60 @@ class Lander2D(gym.Env, EzPickle):
 
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        self._noise.seed(seed)
         return [seed]
 
+    def use_bank(self, bank, start=0):
+        '''
+        Takes the initial conditions of successive resets from rows start,
+        start+1, ... of a bank made by noise.make_bank() for this
+        environment, or from the seeded stream again if bank is None
+        '''
+        self._noise.use_bank(bank, start)
+
     def reset(self):
 
         self._destroy()
 
         self.prev_shaping = None
 
-        # Create cusom dynamics model
-        self.dynamics = DJIPhantomDynamics(self.FRAMES_PER_SECOND)
+        # Create cusom dynamics model once, then reuse it
+        if self.dynamics is None:
+            self.dynamics = self.dynamics_class(self.FRAMES_PER_SECOND, integrator=self.integrator, substeps=self.substeps,
+                                                contact=self.contact)
 
         # Initialize custom dynamics with random perturbation
         state = np.zeros(12)
         d = self.dynamics
         state[d.STATE_Y] =  0
         state[d.STATE_Z] = -self.INITIAL_ALTITUDE
-        self.dynamics.setState(state)
-        self.dynamics.perturb(np.array([0, self._perturb(), self._perturb(), 0, 0, 0]))
+        self.dynamics.reinit(state)
+        force = self._noise()[0]
+        self.dynamics.perturb(np.array([0, force[0], force[1], 0, 0, 0]))
+
+        self._step(np.array([0, 0]))
 
-        return self.step(np.array([0, 0]))[0]
+        return self._observation()
 
     def step(self, action):
 
+        # Apply the action for several dynamics updates, stopping early once the episode is done
+        reward = 0
+        for k in range(self.action_repeat):
+            r, done = self._step(action, k > 0)
+            reward += r
+            if done:
+                break
+
+        return self._observation(), reward, done, {}
+
+    def _step(self, action, repeat=False):
+        '''
+        Applies an action for one dynamics update, leaving the new state in the observation buffer;
+        returns the reward and done flag.
+        repeat True when the motors are already set from the same action
+        '''
+
         # Abbreviation
         d = self.dynamics
         status = d.getStatus()
@@ -91,22 +141,21 @@ class Lander2D(gym.Env, EzPickle):
 
         # In air, set motors from action
         else:
-            m = np.clip(action, 0, 1)    # keep motors in interval [0,1]
-            d.setMotors([m[0], m[1], m[1], m[0]])
-            self.spinning = sum(m) > 0
+            if not repeat:
+                m = np.clip(action, 0, 1)    # keep motors in interval [0,1]
+                d.setMotors([m[0], m[1], m[1], m[0]])
+                self.spinning = sum(m) > 0
             d.update()
 
         # Get new state from dynamics
-        _, _, posy, vely, posz, velz, phi, velphi = d.getState()[:8]
+        x = d.getState(self._observation.state)
+        posy, posz, phi = x[2], x[4], x[6]
 
         # Set lander pose for renderer
         self.pose = posy, posz, phi
 
-        # Convert state to usable form
-        state = np.array([posy, vely, posz, velz, phi, velphi])
-
         # A simple penalty for overall distance and velocity
-        shaping = -self.PENALTY_FACTOR * np.sqrt(np.sum(state[0:4]**2))
+        shaping = -self.PENALTY_FACTOR * np.sqrt(np.sum(x[2:6]**2))
 
         reward = (shaping - self.prev_shaping) if (self.prev_shaping is not None) else 0
 
@@ -139,7 +188,29 @@ class Lander2D(gym.Env, EzPickle):
                 done = True
                 self.spinning = False
 
-        return np.array(state, dtype=np.float32), reward, done, {}
+        return reward, done
+
+    def rollout(self, actions):
+        '''
+        Runs a (T,2) open-loop action sequence, or (N,T,2) for N sequences
+        stepped together, from the current state without changing it;
+        returns the observation, reward and done arrays (see vecenv.py)
+        '''
+        from gym_copter.envs.veclander2d import VecLander2D
+
+        return vecenv.rollout(self, actions, VecLander2D)
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as a flat array (see snapshot.py)
+        '''
+        return snapshot.get_snapshot(self, out)
+
+    def set_snapshot(self, state):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        snapshot.set_snapshot(self, state)
 
     def render(self, mode='human'):
 
@@ -156,10 +227,6 @@ class Lander2D(gym.Env, EzPickle):
             self.renderer.close()
             self.renderer = None
 
-    def _perturb(self):
-
-        return np.random.uniform(-self.INITIAL_RANDOM_FORCE, +self.INITIAL_RANDOM_FORCE)
-
     def _destroy(self):
         if self.renderer is not None:
             self.renderer.close()
@@ -207,6 +274,12 @@ def heuristic(s):
 
     return hover_todo-phi_todo, hover_todo+phi_todo
 
+def heuristic_batch(s):
+    '''
+    Vectorized heuristic(): returns the (N,2) actions for an (N,6) array of states
+    '''
+    return np.column_stack(heuristic(np.transpose(s)))
+
 def demo_heuristic_lander(env, seed=None, render=False, save=False):
 
     from time import sleep
@@ -239,6 +312,16 @@ def demo_heuristic_lander(env, seed=None, render=False, save=False):
     env.close()
     return total_reward
 
+def heuristic_lander_batch(num_episodes=1000, seed=None, **kwargs):
+    '''
+    Runs num_episodes episodes of the heuristic at once in a VecLander2D,
+    constructed with any further keyword arguments; returns the per-episode
+    results of vecenv.evaluate()
+    '''
+    from gym_copter.envs.veclander2d import VecLander2D
+
+    return vecenv.evaluate(VecLander2D(num_episodes, **kwargs), heuristic_batch, seed)
+
 if __name__ == '__main__':
 
     demo_heuristic_lander(Lander2D(), seed=None, render=True, save=False)
@@ -14,6 +14,9 @@ from gym import spaces
 from gym.utils import seeding, EzPickle
 
 from gym_copter.dynamics.djiphantom import DJIPhantomDynamics
+from gym_copter.envs import common, snapshot, vecenv
+from gym_copter.envs.noise import ResetNoise
+from gym_copter.envs.observation import ObservationBuffer
 
 class Lander3D(gym.Env, EzPickle):
 
@@ -28,6 +31,13 @@ class Lander3D(gym.Env, EzPickle):
     INSIDE_RADIUS_BONUS   = 100
     RESTING_DURATION      = 1.0  # for rendering for a short while after successful landing
     FRAMES_PER_SECOND     = 50
+
+    # Observation is all state values except yaw and its derivative
+    OBSERVATION = tuple(range(10))
+
+    # Initial horizontal offsets are standard normal, scaled by INITIAL_RANDOM_OFFSET
+    RESET_NOISE = (2, 'standard_normal')
+
     MAX_ANGLE             = 45   # big penalty if roll or pitch angles go beyond this
     EXCESS_ANGLE_PENALTY  = 100
 
@@ -36,9 +46,19 @@ class Lander3D(gym.Env, EzPickle):
         'video.frames_per_second' : FRAMES_PER_SECOND
     }
 
-    def __init__(self):
+    def __init__(self, dynamics_class=DJIPhantomDynamics, integrator='euler', substeps=1, contact='step', action_repeat=1, reuse_observations=False):
+
+        EzPickle.__init__(self, dynamics_class, integrator, substeps, contact, action_repeat, reuse_observations)
+
+        common.init_physics(self, dynamics_class, integrator, substeps, action_repeat, contact)
+
+        # Observations are copied from the dynamics into preallocated buffers; with
+        # reuse_observations, step() returns the same read-only array every time
+        self._observation = ObservationBuffer(self.OBSERVATION, reuse_observations)
+
+        # Reset noise comes from the environment's own stream, drawn in blocks
+        self._noise = ResetNoise(1, *self.RESET_NOISE)
 
-        EzPickle.__init__(self)
         self.seed()
 
         self.prev_reward = None
@@ -60,27 +80,58 @@ class Lander3D(gym.Env, EzPickle):
 
     def seed(self, seed=None):
         self.np_random, seed = seeding.np_random(seed)
+        self._noise.seed(seed)
         return [seed]
 
+    def use_bank(self, bank, start=0):
+        '''
+        Takes the initial conditions of successive resets from rows start,
+        start+1, ... of a bank made by noise.make_bank() for this
+        environment, or from the seeded stream again if bank is None
+        '''
+        self._noise.use_bank(bank, start)
+
     def reset(self):
 
         self.prev_shaping = None
 
-        # Create cusom dynamics model
-        self.dynamics = DJIPhantomDynamics(self.FRAMES_PER_SECOND)
+        # Create cusom dynamics model once, then reuse it
+        if self.dynamics is None:
+            self.dynamics = self.dynamics_class(self.FRAMES_PER_SECOND, integrator=self.integrator, substeps=self.substeps,
+                                                contact=self.contact)
 
         # Initialize custom dynamics with random perturbation
         state = np.zeros(12)
         d = self.dynamics
-        state[d.STATE_X] =  self.INITIAL_RANDOM_OFFSET * np.random.randn()
-        state[d.STATE_Y] =  self.INITIAL_RANDOM_OFFSET * np.random.randn()
+        offset = self.INITIAL_RANDOM_OFFSET * self._noise()[0]
+        state[d.STATE_X] =  offset[0]
+        state[d.STATE_Y] =  offset[1]
         state[d.STATE_Z] = -self.INITIAL_ALTITUDE
-        self.dynamics.setState(state)
+        self.dynamics.reinit(state)
 
-        return self.step(np.array([0, 0, 0]))[0]
+        self._step(np.array([0, 0, 0]))
+
+        return self._observation()
 
     def step(self, action):
 
+        # Apply the action for several dynamics updates, stopping early once the episode is done
+        reward = 0
+        for k in range(self.action_repeat):
+            r, done = self._step(action, k > 0)
+            reward += r
+            if done:
+                break
+
+        return self._observation(), reward, done, {}
+
+    def _step(self, action, repeat=False):
+        '''
+        Applies an action for one dynamics update, leaving the new state in the observation buffer;
+        returns the reward and done flag.
+        repeat True when the motors are already set from the same action
+        '''
+
         # Abbreviation
         d = self.dynamics
         status = d.getStatus()
@@ -91,22 +142,21 @@ class Lander3D(gym.Env, EzPickle):
 
         # In air, set motors from action
         else:
-            t,r,p = (action[0]+1)/2, action[1], action[2]  # map throttle demand from [-1,+1] to [0,1]
-            d.setMotors(np.clip([t-r-p, t+r+p, t+r-p, t-r+p], 0, 1)) # use mixer to set motors
+            if not repeat:
+                t,r,p = (action[0]+1)/2, action[1], action[2]  # map throttle demand from [-1,+1] to [0,1]
+                d.setMotors(np.clip([t-r-p, t+r+p, t+r-p, t-r+p], 0, 1)) # use mixer to set motors
             d.update()
 
         # Get new state from dynamics
-        posx, velx, posy, vely, posz, velz, phi, velphi, theta, veltheta, psi, _ = d.getState()
+        x = d.getState(self._observation.state)
+        posx, posy, posz, phi, theta, psi = x[0], x[2], x[4], x[6], x[8], x[10]
 
         # Set lander pose in display
         self.pose = posx, posy, posz, phi, theta, psi
 
-        # Convert state to usable form
-        state = np.array([posx, velx, posy, vely, posz, velz, phi, velphi, theta, veltheta])
-
         # Reward is a simple penalty for overall distance and angle and their first derivatives
-        shaping = -(self.XY_PENALTY_FACTOR * np.sqrt(np.sum(state[0:6]**2)) + 
-                self.ANGLE_PENALTY_FACTOR * np.sqrt(np.sum(state[6:10]**2)))
+        shaping = -(self.XY_PENALTY_FACTOR * np.sqrt(np.sum(x[0:6]**2)) + 
+                self.ANGLE_PENALTY_FACTOR * np.sqrt(np.sum(x[6:10]**2)))
                                                                   
         reward = (shaping - self.prev_shaping) if (self.prev_shaping is not None) else 0
         self.prev_shaping = shaping
@@ -139,7 +189,29 @@ class Lander3D(gym.Env, EzPickle):
             # Crashed!
             done = True
 
-        return np.array(state, dtype=np.float32), reward, done, {}
+        return reward, done
+
+    def rollout(self, actions):
+        '''
+        Runs a (T,3) open-loop action sequence, or (N,T,3) for N sequences
+        stepped together, from the current state without changing it;
+        returns the observation, reward and done arrays (see vecenv.py)
+        '''
+        from gym_copter.envs.veclander3d import VecLander3D
+
+        return vecenv.rollout(self, actions, VecLander3D)
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as a flat array (see snapshot.py)
+        '''
+        return snapshot.get_snapshot(self, out)
+
+    def set_snapshot(self, state):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        snapshot.set_snapshot(self, state)
 
     def render(self, mode='human'):
 
@@ -204,6 +276,12 @@ def heuristic(s):
 
     return hover_todo, phi_todo, theta_todo # phi affects Y; theta affects X
 
+def heuristic_batch(s):
+    '''
+    Vectorized heuristic(): returns the (N,3) actions for an (N,10) array of states
+    '''
+    return np.column_stack(heuristic(np.transpose(s)))
+
 def heuristic_lander(env, renderer=None, seed=None):
 
     import time
@@ -236,6 +314,16 @@ def heuristic_lander(env, renderer=None, seed=None):
     env.close()
     return total_reward
 
+def heuristic_lander_batch(num_episodes=1000, seed=None, **kwargs):
+    '''
+    Runs num_episodes episodes of the heuristic at once in a VecLander3D,
+    constructed with any further keyword arguments; returns the per-episode
+    results of vecenv.evaluate()
+    '''
+    from gym_copter.envs.veclander3d import VecLander3D
+
+    return vecenv.evaluate(VecLander3D(num_episodes, **kwargs), heuristic_batch, seed)
+
 
 if __name__ == '__main__':
 
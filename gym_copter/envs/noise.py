@@ -0,0 +1,256 @@
+'''
+Reset noise for the gym_copter environments: random initial offsets and
+perturbations drawn from per-copter random-number streams, in blocks.
+
+Each of K copters has its own PCG64 generator, spawned from one SeedSequence,
+so that the noise of a copter's n-th episode depends only on the seed, the
+copter's index and n: not on the other copters, their reset order, or the
+process they run in.  Copter 0 of K always matches a single copter seeded
+with the same value.  Values are drawn a block of resets at a time.
+
+For large evaluations, the values can instead come from a bank: an (M, size)
+array made once by make_bank() and saved as a .npy file, which load_bank()
+maps into memory, so that every process shares its pages.  Controllers
+evaluated on the same rows of a bank see the same initial conditions, with
+no random numbers drawn at reset.  A bank can be made from the command line:
+
+    python -m gym_copter.envs.noise Lander-v3 lander3d.npy -n 1000000
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import argparse
+import time
+
+import numpy as np
+
+# Four 32-bit words each for the 128-bit PCG64 state and increment, then has_uint32 and uinteger
+_GENERATOR_SIZE = 10
+
+# Position in the block and next bank row (-1 for none), before the generator state
+_POSITION_SIZE = 2
+
+def make_bank(path, noise, count, seed=None, chunk=65536):
+    '''
+    Saves to path a bank of count rows of reset noise, as described by an
+    environment's RESET_NOISE, drawn from one stream seeded with
+    SeedSequence(seed), and returns it as load_bank() does.  The rows are
+    drawn chunk at a time, so the bank can be larger than memory.
+    '''
+
+    size, method, *args = noise
+
+    bank = np.lib.format.open_memmap(path, mode='w+', dtype=np.float64, shape=(count, size))
+
+    generator = np.random.Generator(np.random.PCG64(np.random.SeedSequence(seed)))
+
+    for first in range(0, count, chunk):
+        last = min(first + chunk, count)
+        bank[first:last] = getattr(generator, method)(*args, size=(last-first, size))
+
+    bank.flush()
+    del bank
+
+    return load_bank(path)
+
+def load_bank(path):
+    '''
+    Returns the bank saved at path, memory-mapped read-only
+    '''
+    return np.load(path, mmap_mode='r')
+
+def _pack(state, out):
+
+    s, inc = state['state']['state'], state['state']['inc']
+
+    out[:8] = [(value >> shift) & 0xFFFFFFFF for value in (s, inc) for shift in (96, 64, 32, 0)]
+    out[8:] = state['has_uint32'], state['uinteger']
+
+def _unpack(words):
+
+    words = [int(word) for word in words]
+
+    s   = (words[0] << 96) | (words[1] << 64) | (words[2] << 32) | words[3]
+    inc = (words[4] << 96) | (words[5] << 64) | (words[6] << 32) | words[7]
+
+    return {'bit_generator': 'PCG64', 'state': {'state': s, 'inc': inc}, 'has_uint32': words[8], 'uinteger': words[9]}
+
+class ResetNoise:
+    '''
+    Per-copter streams of size values per reset, drawn with the Generator
+    method of the specified name and arguments, e.g. ('standard_normal',) or
+    ('uniform', low, high), block resets at a time, or else rows of a bank
+    (see use_bank()).
+    '''
+
+    def __init__(self, count, size, method, *args, block=256):
+
+        self.count = count
+        self.size = size
+        self.block = block
+
+        self._method = method
+        self._args = args
+
+        self._values = np.zeros((count, block, size))
+        self._next = np.zeros(count, dtype=int)
+
+        # Packed generator state at the start of each copter's current block, and whether the block has been drawn
+        self._starts = np.zeros((count, _GENERATOR_SIZE))
+        self._drawn = np.zeros(count, dtype=bool)
+
+        # Bank in use, if any, and the row each copter takes at its next reset
+        self._bank = None
+        self._bank_rows = np.zeros(count, dtype=int)
+
+        self.seed()
+
+    def seed(self, seed=None):
+        '''
+        Seeds copter k's stream with the k-th child of SeedSequence(seed)
+        '''
+
+        self._generators = [np.random.Generator(np.random.PCG64(child)) for child in np.random.SeedSequence(seed).spawn(self.count)]
+
+        for k, generator in enumerate(self._generators):
+            _pack(generator.bit_generator.state, self._starts[k])
+
+        self._next[:] = 0
+        self._drawn[:] = False
+
+    def use_bank(self, bank, start=0):
+        '''
+        Takes values from the rows of bank, an (M, size) array, instead of the
+        streams: copter k's n-th reset from now takes row start + k + n*count.
+        A bank of None returns to the streams, where they left off.
+        '''
+
+        if bank is not None and (np.ndim(bank) != 2 or bank.shape[1] != self.size):
+            raise ValueError('Bank of shape %s does not have %d values per row' % (np.shape(bank), self.size))
+
+        self._bank = bank
+        self._bank_rows[:] = start + np.arange(self.count)
+
+    def __call__(self, index=None):
+        '''
+        Returns an (n, size) array holding the next reset's values for each
+        copter selected by index (a boolean mask, or all copters by default)
+        '''
+
+        if self._bank is not None:
+            return self._from_bank(index)
+
+        rows = np.arange(self.count) if index is None else np.flatnonzero(index)
+
+        # Blocks not yet drawn, or restored by set_snapshot(), then used-up blocks
+        for k in rows[~self._drawn[rows]]:
+            self._draw(k)
+
+        for k in rows[self._next[rows] == self.block]:
+            self._draw(k)
+
+        values = self._values[rows, self._next[rows]]
+
+        self._next[rows] += 1
+
+        return values
+
+    def snapshot_size(self):
+        '''
+        Returns the length of the array used by get_snapshot() and set_snapshot()
+        '''
+        return self.count * (_POSITION_SIZE + _GENERATOR_SIZE)
+
+    def get_snapshot(self, out):
+        '''
+        Packs the position in each stream, and in the bank, into the array out
+        '''
+
+        out = out.reshape(self.count, _POSITION_SIZE + _GENERATOR_SIZE)
+
+        out[:,0] = self._next
+        out[:,1] = -1 if self._bank is None else self._bank_rows
+        out[:,_POSITION_SIZE:] = self._starts
+
+    def set_snapshot(self, snapshot):
+        '''
+        Restores the position in each stream, and in the bank in use, from an
+        array filled by get_snapshot()
+        '''
+
+        snapshot = snapshot.reshape(self.count, _POSITION_SIZE + _GENERATOR_SIZE)
+
+        # The bank itself is not part of the snapshot
+        if self._bank is not None and (snapshot[:,1] >= 0).all():
+            self._bank_rows[:] = snapshot[:,1]
+
+        self._next[:] = snapshot[:,0]
+
+        starts = snapshot[:,_POSITION_SIZE:]
+
+        # Copters still in the same block keep it; the others rewind their generators, to redraw the block when next needed
+        for k in np.flatnonzero((starts != self._starts).any(axis=1)):
+            self._generators[k].bit_generator.state = _unpack(starts[k])
+            self._starts[k] = starts[k]
+            self._drawn[k] = False
+
+    def _draw(self, k):
+        '''
+        Draws copter k's block: the current one again, from its start, if
+        not yet drawn, or else the next one
+        '''
+
+        generator = self._generators[k]
+
+        if self._drawn[k]:
+            _pack(generator.bit_generator.state, self._starts[k])
+            self._next[k] = 0
+
+        self._values[k] = getattr(generator, self._method)(*self._args, size=(self.block, self.size))
+
+        self._drawn[k] = True
+
+    def _from_bank(self, index):
+
+        copters = slice(None) if index is None else index
+
+        rows = self._bank_rows[copters]
+
+        if len(rows) and rows.max() >= len(self._bank):
+            raise IndexError('Bank of %d rows exhausted' % len(self._bank))
+
+        values = np.array(self._bank[rows], dtype=float)
+
+        self._bank_rows[copters] += self.count
+
+        return values
+
+def main():
+
+    import gym
+    import gym_copter  # registers the environments
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description='Make a bank of initial conditions for a gym_copter environment')
+    parser.add_argument('env', help='Environment id, e.g. Lander-v3')
+    parser.add_argument('path', help='Output .npy file')
+    parser.add_argument('-n', '--count', type=int, default=1000000, help='Number of rows')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Seed')
+    args = parser.parse_args()
+
+    noise = getattr(gym.make(args.env).unwrapped, 'RESET_NOISE', None)
+
+    if noise is None:
+        parser.error('%s has no random initial conditions' % args.env)
+
+    start = time.time()
+
+    bank = make_bank(args.path, noise, args.count, args.seed)
+
+    print('%d rows of %d values in %.2f sec' % (bank.shape + (time.time() - start,)))
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,50 @@
+'''
+Observation support for the gym_copter environments: observations are the
+state values selected by an index map, copied from a preallocated full-state
+buffer into a preallocated float32 buffer.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+def index_map(indices):
+    '''
+    Returns a slice for contiguous state indices, so that observing them
+    takes a single copy, or else the indices as a list
+    '''
+
+    indices = tuple(indices)
+
+    first, last = indices[0], indices[-1]
+
+    return slice(first, last+1) if indices == tuple(range(first, last+1)) else list(indices)
+
+class ObservationBuffer:
+    '''
+    Holds the full 12-value state, for getState(out=...), and the float32
+    observation of the values at indices.  With reuse=True, calling the
+    buffer returns the same read-only view every time, overwritten by each
+    call; otherwise it returns a new array.
+    '''
+
+    def __init__(self, indices, reuse=False):
+
+        self.state = np.zeros(12)
+
+        self.reuse = reuse
+
+        self._observed = index_map(indices)
+
+        self._observation = np.zeros(len(indices), dtype=np.float32)
+
+        self._view = self._observation.view()
+        self._view.flags.writeable = False
+
+    def __call__(self):
+
+        self._observation[:] = self.state[self._observed]
+
+        return self._view if self.reuse else self._observation.copy()
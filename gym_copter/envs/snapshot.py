@@ -0,0 +1,69 @@
+'''
+Snapshot support for the gym_copter environments: packs the full simulator
+state (dynamics, reward shaping, rendering flags and reset noise streams)
+into a flat float64 array, and restores it in place, for branching rollouts
+in tree search and sampling-based planners.  A restored environment resets
+to the same initial conditions as the original.  The environments' np_random
+is not included, as they draw nothing from it.
+
+Layout: [prev_shaping (NaN if None), spinning, dynamics snapshot, reset noise
+snapshot (if any)]
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+def _noiseSize(env):
+
+    noise = getattr(env, '_noise', None)
+
+    return 0 if noise is None else noise.snapshot_size()
+
+def snapshot_size(env):
+    '''
+    Returns the length of the snapshot array for an environment
+    '''
+    return 2 + env.dynamics.snapshotSize() + _noiseSize(env)
+
+def get_snapshot(env, out=None):
+    '''
+    Returns the full simulator state of an environment as a flat array
+    out optional array of length snapshot_size(env) to fill
+    '''
+
+    if out is None:
+        out = np.empty(snapshot_size(env))
+
+    n = env.dynamics.snapshotSize()
+
+    out[0] = np.nan if env.prev_shaping is None else env.prev_shaping
+    out[1] = getattr(env, 'spinning', False)
+
+    env.dynamics.get_snapshot(out[2:2+n])
+
+    m = _noiseSize(env)
+    if m:
+        env._noise.get_snapshot(out[2+n:2+n+m])
+
+    return out
+
+def set_snapshot(env, snapshot):
+    '''
+    Restores the full simulator state of an environment from an array returned by get_snapshot()
+    '''
+
+    n = env.dynamics.snapshotSize()
+
+    env.prev_shaping = None if np.isnan(snapshot[0]) else snapshot[0]
+
+    if hasattr(env, 'spinning'):
+        env.spinning = bool(snapshot[1])
+
+    env.dynamics.set_snapshot(snapshot[2:2+n])
+
+    m = _noiseSize(env)
+    if m:
+        env._noise.set_snapshot(snapshot[2+n:2+n+m])
@@ -0,0 +1,287 @@
+'''
+Subprocess vector environment for any registered gym_copter id: K copies of
+an environment stepped in worker processes that exchange actions,
+observations, rewards and dones through one shared-memory block.  Each step
+costs one single-byte message per worker in each direction, with nothing
+pickled.
+
+Workers can be pinned to CPUs and have their BLAS thread pools capped, so
+that many workers do not oversubscribe the machine.  The cap reaches
+libraries loaded after a worker starts through the usual environment
+variables, and libraries already loaded (as with the 'fork' start method)
+through threadpoolctl, when it is installed.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import multiprocessing
+import os
+import traceback
+
+import numpy as np
+
+import gym
+from gym.vector import VectorEnv
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None
+
+# Environment variables read by BLAS and OpenMP libraries for their thread counts
+BLAS_VARIABLES = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Single-byte commands from the main process, and replies from the workers
+_STEP, _RESET, _SEED, _CLOSE = b's', b'r', b'd', b'c'
+_OK, _ERROR = b'k', b'!'
+
+def _layout(num_envs, obs_dim, action_dim):
+    '''
+    Returns a list of (name, offset, shape, dtype) for the arrays in the
+    shared block, and the total size of the block in bytes
+    '''
+
+    fields = (('actions',      (num_envs, action_dim), np.float64),
+              ('observations', (num_envs, obs_dim),    np.float32),
+              ('terminal',     (num_envs, obs_dim),    np.float32),
+              ('rewards',      (num_envs,),            np.float64),
+              ('seeds',        (num_envs,),            np.int64),
+              ('dones',        (num_envs,),            np.bool_),
+              ('truncated',    (num_envs,),            np.bool_))
+
+    layout = []
+    offset = 0
+
+    for name, shape, dtype in fields:
+        layout.append((name, offset, shape, dtype))
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        offset += (size + 7) // 8 * 8
+
+    return layout, offset
+
+def _views(block, layout):
+    '''
+    Returns a dictionary of arrays viewing the shared block
+    '''
+
+    buffer = np.frombuffer(block, dtype=np.uint8)
+
+    return {name: np.ndarray(shape, dtype, buffer, offset) for name, offset, shape, dtype in layout}
+
+def _worker(env_id, kwargs, first, last, auto_reset, block, layout, conn, cpus, blas_threads):
+
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+
+    if blas_threads is not None and threadpool_limits is not None:
+        threadpool_limits(blas_threads)
+
+    shared = _views(block, layout)
+
+    actions, observations, terminal = shared['actions'], shared['observations'], shared['terminal']
+    rewards, dones, truncated, seeds = shared['rewards'], shared['dones'], shared['truncated'], shared['seeds']
+
+    try:
+        envs = [gym.make(env_id, **kwargs) for _ in range(first, last)]
+        conn.send_bytes(_OK)
+
+    except Exception:
+        conn.send_bytes(_ERROR + traceback.format_exc().encode())
+        return
+
+    while True:
+
+        command = conn.recv_bytes()
+
+        try:
+
+            if command == _STEP:
+
+                for i, env in enumerate(envs, first):
+
+                    obs, rewards[i], done, info = env.step(actions[i])
+
+                    dones[i] = done
+                    truncated[i] = info.get('TimeLimit.truncated', False)
+
+                    # Reset finished episodes in place, keeping their final observations
+                    if done and auto_reset:
+                        terminal[i] = obs
+                        obs = env.reset()
+
+                    observations[i] = obs
+
+            elif command == _RESET:
+
+                for i, env in enumerate(envs, first):
+                    observations[i] = env.reset()
+
+            elif command == _SEED:
+
+                for i, env in enumerate(envs, first):
+                    env.seed(None if seeds[i] < 0 else int(seeds[i]))
+
+            elif command == _CLOSE:
+
+                for env in envs:
+                    env.close()
+
+                conn.send_bytes(_OK)
+                return
+
+            conn.send_bytes(_OK)
+
+        except Exception:
+            conn.send_bytes(_ERROR + traceback.format_exc().encode())
+
+class SubprocVecEnv(VectorEnv):
+    '''
+    Behaves like K copies of gym.make(env_id, **kwargs), time limit
+    included, stepped in worker processes.  Actions are a (K,action_dim)
+    array; step() returns (K,obs_dim) observations and (K,) reward and done
+    arrays.  When a sub-episode finishes, its final observation is stored in
+    info['terminal_observation'] and the returned observation is the first
+    one of the next episode, unless auto_reset is False.
+
+    workers number of worker processes, each stepping a contiguous share of
+    the copies (default one per CPU, at most K)
+    affinity True to pin each worker to one of the CPUs available to this
+    process, a sequence of CPU sets, one per worker, or None
+    blas_threads maximum number of BLAS threads per worker, or None
+    context multiprocessing start method, e.g. 'spawn' (default platform's)
+    '''
+
+    def __init__(self, env_id, num_envs=8, workers=None, auto_reset=True, affinity=None, blas_threads=1, context=None, **kwargs):
+
+        self._conns = []
+        self._processes = []
+
+        # One copy here for the spaces
+        env = gym.make(env_id, **kwargs)
+        VectorEnv.__init__(self, num_envs, env.observation_space, env.action_space)
+        env.close()
+
+        self.auto_reset = auto_reset
+
+        workers = min(num_envs, workers or os.cpu_count())
+
+        layout, size = _layout(num_envs, self.single_observation_space.shape[0], self.single_action_space.shape[0])
+
+        ctx = multiprocessing.get_context(context)
+
+        self._block = ctx.RawArray('b', size)
+        self._shared = _views(self._block, layout)
+
+        if affinity is True:
+            available = sorted(os.sched_getaffinity(0))
+            affinity = [{available[w % len(available)]} for w in range(workers)]
+
+        # Copies are split as evenly as possible
+        bounds = np.linspace(0, num_envs, workers+1).astype(int)
+
+        # Workers inherit the capped BLAS thread counts through their environment
+        saved = {name: os.environ.get(name) for name in BLAS_VARIABLES}
+        if blas_threads is not None:
+            os.environ.update({name: str(blas_threads) for name in BLAS_VARIABLES})
+
+        try:
+
+            for w in range(workers):
+
+                parent, child = ctx.Pipe()
+
+                process = ctx.Process(target=_worker, daemon=True,
+                        args=(env_id, kwargs, bounds[w], bounds[w+1], auto_reset, self._block, layout, child,
+                              None if affinity is None else affinity[w], blas_threads))
+                process.start()
+                child.close()
+
+                self._conns.append(parent)
+                self._processes.append(process)
+
+        finally:
+
+            for name, value in saved.items():
+                if value is None:
+                    os.environ.pop(name, None)
+                else:
+                    os.environ[name] = value
+
+        self._wait()
+
+    def seed(self, seeds=None):
+
+        if seeds is None or isinstance(seeds, int):
+            seeds = [-1 if seeds is None else seeds + i for i in range(self.num_envs)]
+
+        self._shared['seeds'][:] = [-1 if seed is None else seed for seed in seeds]
+
+        self._send(_SEED)
+        self._wait()
+
+    def reset_async(self):
+
+        self._send(_RESET)
+
+    def reset_wait(self):
+
+        self._wait()
+
+        return self._shared['observations'].copy()
+
+    def step_async(self, actions):
+
+        self._shared['actions'][:] = actions
+
+        self._send(_STEP)
+
+    def step_wait(self):
+
+        self._wait()
+
+        shared = self._shared
+
+        obs = shared['observations'].copy()
+        reward = shared['rewards'].copy()
+        done = shared['dones'].copy()
+
+        info = {}
+
+        if self.auto_reset and done.any():
+            terminal = obs.copy()
+            terminal[done] = shared['terminal'][done]
+            info['terminal_observation'] = terminal
+            info['TimeLimit.truncated'] = shared['truncated'].copy()
+
+        return obs, reward, done, info
+
+    def close_extras(self, terminate=False, **kwargs):
+
+        if not terminate:
+            try:
+                self._send(_CLOSE)
+                self._wait()
+            except (BrokenPipeError, EOFError, RuntimeError):
+                pass
+
+        for process in self._processes:
+            process.join(None if not terminate else 1)
+            if process.is_alive():
+                process.terminate()
+
+        for conn in self._conns:
+            conn.close()
+
+    def _send(self, command):
+
+        for conn in self._conns:
+            conn.send_bytes(command)
+
+    def _wait(self):
+
+        errors = [reply[1:].decode() for reply in (conn.recv_bytes() for conn in self._conns) if reply != _OK]
+
+        if errors:
+            raise RuntimeError('Worker failed:\n' + errors[0])
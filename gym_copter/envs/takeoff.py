@@ -14,20 +14,32 @@ from gym import spaces
 from gym.utils import seeding, EzPickle
 
 from gym_copter.dynamics.djiphantom import DJIPhantomDynamics
+from gym_copter.envs import common, snapshot, vecenv
+from gym_copter.envs.observation import ObservationBuffer
 
 class Takeoff(gym.Env, EzPickle):
 
     TARGET_ALTITUDE   = 5
     FRAMES_PER_SECOND = 50
 
+    # Observation is all state values except yaw and its derivative
+    OBSERVATION = tuple(range(10))
+
     metadata = {
         'render.modes': ['human', 'rgb_array'],
         'video.frames_per_second' : FRAMES_PER_SECOND
     }
 
-    def __init__(self):
+    def __init__(self, dynamics_class=DJIPhantomDynamics, integrator='euler', substeps=1, action_repeat=1, reuse_observations=False):
+
+        EzPickle.__init__(self, dynamics_class, integrator, substeps, action_repeat, reuse_observations)
+
+        common.init_physics(self, dynamics_class, integrator, substeps, action_repeat)
+
+        # Observations are copied from the dynamics into preallocated buffers; with
+        # reuse_observations, step() returns the same read-only array every time
+        self._observation = ObservationBuffer(self.OBSERVATION, reuse_observations)
 
-        EzPickle.__init__(self)
         self.seed()
 
         # Observation is all state values except yaw and its derivative
@@ -50,32 +62,51 @@ class Takeoff(gym.Env, EzPickle):
 
         self.prev_shaping = None
 
-        # Create cusom dynamics model
-        self.dynamics = DJIPhantomDynamics(self.FRAMES_PER_SECOND)
+        # Create cusom dynamics model once, then reuse it
+        if self.dynamics is None:
+            self.dynamics = self.dynamics_class(self.FRAMES_PER_SECOND, integrator=self.integrator, substeps=self.substeps)
 
         # Initialize custom dynamics
         state = np.zeros(12)
-        self.dynamics.setState(state)
+        self.dynamics.reinit(state)
+
+        self._step(np.array([0, 0, 0, 0]))
 
-        return self.step(np.array([0, 0, 0, 0]))[0]
+        return self._observation()
 
     def step(self, action):
 
+        # Apply the action for several dynamics updates, stopping early once the episode is done
+        reward = 0
+        for k in range(self.action_repeat):
+            r, done = self._step(action, k > 0)
+            reward += r
+            if done:
+                break
+
+        return self._observation(), reward, done, {}
+
+    def _step(self, action, repeat=False):
+        '''
+        Applies an action for one dynamics update, leaving the new state in the observation buffer;
+        returns the reward and done flag.
+        repeat True when the motors are already set from the same action
+        '''
+
         # Abbreviation
         d = self.dynamics
 
-        d.setMotors(action)
+        if not repeat:
+            d.setMotors(action)
         d.update()
 
         # Get new state from dynamics
-        posx, velx, posy, vely, posz, velz, phi, velphi, theta, veltheta, psi, _ = d.getState()
+        x = d.getState(self._observation.state)
+        posx, posy, posz, phi, theta, psi = x[0], x[2], x[4], x[6], x[8], x[10]
 
         # Set pose in display
         self.pose = posx, posy, posz, phi, theta, psi
 
-        # Convert state to usable form
-        state = np.array([posx, velx, posy, vely, posz, velz, phi, velphi, theta, veltheta])
-
         # Negate Z position to get ENU altitude from NED
         altitude = -posz
 
@@ -88,7 +119,19 @@ class Takeoff(gym.Env, EzPickle):
 
         done = False
 
-        return np.array(state, dtype=np.float32), reward, done, {}
+        return reward, done
+
+    def get_snapshot(self, out=None):
+        '''
+        Returns the full simulator state as a flat array (see snapshot.py)
+        '''
+        return snapshot.get_snapshot(self, out)
+
+    def set_snapshot(self, state):
+        '''
+        Restores the full simulator state from an array returned by get_snapshot()
+        '''
+        snapshot.set_snapshot(self, state)
 
     def render(self, mode='human'):
 
@@ -112,8 +155,18 @@ def constrain_abs(x, lim):
 
 def heuristic(env, s, lastError):
 
+    u, lastError = heuristic_batch(env, np.asarray(s)[np.newaxis], np.array([lastError]))
+
+    return u[0,0], lastError[0]
+
+def heuristic_batch(env, s, lastError):
+    '''
+    Vectorized heuristic(): returns the (N,4) actions for an (N,10) array of
+    states, and the new (N,) array of velocity errors
+    '''
+
     # Extract altitude, vertical velocity from state, negating for NED => ENU
-    posz, velz = -s[4:6]
+    posz, velz = -s[:,4], -s[:,5]
 
     # PID params
     ALT_P = 1.0
@@ -127,7 +180,7 @@ def heuristic(env, s, lastError):
     velError = velTarget - velz
 
     # Update error integral and error derivative
-    deltaError = (velError - lastError) / dt if abs(lastError) > 0 else 0
+    deltaError = np.where(np.abs(lastError) > 0, (velError - lastError) / dt, 0)
     lastError = velError
 
     # Compute control u
@@ -135,7 +188,8 @@ def heuristic(env, s, lastError):
 
     u = np.clip(u, -1, +1)
 
-    return u, lastError
+    # Same value for all motors
+    return np.repeat(u[:,np.newaxis], 4, axis=1), lastError
 
 def heuristic_takeoff(env, renderer=None, seed=None):
 
@@ -172,6 +226,25 @@ def heuristic_takeoff(env, renderer=None, seed=None):
     env.close()
     return total_reward
 
+def heuristic_takeoff_batch(num_episodes=1000, seed=None, **kwargs):
+    '''
+    Runs num_episodes episodes of the heuristic at once in a VecTakeoff,
+    constructed with any further keyword arguments; returns the per-episode
+    results of vecenv.evaluate()
+    '''
+    from gym_copter.envs.vectakeoff import VecTakeoff
+
+    env = VecTakeoff(num_episodes, **kwargs)
+
+    lastError = np.zeros(num_episodes)
+
+    def policy(s):
+        nonlocal lastError
+        action, lastError = heuristic_batch(env, s, lastError)
+        return action
+
+    return vecenv.evaluate(env, policy, seed)
+
 
 if __name__ == '__main__':
 
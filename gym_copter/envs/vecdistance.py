@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+'''
+Vectorized distance-maximizing environment: steps K copters at once using
+batched dynamics, resetting finished sub-episodes in place.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from gym_copter.envs.distance import Distance
+from gym_copter.envs.vecenv import VecCopterEnv
+
+class VecDistance(VecCopterEnv):
+    '''
+    Behaves like K independent copies of Distance wrapped in a TimeLimit.
+    Actions are a (K,4) array of motor values; step() returns (K,10)
+    observations and (K,) reward and done arrays.
+    '''
+
+    FRAMES_PER_SECOND = Distance.FRAMES_PER_SECOND
+
+    # Same observation as Distance
+    OBSERVATION = Distance.OBSERVATION
+
+    # Distance never stops its motors
+    STOP_WHEN_LANDED = False
+
+    def __init__(self, num_envs=8, max_episode_steps=1000, integrator='euler', substeps=1, auto_reset=True, dtype=float,
+                 randomize=None, contact='step', action_repeat=1):
+
+        VecCopterEnv.__init__(self, num_envs, 4, max_episode_steps, integrator, substeps, auto_reset, dtype, randomize, contact, action_repeat)
+
+    def _motors(self, actions):
+
+        # Actions are the motor values themselves
+        return np.array(actions, dtype=float)
+
+    def _initial_states(self, mask):
+
+        n = np.count_nonzero(mask)
+
+        return np.zeros((n,12)), None
+
+    def _shaping(self, state):
+
+        # Reward is horizontal distance from the starting point
+        return np.sqrt(state[:,0]**2 + state[:,2]**2)
+
+    def _done(self, state, status, reward):
+
+        # Episodes end only through the time limit
+        return np.zeros(self.num_envs, dtype=bool)
@@ -0,0 +1,395 @@
+'''
+Base class for vectorized copter environments: steps K copters at once
+using batched dynamics, resetting finished sub-episodes in place.
+
+Also provides rollout(), which runs open-loop action sequences through an
+environment from its current state, for shooting-based planners, and
+evaluate(), which runs one closed-loop episode per copter, for evaluating
+controllers over many episodes at once.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from gym import spaces
+from gym.utils import seeding
+from gym.vector import VectorEnv
+
+from gym_copter.dynamics.djiphantom import BatchDJIPhantomDynamics
+from gym_copter.envs.common import check_action_repeat
+from gym_copter.envs.noise import ResetNoise
+from gym_copter.envs.observation import index_map
+
+class VecCopterEnv(VectorEnv):
+    '''
+    Behaves like K independent copies of a copter environment wrapped in a
+    TimeLimit.  Actions are a (K,action_dim) array; step() returns
+    (K,obs_dim) observations and (K,) reward and done arrays.  When a
+    sub-episode finishes, its final observation is stored in
+    info['terminal_observation'] and the returned observation is the first
+    one of the next episode, unless auto_reset is False.
+
+    Subclasses set OBSERVATION (the state indices observed),
+    FRAMES_PER_SECOND and, for random initial conditions, RESET_NOISE, and
+    implement _motors(), _initial_states(), _shaping() and _done().
+
+    Each copter draws its reset noise from its own stream (see noise.py), so
+    that copter k's episodes depend only on the seed and k, and copter 0's
+    match those of the single environment seeded alike.
+
+    With dtype=np.float32, the dynamics, shaping and rewards are computed
+    in single precision end to end.
+
+    contact 'step' or 'event' selects the ground-contact handling of the
+    dynamics (see MultirotorDynamics).
+
+    action_repeat applies each action for that many dynamics updates, as the
+    environments' own action_repeat does; copters whose episodes end part way
+    through are left untouched for the remaining updates.
+
+    randomize optionally maps Parameters constructor arguments (b, d, m, l,
+    Ix, Iy, Iz, Jr, maxrpm) to distributions, from which each copter draws
+    its own value whenever it resets: either a (low, high) pair for a
+    uniform distribution, or a function f(np_random, n) returning n values.
+    '''
+
+    # Indices of the observed state values
+    OBSERVATION = ()
+
+    # Values per reset, and Generator method and arguments drawing them (see noise.py), or None
+    RESET_NOISE = None
+
+    # Copters stop their motors and dynamics once they have landed
+    STOP_WHEN_LANDED = True
+
+    def __init__(self, num_envs, action_dim, max_episode_steps, integrator='euler', substeps=1, auto_reset=True, dtype=float,
+                 randomize=None, contact='step', action_repeat=1):
+
+        VectorEnv.__init__(self, num_envs,
+                spaces.Box(-np.inf, np.inf, shape=(len(self.OBSERVATION),), dtype=np.float32),
+                spaces.Box(-1, +1, (action_dim,), dtype=np.float32))
+
+        # Reset noise comes from one stream per copter, drawn in blocks
+        self._noise = None if self.RESET_NOISE is None else ResetNoise(num_envs, *self.RESET_NOISE)
+
+        self.seed()
+
+        # None for no time limit
+        self.max_episode_steps = max_episode_steps
+
+        self.auto_reset = auto_reset
+
+        self.randomize = randomize
+
+        self.action_repeat = check_action_repeat(action_repeat)
+
+        # One dynamics model for all copters
+        self.dynamics = BatchDJIPhantomDynamics(num_envs, self.FRAMES_PER_SECOND, integrator=integrator, substeps=substeps, dtype=dtype,
+                                                contact=contact)
+
+        self.prev_shaping = np.zeros(num_envs, dtype)
+        self.elapsed_steps = np.zeros(num_envs, dtype=int)
+
+        # Observe contiguous state values through a slice, so that each observation takes a single copy
+        self._observed = index_map(self.OBSERVATION)
+
+        self._actions = None
+
+    def seed(self, seed=None):
+        self.np_random, seed = seeding.np_random(seed)
+        if self._noise is not None:
+            self._noise.seed(seed)
+        return [seed]
+
+    def use_bank(self, bank, start=0):
+        '''
+        Takes initial conditions from the rows of a bank made by
+        noise.make_bank() for this environment, copter k's n-th reset from
+        now taking row start + k + n*K, or from the seeded streams again if
+        bank is None
+        '''
+
+        if self._noise is None:
+            raise ValueError('%s has no random initial conditions' % type(self).__name__)
+
+        self._noise.use_bank(bank, start)
+
+    def reset_wait(self):
+
+        self._reset(np.ones(self.num_envs, dtype=bool))
+
+        return self._observation()
+
+    def step_async(self, actions):
+
+        self._actions = np.asarray(actions)
+
+    def step_wait(self):
+
+        reward, done = self._step()
+
+        # Repeat the actions for the copters whose episodes are still running
+        for _ in range(self.action_repeat - 1):
+            if done.all():
+                break
+            r, d = self._step(~done)
+            reward += r
+            done |= d
+
+        # Emulate gym's TimeLimit wrapper
+        self.elapsed_steps += 1
+        if self.max_episode_steps is None:
+            truncated = np.zeros(self.num_envs, dtype=bool)
+        else:
+            truncated = ~done & (self.elapsed_steps >= self.max_episode_steps)
+        done |= truncated
+
+        obs = self._observation()
+
+        info = {}
+
+        # Reset finished sub-episodes in place
+        if self.auto_reset and done.any():
+            info['terminal_observation'] = obs.copy()
+            info['TimeLimit.truncated'] = truncated
+            self._reset(done)
+            obs[done] = self._observation()[done]
+
+        return obs, reward, done, info
+
+    def close_extras(self, **kwargs):
+
+        return
+
+    def _step(self, active=None):
+        '''
+        Applies the stored actions and advances the dynamics, returning the reward and done arrays
+        active optional boolean mask of the copters to advance; the others get zero reward
+        '''
+
+        # Abbreviation
+        d = self.dynamics
+        status = d.getStatus()
+
+        landed = status == d.STATUS_LANDED
+
+        motors = self._motors(self._actions)
+
+        # Stop motors after safe landing; only copters still in the air get their dynamics updated
+        if self.STOP_WHEN_LANDED:
+            motors[landed] = 0
+            d.setMotors(motors)
+            d.update(~landed if active is None else active & ~landed)
+
+        else:
+            d.setMotors(motors)
+            d.update(active)
+
+        shaping = self._shaping(d._x)
+
+        reward = shaping - self.prev_shaping
+
+        if active is None:
+            self.prev_shaping = shaping
+        else:
+            self.prev_shaping[active] = shaping[active]
+
+        done = self._done(d._x, status, reward)
+
+        if active is not None:
+            reward[~active] = 0
+            done &= active
+
+        return reward, done
+
+    def _reset(self, mask):
+        '''
+        Resets the copters selected by a boolean mask
+        '''
+
+        d = self.dynamics
+
+        n = np.count_nonzero(mask)
+
+        # Draw new vehicle parameters first, so that the initial perturbation sees the new mass
+        if self.randomize:
+            d.setParameters(mask, **{name: self._sample(distribution, n) for name, distribution in self.randomize.items()})
+
+        state, force = self._initial_states(mask)
+
+        d.reinit(state, mask)
+
+        if force is not None:
+            d.perturb(force, mask)
+
+        # Take a first step with zero action, as the environments' reset() does
+        d.setMotors(self._motors(np.zeros((self.num_envs,) + self.single_action_space.shape)))
+        d.update(mask)
+
+        self.prev_shaping[mask] = self._shaping(d._x)[mask]
+        self.elapsed_steps[mask] = 0
+
+    def _sample(self, distribution, n):
+
+        if callable(distribution):
+            return distribution(self.np_random, n)
+
+        low, high = distribution
+
+        return self.np_random.uniform(low, high, n)
+
+    def _observation(self):
+
+        return np.array(self.dynamics._x[:,self._observed], dtype=np.float32)
+
+    def _motors(self, actions):
+        '''
+        Returns the (K,4) motor values for a (K,action_dim) array of actions
+        '''
+        raise NotImplementedError
+
+    def _initial_states(self, mask):
+        '''
+        Returns initial states for the n copters selected by a boolean mask,
+        and an (n,6) array of initial perturbations or None
+        '''
+        raise NotImplementedError
+
+    def _shaping(self, state):
+        '''
+        Returns the shaping value for each row of a (K,12) state array
+        '''
+        raise NotImplementedError
+
+    def _done(self, state, status, reward):
+        '''
+        Returns the done array, given the new states and the flight status
+        before the step, adding any bonuses and penalties to reward in place
+        '''
+        raise NotImplementedError
+
+def evaluate(env, policy, seed=None, bank=None, start=0):
+    '''
+    Runs one episode in each copter of a vectorized environment, choosing
+    actions with policy, a function from (K, obs_dim) observations to
+    (K, action_dim) actions.  Once an episode is done, its copter's later
+    rewards are ignored.  The environment should have a time limit, or
+    episodes that always end, and is left with auto_reset off.
+    seed optional seed for the environment's random number generator
+    bank optional bank of initial conditions (see noise.py), copter k
+    starting from row start + k
+    returns (K,) total rewards, (K,) episode lengths in steps, the (K,)
+    flight status at the end of each episode and the (K, obs_dim) final
+    observations
+    '''
+
+    if seed is not None:
+        env.seed(seed)
+
+    if bank is not None:
+        env.use_bank(bank, start)
+
+    env.auto_reset = False
+
+    obs = env.reset()
+
+    n = env.num_envs
+
+    returns = np.zeros(n)
+    lengths = np.zeros(n, dtype=int)
+    status = np.zeros(n, dtype=int)
+    final = np.zeros_like(obs)
+
+    finished = np.zeros(n, dtype=bool)
+
+    while not finished.all():
+
+        obs, reward, done, _ = env.step(policy(obs))
+
+        running = ~finished
+        returns[running] += reward[running]
+        lengths[running] += 1
+
+        # Record how the episodes that have just ended ended
+        ended = running & done
+        status[ended] = env.dynamics.getStatus()[ended]
+        final[ended] = obs[ended]
+
+        finished |= done
+
+    return returns, lengths, status, final
+
+def rollout(env, actions, vec_class):
+    '''
+    Runs open-loop action sequences through an environment from its current
+    state, leaving the environment unchanged.  Once an episode is done, its
+    remaining steps repeat the final observation with zero reward.
+    actions (T, action_dim) array, or (N, T, action_dim) for N sequences,
+    which are run together in a vec_class environment
+    returns (T, obs_dim) observations and (T,) reward and done arrays, with a
+    leading dimension N for batched sequences
+    Only the batched form is accelerated: a single sequence is run through
+    the environment's own step(), at the cost of stepping by hand, which for
+    one sequence is several times cheaper than a vectorized environment of one.
+    '''
+
+    actions = np.asarray(actions)
+
+    if actions.ndim == 2:
+        return _rollout_single(env, actions)
+
+    n, count = actions.shape[:2]
+
+    vec = vec_class(n, max_episode_steps=None, integrator=env.integrator, substeps=env.substeps, auto_reset=False,
+                    contact=env.contact, action_repeat=env.action_repeat)
+
+    # Use the environment's own vehicle, starting in its current state
+    vec.dynamics = env.dynamics.batch(n)
+    vec.prev_shaping[:] = env.prev_shaping
+
+    observations = np.empty((n, count) + vec.single_observation_space.shape, dtype=np.float32)
+    rewards = np.zeros((n, count))
+    dones = np.zeros((n, count), dtype=bool)
+
+    finished = np.zeros(n, dtype=bool)
+
+    for k in range(count):
+
+        obs, reward, done, _ = vec.step(actions[:,k])
+
+        observations[:,k] = obs
+        observations[finished,k] = observations[finished,k-1]
+        rewards[~finished,k] = reward[~finished]
+
+        finished |= done
+        dones[:,k] = finished
+
+    return observations, rewards, dones
+
+def _rollout_single(env, actions):
+
+    snapshot = env.get_snapshot()
+    pose = env.pose
+
+    count = len(actions)
+
+    observations = np.empty((count,) + env.observation_space.shape, dtype=np.float32)
+    rewards = np.zeros(count)
+    dones = np.zeros(count, dtype=bool)
+
+    for k in range(count):
+
+        observations[k], rewards[k], dones[k], _ = env.step(actions[k])
+
+        if dones[k]:
+            observations[k+1:] = observations[k]
+            dones[k+1:] = True
+            break
+
+    env.set_snapshot(snapshot)
+    env.pose = pose
+
+    return observations, rewards, dones
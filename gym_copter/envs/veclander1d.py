@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+'''
+Vectorized 1D Copter-Lander: steps K copters at once using batched dynamics,
+resetting finished sub-episodes in place.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from gym_copter.envs.lander1d import Lander1D
+from gym_copter.envs.vecenv import VecCopterEnv
+
+class VecLander1D(VecCopterEnv):
+    '''
+    Behaves like K independent copies of Lander1D wrapped in a TimeLimit.
+    Actions are a (K,1) array; step() returns (K,2) observations and (K,)
+    reward and done arrays.
+    '''
+
+    # Parameters shared with Lander1D
+    INITIAL_ALTITUDE      = Lander1D.INITIAL_ALTITUDE
+    PENALTY_FACTOR        = Lander1D.PENALTY_FACTOR
+    BOUNDS                = Lander1D.BOUNDS
+    SAFE_LANDING_BONUS    = Lander1D.SAFE_LANDING_BONUS
+    FRAMES_PER_SECOND     = Lander1D.FRAMES_PER_SECOND
+
+    # Same observation as Lander1D
+    OBSERVATION = Lander1D.OBSERVATION
+
+    def __init__(self, num_envs=8, max_episode_steps=1000, integrator='euler', substeps=1, auto_reset=True, dtype=float,
+                 randomize=None, contact='step', action_repeat=1):
+
+        VecCopterEnv.__init__(self, num_envs, 1, max_episode_steps, integrator, substeps, auto_reset, dtype, randomize, contact, action_repeat)
+
+    def _motors(self, actions):
+
+        # Keep action in interval [0,1]
+        return np.repeat(np.clip(actions[:,:1], 0, 1), 4, axis=1)
+
+    def _initial_states(self, mask):
+
+        n = np.count_nonzero(mask)
+
+        state = np.zeros((n,12))
+        state[:,4] = -self.INITIAL_ALTITUDE
+
+        return state, None
+
+    def _shaping(self, state):
+
+        # Reward is a simple penalty for overall distance and velocity
+        return -self.PENALTY_FACTOR * np.sqrt(np.sum(state[:,4:6]**2, axis=1))
+
+    def _done(self, state, status, reward):
+
+        landed = status == self.dynamics.STATUS_LANDED
+
+        # Lose bigly if we go outside window
+        outside = np.abs(state[:,2]) >= self.BOUNDS
+
+        # It's all over once we're on the ground
+        reward[~outside & landed] += self.SAFE_LANDING_BONUS
+
+        return outside | landed | (status == self.dynamics.STATUS_CRASHED)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+'''
+Vectorized 2D Copter-Lander: steps K copters at once using batched dynamics,
+resetting finished sub-episodes in place.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from gym_copter.envs.lander2d import Lander2D
+from gym_copter.envs.vecenv import VecCopterEnv
+
+class VecLander2D(VecCopterEnv):
+    '''
+    Behaves like K independent copies of Lander2D wrapped in a TimeLimit.
+    Actions are a (K,2) array; step() returns (K,6) observations and (K,)
+    reward and done arrays.
+    '''
+
+    # Parameters shared with Lander2D
+    INITIAL_RANDOM_FORCE  = Lander2D.INITIAL_RANDOM_FORCE
+    INITIAL_ALTITUDE      = Lander2D.INITIAL_ALTITUDE
+    LANDING_RADIUS        = Lander2D.LANDING_RADIUS
+    PENALTY_FACTOR        = Lander2D.PENALTY_FACTOR
+    BOUNDS                = Lander2D.BOUNDS
+    OUT_OF_BOUNDS_PENALTY = Lander2D.OUT_OF_BOUNDS_PENALTY
+    INSIDE_RADIUS_BONUS   = Lander2D.INSIDE_RADIUS_BONUS
+    FRAMES_PER_SECOND     = Lander2D.FRAMES_PER_SECOND
+
+    # Same observation as Lander2D
+    OBSERVATION = Lander2D.OBSERVATION
+
+    # Same reset noise as Lander2D
+    RESET_NOISE = Lander2D.RESET_NOISE
+
+    def __init__(self, num_envs=8, max_episode_steps=2000, integrator='euler', substeps=1, auto_reset=True, dtype=float,
+                 randomize=None, contact='step', action_repeat=1):
+
+        VecCopterEnv.__init__(self, num_envs, 2, max_episode_steps, integrator, substeps, auto_reset, dtype, randomize, contact, action_repeat)
+
+    def _motors(self, actions):
+
+        # Keep motors in interval [0,1]
+        m = np.clip(actions, 0, 1)
+        return np.column_stack((m[:,0], m[:,1], m[:,1], m[:,0]))
+
+    def _initial_states(self, mask):
+
+        # Random initial push sideways and downward
+        push = self._noise(mask)
+
+        n = len(push)
+
+        state = np.zeros((n,12))
+        state[:,4] = -self.INITIAL_ALTITUDE
+
+        force = np.zeros((n,6))
+        force[:,1:3] = push
+
+        return state, force
+
+    def _shaping(self, state):
+
+        # A simple penalty for overall distance and velocity
+        return -self.PENALTY_FACTOR * np.sqrt(np.sum(state[:,2:6]**2, axis=1))
+
+    def _done(self, state, status, reward):
+
+        posy = state[:,2]
+
+        landed = status == self.dynamics.STATUS_LANDED
+
+        # Lose bigly if we go outside window
+        outside = np.abs(posy) >= self.BOUNDS
+        reward[outside] -= self.OUT_OF_BOUNDS_PENALTY
+
+        # Win bigly we land safely between the flags
+        reward[~outside & landed & (np.abs(posy) < self.LANDING_RADIUS)] += self.INSIDE_RADIUS_BONUS
+
+        # It's all over once we're on the ground or have crashed
+        return outside | landed | (status == self.dynamics.STATUS_CRASHED)
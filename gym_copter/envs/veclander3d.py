@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+'''
+Vectorized 3D Copter-Lander: steps K copters at once using batched dynamics,
+resetting finished sub-episodes in place.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from gym_copter.envs.lander3d import Lander3D
+from gym_copter.envs.vecenv import VecCopterEnv
+from gym_copter.envs import kernels
+
+class VecLander3D(VecCopterEnv):
+    '''
+    Behaves like K independent copies of Lander3D wrapped in a TimeLimit.
+    Actions are a (K,3) array; step() returns (K,10) observations and (K,)
+    reward and done arrays.  When a sub-episode finishes, its final
+    observation is stored in info['terminal_observation'] and the returned
+    observation is the first one of the next episode.
+
+    With compiled=True, each step runs as one fused Numba kernel (see
+    kernels.py), falling back to NumPy when Numba is not installed or the
+    dynamics use sub-steps, an integrator other than Euler, or event contact.
+    Compiled results match the NumPy path's to within rounding error, not
+    bit for bit (see kernels.py).
+    '''
+
+    # Parameters shared with Lander3D
+    INITIAL_RANDOM_OFFSET = Lander3D.INITIAL_RANDOM_OFFSET
+    INITIAL_ALTITUDE      = Lander3D.INITIAL_ALTITUDE
+    LANDING_RADIUS        = Lander3D.LANDING_RADIUS
+    XY_PENALTY_FACTOR     = Lander3D.XY_PENALTY_FACTOR
+    ANGLE_PENALTY_FACTOR  = Lander3D.ANGLE_PENALTY_FACTOR
+    BOUNDS                = Lander3D.BOUNDS
+    OUT_OF_BOUNDS_PENALTY = Lander3D.OUT_OF_BOUNDS_PENALTY
+    INSIDE_RADIUS_BONUS   = Lander3D.INSIDE_RADIUS_BONUS
+    FRAMES_PER_SECOND     = Lander3D.FRAMES_PER_SECOND
+    MAX_ANGLE             = Lander3D.MAX_ANGLE
+
+    # Same observation as Lander3D
+    OBSERVATION = Lander3D.OBSERVATION
+
+    # Same reset noise as Lander3D
+    RESET_NOISE = Lander3D.RESET_NOISE
+
+    def __init__(self, num_envs=8, max_episode_steps=10000, compiled=False, integrator='euler', substeps=1, auto_reset=True, dtype=float,
+                 randomize=None, contact='step', action_repeat=1):
+
+        # Pre-convert max-angle degrees to radian
+        self.max_angle = np.radians(self.MAX_ANGLE)
+
+        VecCopterEnv.__init__(self, num_envs, 3, max_episode_steps, integrator, substeps, auto_reset, dtype, randomize, contact, action_repeat)
+
+        # Fused step kernel, if requested and available
+        self.compiled = compiled and kernels.HAVE_NUMBA and integrator == 'euler' and substeps == 1 and contact == 'step'
+        if self.compiled:
+            self._constants = kernels.lander3d_constants(self)
+            self._rewards = np.zeros(num_envs, dtype)
+            self._dones = np.zeros(num_envs, dtype=bool)
+
+    def _step(self, active=None):
+
+        # Repeated actions for a subset of copters take the NumPy path
+        if not self.compiled or active is not None:
+            return VecCopterEnv._step(self, active)
+
+        d = self.dynamics
+
+        kernels.lander3d_step(self._actions, d._x, d._dxdt, d._status, d._inertialAccel, d._perturb,
+                d._omegas, d._U1, d._U2, d._U3, d._U4, d._Omega, d._mixer.reshape((-1,) + d._mixer.shape[-2:]), d._params, self._constants, self.prev_shaping, self._rewards, self._dones)
+
+        return self._rewards.copy(), self._dones.copy()
+
+    def _motors(self, actions):
+
+        # Map throttle demand from [-1,+1] to [0,1] and use mixer to set motors
+        t, r, p = (actions[:,0]+1)/2, actions[:,1], actions[:,2]
+        return np.clip(np.column_stack((t-r-p, t+r+p, t+r-p, t-r+p)), 0, 1)
+
+    def _initial_states(self, mask):
+
+        offset = self.INITIAL_RANDOM_OFFSET * self._noise(mask)
+
+        state = np.zeros((len(offset),12))
+        state[:,0] =  offset[:,0]
+        state[:,2] =  offset[:,1]
+        state[:,4] = -self.INITIAL_ALTITUDE
+
+        return state, None
+
+    def _shaping(self, state):
+
+        # Reward is a simple penalty for overall distance and angle and their first derivatives
+        return -(self.XY_PENALTY_FACTOR * np.sqrt(np.sum(state[:,0:6]**2, axis=1)) +
+                self.ANGLE_PENALTY_FACTOR * np.sqrt(np.sum(state[:,6:10]**2, axis=1)))
+
+    def _done(self, state, status, reward):
+
+        posx, posy, phi, theta = state[:,0], state[:,2], state[:,6], state[:,8]
+
+        landed = status == self.dynamics.STATUS_LANDED
+
+        # Lose bigly if we go out of bounds or for excess roll or pitch
+        failed = ((np.abs(posx) >= self.BOUNDS) | (np.abs(posy) >= self.BOUNDS) |
+                  (np.abs(phi) >= self.max_angle) | (np.abs(theta) >= self.max_angle))
+        reward[failed] = -self.OUT_OF_BOUNDS_PENALTY
+
+        # Win bigly we land safely between the flags
+        reward[landed & (posx**2+posy**2 < self.LANDING_RADIUS**2)] += self.INSIDE_RADIUS_BONUS
+
+        # It's all over once we're on the ground or have crashed
+        return failed | landed | (status == self.dynamics.STATUS_CRASHED)
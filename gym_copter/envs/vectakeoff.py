@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+'''
+Vectorized takeoff-and-hover environment: steps K copters at once using
+batched dynamics, resetting finished sub-episodes in place.
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+
+from gym_copter.envs.takeoff import Takeoff
+from gym_copter.envs.vecenv import VecCopterEnv
+
+class VecTakeoff(VecCopterEnv):
+    '''
+    Behaves like K independent copies of Takeoff wrapped in a TimeLimit.
+    Actions are a (K,4) array of motor values; step() returns (K,10)
+    observations and (K,) reward and done arrays.
+    '''
+
+    TARGET_ALTITUDE   = Takeoff.TARGET_ALTITUDE
+    FRAMES_PER_SECOND = Takeoff.FRAMES_PER_SECOND
+
+    # Same observation as Takeoff
+    OBSERVATION = Takeoff.OBSERVATION
+
+    # Takeoff never stops its motors
+    STOP_WHEN_LANDED = False
+
+    def __init__(self, num_envs=8, max_episode_steps=1000, integrator='euler', substeps=1, auto_reset=True, dtype=float,
+                 randomize=None, contact='step', action_repeat=1):
+
+        VecCopterEnv.__init__(self, num_envs, 4, max_episode_steps, integrator, substeps, auto_reset, dtype, randomize, contact, action_repeat)
+
+    def _motors(self, actions):
+
+        # Actions are the motor values themselves
+        return np.array(actions, dtype=float)
+
+    def _initial_states(self, mask):
+
+        n = np.count_nonzero(mask)
+
+        return np.zeros((n,12)), None
+
+    def _shaping(self, state):
+
+        # Negated distance from target altitude, with Z position negated to get ENU altitude from NED
+        return -np.abs(-state[:,4] - self.TARGET_ALTITUDE)
+
+    def _done(self, state, status, reward):
+
+        # Episodes end only through the time limit
+        return np.zeros(self.num_envs, dtype=bool)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+'''
+Monte Carlo evaluation of a controller on a gym_copter environment, running
+episodes across a process pool:
+
+    python -m gym_copter.evaluate Lander-v3 --width 0.05
+
+The controller is either 'heuristic', the environment's built-in heuristic,
+or an importable function 'package.module:function' mapping an observation
+to an action.  Episode k is seeded from the base seed and k alone, so
+results do not depend on the number of worker processes.  One line per
+episode is streamed to stdout: episode number, seed, return, steps, and the
+landing-success and crash flags.  Environments without a landing (Distance,
+Takeoff) count every episode that ends without a crash as a success.
+
+With --width, evaluation stops once the Wilson confidence interval on the
+success rate is narrower than that width.  Episodes are judged in order, so
+the stopping point does not depend on the number of workers either.
+
+With --bank, episode k instead starts from row k of a bank of initial
+conditions made by gym_copter.envs.noise, so that controllers compared on
+the same bank face exactly the same scenarios:
+
+    python -m gym_copter.envs.noise Lander-v3 lander3d.npy -n 1000000
+    python -m gym_copter.evaluate Lander-v3 --bank lander3d.npy -n 10000
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import argparse
+import importlib
+import multiprocessing
+import sys
+from math import sqrt
+from statistics import NormalDist
+
+import numpy as np
+import gym
+
+import gym_copter  # registers the environments
+from gym_copter.envs import lander1d, lander2d, lander3d, distance, takeoff
+from gym_copter.envs.noise import load_bank
+
+# Set by _init() in each worker process
+_env = None
+_controller = None
+_seed = None
+_bank = None
+
+def episode_seed(seed, k):
+    '''
+    Returns the seed for episode k of an evaluation with the specified base seed
+    '''
+    return int(np.random.SeedSequence(seed, spawn_key=(k,)).generate_state(1)[0])
+
+def wilson_interval(successes, n, confidence=0.95):
+    '''
+    Returns the (lower, upper) Wilson score interval for a success rate
+    '''
+
+    z = NormalDist().inv_cdf((1 + confidence) / 2)
+
+    p = successes / n
+    denom = 1 + z*z/n
+    center = (p + z*z/(2*n)) / denom
+    half = z * sqrt(p*(1-p)/n + z*z/(4*n*n)) / denom
+
+    return center - half, center + half
+
+def heuristic_policy(env):
+    '''
+    Returns a policy for one episode of the built-in heuristic of an environment
+    '''
+
+    u = env.unwrapped
+
+    if isinstance(u, distance.Distance):
+        return lambda s: distance.heuristic(u, s)
+
+    if isinstance(u, takeoff.Takeoff):
+
+        lastError = 0
+
+        def policy(s):
+            nonlocal lastError
+            action, lastError = takeoff.heuristic(u, s, lastError)
+            return action * np.ones(4)
+
+        return policy
+
+    for module in (lander1d, lander2d, lander3d):
+        if type(u).__module__ == module.__name__:
+            return module.heuristic
+
+    raise ValueError('No heuristic for %s' % type(u).__name__)
+
+def _load(controller):
+
+    if controller == 'heuristic':
+        return heuristic_policy
+
+    if ':' not in controller:
+        raise ValueError('Controller %r is neither \'heuristic\' nor \'package.module:function\'' % controller)
+
+    module, name = controller.split(':')
+    function = getattr(importlib.import_module(module), name)
+
+    return lambda env: function
+
+def _init(env_id, controller, seed, bank):
+
+    global _env, _controller, _seed, _bank
+
+    _env = gym.make(env_id)
+    _controller = _load(controller)
+    _seed = seed
+
+    # Each process maps the bank itself, sharing its pages with the others
+    _bank = None if bank is None else load_bank(bank)
+
+def _episode(k):
+
+    env = _env
+
+    seed = episode_seed(_seed, k)
+
+    env.seed(seed)
+
+    if _bank is not None:
+        env.unwrapped.use_bank(_bank, k)
+
+    policy = _controller(env)
+
+    obs = env.reset()
+    total = 0
+    steps = 0
+
+    while True:
+
+        obs, reward, done, _ = env.step(policy(obs))
+
+        total += reward
+        steps += 1
+
+        if done:
+            break
+
+    return k, seed, total, steps, _success(env), _crashed(env)
+
+def _crashed(env):
+
+    d = env.unwrapped.dynamics
+
+    return bool(d.getStatus() == d.STATUS_CRASHED)
+
+def _success(env):
+
+    u = env.unwrapped
+    d = u.dynamics
+
+    # No landing to judge
+    if isinstance(u, (distance.Distance, takeoff.Takeoff)):
+        return not _crashed(env)
+
+    # Lander1D has no landing radius; the others land at the origin of the modeled plane
+    x = d.getState()
+    radius = getattr(u, 'LANDING_RADIUS', np.inf)
+
+    return bool(d.getStatus() == d.STATUS_LANDED and x[d.STATE_X]**2 + x[d.STATE_Y]**2 < radius**2)
+
+def evaluate(env_id, controller='heuristic', episodes=10000, seed=0, workers=None, width=None, confidence=0.95, bank=None):
+    '''
+    Generates (episode, seed, return, steps, success, crashed) for successive
+    episodes, in order, stopping after the specified number of episodes or
+    once the confidence interval on the success rate is narrower than width.
+    workers number of processes (default one per CPU), or 0 to run in this process
+    bank optional path of a bank of initial conditions, whose row k starts
+    episode k; there are at most as many episodes as rows
+    '''
+
+    successes = 0
+
+    # Check the bank against the environment here, rather than in every worker
+    if bank is not None:
+
+        env = gym.make(env_id).unwrapped
+
+        if not hasattr(env, 'use_bank'):
+            raise ValueError('%s has no random initial conditions to take from a bank' % env_id)
+
+        rows = load_bank(bank)
+        env.use_bank(rows)
+        env.close()
+
+        episodes = min(episodes, len(rows))
+
+    if workers == 0:
+        _init(env_id, controller, seed, bank)
+        results = map(_episode, range(episodes))
+        pool = None
+
+    else:
+        pool = multiprocessing.Pool(workers, _init, (env_id, controller, seed, bank))
+        results = pool.imap(_episode, range(episodes), chunksize=4)
+
+    try:
+
+        for n, result in enumerate(results, 1):
+
+            yield result
+
+            successes += result[4]
+
+            if width is not None:
+                lower, upper = wilson_interval(successes, n, confidence)
+                if upper - lower < width:
+                    break
+
+    finally:
+
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+def main():
+
+    # Parse command-line arguments
+    parser = argparse.ArgumentParser(description='Monte Carlo evaluation of a controller on a gym_copter environment')
+    parser.add_argument('env', help='Environment id, e.g. Lander-v3')
+    parser.add_argument('-c', '--controller', default='heuristic',
+            help='\'heuristic\' (default) or an importable function \'package.module:function\' from observation to action')
+    parser.add_argument('-n', '--episodes', type=int, default=10000, help='Maximum number of episodes')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='Base seed for the per-episode seeds')
+    parser.add_argument('-w', '--workers', type=int, default=None, help='Number of worker processes (default one per CPU; 0 for none)')
+    parser.add_argument('--width', type=float, default=None, help='Stop once the success-rate confidence interval is narrower than this')
+    parser.add_argument('--confidence', type=float, default=0.95, help='Confidence level of the interval')
+    parser.add_argument('--bank', default=None, help='Bank of initial conditions (.npy), one row per episode')
+    args = parser.parse_args()
+
+    print('episode       seed     return  steps success crashed')
+
+    n = successes = crashes = 0
+    total = 0
+
+    for k, seed, ret, steps, success, crashed in evaluate(args.env, args.controller, args.episodes, args.seed,
+                                                          args.workers, args.width, args.confidence, args.bank):
+
+        print('%7d %10d %+10.2f %6d %7d %7d' % (k, seed, ret, steps, success, crashed), flush=True)
+
+        n += 1
+        successes += success
+        crashes += crashed
+        total += ret
+
+    if n == 0:
+        return
+
+    lower, upper = wilson_interval(successes, n, args.confidence)
+
+    print('%d episodes: mean return %+.2f, success rate %.4f (%g%% interval %.4f-%.4f), crash rate %.4f' %
+          (n, total / n, successes / n, 100 * args.confidence, lower, upper, crashes / n), file=sys.stderr)
+
+if __name__ == '__main__':
+
+    main()
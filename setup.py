@@ -14,6 +14,7 @@ from setuptools import setup
 setup (name = 'gym_copter',
     version = '0.1',
     install_requires = ['gym', 'numpy'],
+    extras_require = {'numba': ['numba']},
     description = 'Gym environment for multicopters',
     packages = ['gym_copter', 'gym_copter.envs', 'gym_copter.dynamics', 'gym_copter.rendering'],
     author='Simon D. Levy',
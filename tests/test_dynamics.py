@@ -0,0 +1,468 @@
+'''
+Tests for the multirotor dynamics
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import pickle
+
+import numpy as np
+import pytest
+
+from gym_copter.dynamics import Parameters, parameterTable, P_MAXOMEGA, P_INVM, P_LB
+from gym_copter.dynamics.quadxap import QuadXAPDynamics
+from gym_copter.dynamics.djiphantom import PARAMS, DJIPhantomDynamics, BatchDJIPhantomDynamics, ScalarDJIPhantomDynamics
+from gym_copter.dynamics.djiphantom import PlanarDJIPhantomDynamics, VerticalDJIPhantomDynamics
+
+SINGLE = (DJIPhantomDynamics, ScalarDJIPhantomDynamics, PlanarDJIPhantomDynamics, VerticalDJIPhantomDynamics)
+
+def test_batched_rollout_rejects_quaternion():
+
+    d = DJIPhantomDynamics(50, attitude='quaternion')
+
+    states, _ = d.rollout(np.full((5,4), 0.6))
+    assert states.shape == (5, 12)
+
+    with pytest.raises(ValueError):
+        d.rollout(np.full((2,5,4), 0.6))
+
+@pytest.mark.parametrize('cls', SINGLE[1:])
+def test_batch_rejects_scalar_models(cls):
+
+    d = cls(50)
+
+    states, _ = d.rollout(np.full((5,4), 0.6))
+    assert states.shape == (5, 12)
+
+    with pytest.raises(ValueError):
+        d.batch(2)
+
+    with pytest.raises(ValueError):
+        d.rollout(np.full((2,5,4), 0.6))
+
+def test_batch_copies_vehicle_and_state():
+
+    d = DJIPhantomDynamics(50, integrator='rk4', substeps=2, contact='event')
+    d.setState(np.linspace(-1, 1, 12))
+    d.setMotors([0.6, 0.5, 0.6, 0.5])
+    d.update()
+
+    batch = d.batch(3)
+
+    assert batch.getState().shape == (3, 12)
+    assert np.allclose(batch.get_snapshot(), d.get_snapshot(), equal_nan=True)
+
+    d.update()
+    batch.setMotors(np.tile([0.6, 0.5, 0.6, 0.5], (3,1)))
+    batch.update()
+
+    assert np.allclose(batch.getState(), d.getState())
+
+def _climb_from_below_ground(make, motors, steps=5):
+
+    d = make()
+
+    # Below ground but rising, as after setState()
+    state = np.zeros(12)
+    state[4] = 0.1
+    state[5] = -1
+    d.setState(state)
+
+    states = []
+    for _ in range(steps):
+        d.setMotors(motors)
+        d.update()
+        states.append(np.array(d.getState(), dtype=float))
+
+    return np.array(states)
+
+@pytest.mark.parametrize('cls', SINGLE)
+def test_event_contact_needs_a_crossing(cls):
+
+    motors = np.full(4, 0.9)
+
+    step = _climb_from_below_ground(lambda: cls(50, contact='step'), motors)
+    event = _climb_from_below_ground(lambda: cls(50, contact='event'), motors)
+
+    assert np.array_equal(event, step)
+    assert step[-1,4] < 0.1
+
+def test_batch_event_contact_needs_a_crossing():
+
+    motors = np.full((1,4), 0.9)
+
+    step = _climb_from_below_ground(lambda: BatchDJIPhantomDynamics(1, 50, contact='step'), motors)
+    event = _climb_from_below_ground(lambda: BatchDJIPhantomDynamics(1, 50, contact='event'), motors)
+
+    assert np.array_equal(event, step)
+
+def _fly(d, state, force, motors):
+
+    d.setState(state)
+    d.perturb(force)
+
+    states, statuses = [], []
+    for m in motors:
+        d.setMotors(m)
+        d.update()
+        states.append(np.array(d.getState(), dtype=float))
+        statuses.append(d.getStatus())
+
+    return np.array(states), np.array(statuses)
+
+@pytest.mark.parametrize('substeps', (1, 3))
+@pytest.mark.parametrize('contact', ('step', 'event'))
+def test_scalar_matches_numpy(substeps, contact):
+
+    rng = np.random.default_rng(0)
+
+    for _ in range(20):
+
+        # Near hover, from random poses, so that some flights end on the ground
+        state = np.zeros(12)
+        state[0] = rng.normal()
+        state[4] = -rng.uniform(0, 5)
+        state[6], state[8] = rng.normal(0, 0.05, 2)
+        state[11] = rng.normal(0, 0.1)
+        force = rng.normal(0, 2, 6)
+        motors = rng.uniform(0.47, 0.53, (300, 4))
+
+        states, statuses = _fly(DJIPhantomDynamics(50, substeps=substeps, contact=contact), state, force, motors)
+        sstates, sstatuses = _fly(ScalarDJIPhantomDynamics(50, substeps=substeps, contact=contact), state, force, motors)
+
+        assert np.array_equal(sstates, states)
+        assert np.array_equal(sstatuses, statuses)
+
+def test_float32_stays_close_to_float64():
+
+    rng = np.random.default_rng(0)
+
+    n = 200
+
+    # Ten seconds of hovering from random positions
+    state = np.zeros((n,12))
+    state[:,0] = rng.normal(0, 3, n)
+    state[:,2] = rng.normal(0, 3, n)
+    state[:,4] = -rng.uniform(3, 20, n)
+    motors = np.clip(0.555 + rng.normal(0, 0.01, (500,n,4)), 0, 1)
+
+    results = []
+
+    for dtype in (np.float64, np.float32):
+
+        d = BatchDJIPhantomDynamics(n, 50, dtype=dtype)
+        d.setState(state)
+
+        states, statuses = [], []
+        for m in motors:
+            d.setMotors(m)
+            d.update()
+            states.append(d.getState().astype(float))
+            statuses.append(d.getStatus())
+
+        assert d.getState().dtype == dtype
+
+        results.append((np.array(states), np.array(statuses)))
+
+    (states, statuses), (states32, statuses32) = results
+
+    assert np.array_equal(statuses32, statuses)
+
+    airborne = statuses == BatchDJIPhantomDynamics.STATUS_AIRBORNE
+
+    error = np.abs(states32 - states)[airborne]
+
+    assert error[:,0:6:2].max() < 1e-3
+    assert error[:,6::2].max() < 1e-4
+
+def _descend(fps, contact, state, motors, seconds=30):
+    '''
+    Flies a batch until every vehicle is on the ground, returning the state
+    at and the status after each one's touchdown
+    '''
+
+    d = BatchDJIPhantomDynamics(len(state), fps, contact=contact)
+    d.setState(state)
+
+    touchdown = np.zeros_like(state)
+    status = np.full(len(state), d.STATUS_AIRBORNE)
+
+    for _ in range(int(fps * seconds)):
+        d.setMotors(motors)
+        d.update()
+        new = (status == d.STATUS_AIRBORNE) & (d.getStatus() != d.STATUS_AIRBORNE)
+        touchdown[new] = d.getState()[new]
+        status[new] = d.getStatus()[new]
+        if not (status == d.STATUS_AIRBORNE).any():
+            break
+
+    return touchdown, status
+
+def _descents(n=100):
+
+    rng = np.random.default_rng(7)
+
+    state = np.zeros((n,12))
+    state[:,3] = rng.normal(0, 0.3, n)
+    state[:,4] = -rng.uniform(0.5, 3, n)
+    state[:,5] = rng.uniform(0.2, 1.2, n)
+    state[:,6] = rng.normal(0, 0.03, n)
+    motors = np.clip(0.5228 + rng.normal(0, 0.004, (n,4)), 0, 1)
+
+    return state, motors
+
+def test_event_contact_batch_matches_single():
+
+    state, motors = _descents(20)
+
+    touchdown, status = _descend(50, 'event', state, motors)
+
+    for k in range(len(state)):
+        states, statuses = _fly(DJIPhantomDynamics(50, contact='event'), state[k], np.zeros(6), np.tile(motors[k], (1500,1)))
+        t = np.argmax(statuses != DJIPhantomDynamics.STATUS_AIRBORNE)
+        assert np.array_equal(states[t], touchdown[k])
+        assert statuses[t] == status[k]
+
+@pytest.mark.parametrize('cls, zeroed', ((PlanarDJIPhantomDynamics, [0, 1, 8, 9, 10, 11]),
+                                         (VerticalDJIPhantomDynamics, [0, 1, 2, 3, 6, 7, 8, 9, 10, 11])))
+def test_event_contact_reduced_matches_full(cls, zeroed):
+
+    state, motors = _descents(20)
+
+    # Reduced models see only their own states, and equal motors
+    state[:,zeroed] = 0
+    motors = np.tile(motors[:,:1], (1,4))
+
+    for s, m in zip(state, motors):
+        full = _fly(DJIPhantomDynamics(50, contact='event'), s, np.zeros(6), np.tile(m, (300,1)))
+        reduced = _fly(cls(50, contact='event'), s, np.zeros(6), np.tile(m, (300,1)))
+        assert np.array_equal(reduced[0], full[0])
+        assert np.array_equal(reduced[1], full[1])
+
+def test_event_contact_outcomes_independent_of_frame_rate():
+
+    state, motors = _descents()
+
+    reference, outcome = _descend(1000, 'event', state, motors)
+
+    assert (outcome == BatchDJIPhantomDynamics.STATUS_LEVELING).any()
+    assert (outcome == BatchDJIPhantomDynamics.STATUS_CRASHED).any()
+
+    for fps in (25, 50):
+        touchdown, status = _descend(fps, 'event', state, motors)
+        assert np.array_equal(status, outcome)
+        assert np.abs(touchdown[:,5] - reference[:,5]).max() < 0.1
+
+def test_batched_rollout_matches_single():
+
+    rng = np.random.default_rng(2)
+
+    d = DJIPhantomDynamics(50, integrator='rk4', substeps=2)
+    state = np.zeros(12)
+    state[4] = -2
+    state[6] = 0.05
+    d.setState(state)
+
+    motors = rng.uniform(0.45, 0.6, (6,150,4))
+
+    snapshot = d.get_snapshot()
+
+    states, statuses = d.rollout(motors)
+
+    for k in range(len(motors)):
+        single = d.rollout(motors[k])
+        assert np.array_equal(states[k], single[0])
+        assert np.array_equal(statuses[k], single[1])
+
+    # Rollouts leave the vehicle as they found it
+    assert np.array_equal(d.get_snapshot(), snapshot, equal_nan=True)
+
+def _derivative(d, x, motors):
+
+    d.setMotors(motors)
+    dxdt = np.zeros_like(x)
+    d._stateDerivative(x, dxdt)
+
+    return dxdt
+
+def _central_differences(d, x, motors, eps=1e-6):
+
+    A = np.stack([(_derivative(d, x+eps*e, motors) - _derivative(d, x-eps*e, motors)) / (2*eps) for e in np.eye(12)], axis=-1)
+    C = np.stack([(_derivative(d, x, motors+eps*e) - _derivative(d, x, motors-eps*e)) / (2*eps) for e in np.eye(4)], axis=-1)
+
+    return A, C
+
+def test_jacobians_match_central_differences():
+
+    rng = np.random.default_rng(0)
+
+    # Airborne and tilted, with uneven motors
+    states = rng.normal(0, 0.5, (8,12))
+    states[:,4] = -5
+    motors = rng.uniform(0.4, 0.7, (8,4))
+
+    batch = BatchDJIPhantomDynamics(8, 50)
+    batch.setState(states)
+    batch.setMotors(motors)
+    A, _, C = batch.getJacobians()
+
+    Afd, Cfd = _central_differences(batch, states, motors)
+    assert np.allclose(A, Afd, rtol=0, atol=1e-8)
+    assert np.allclose(C, Cfd, rtol=0, atol=1e-8)
+
+    for k in range(8):
+
+        d = DJIPhantomDynamics(50)
+        d.setState(states[k])
+        d.setMotors(motors[k])
+        a, _, c = d.getJacobians()
+
+        afd, cfd = _central_differences(d, states[k], motors[k])
+        assert np.allclose(a, afd, rtol=0, atol=1e-8)
+        assert np.allclose(c, cfd, rtol=0, atol=1e-8)
+
+        assert np.allclose(a, A[k]) and np.allclose(c, C[k])
+
+def test_randomized_batch_row_matches_single():
+
+    rng = np.random.default_rng(0)
+
+    n = 6
+    m = PARAMS.m * rng.uniform(0.8, 1.2, n)
+    Ix = PARAMS.Ix * rng.uniform(0.8, 1.2, n)
+    maxrpm = PARAMS.maxrpm * rng.uniform(0.9, 1.1, n)
+
+    batch = BatchDJIPhantomDynamics(n, 50)
+    batch.setParameters(m=m, Ix=Ix, maxrpm=maxrpm)
+
+    singles = [QuadXAPDynamics(Parameters(PARAMS.b, PARAMS.d, m[k], PARAMS.l, Ix[k], PARAMS.Iy, PARAMS.Iz, PARAMS.Jr, maxrpm[k]),
+                               50, DJIPhantomDynamics.G) for k in range(n)]
+
+    state = np.zeros(12)
+    state[4] = -5
+    force = rng.normal(0, 2, (n,6))
+    batch.setState(np.tile(state, (n,1)))
+    batch.perturb(force)
+    for d, f in zip(singles, force):
+        d.setState(state)
+        d.perturb(f)
+
+    for _ in range(200):
+
+        motors = rng.uniform(0.45, 0.6, (n,4))
+
+        batch.setMotors(motors)
+        batch.update()
+
+        for d, mv in zip(singles, motors):
+            d.setMotors(mv)
+            d.update()
+
+        assert np.allclose(batch.getState(), [d.getState() for d in singles], rtol=1e-12, atol=1e-12)
+
+REINIT = ({}, {'integrator': 'rk45'}, {'attitude': 'quaternion'})
+
+@pytest.mark.parametrize('make', [lambda kwargs=kwargs: DJIPhantomDynamics(50, **kwargs) for kwargs in REINIT] +
+                                 [lambda cls=cls: cls(50) for cls in SINGLE[1:]],
+                         ids=('euler', 'rk45', 'quaternion', 'scalar', 'planar', 'vertical'))
+def test_reinit_matches_fresh(make):
+
+    d = make()
+    fresh = make()
+
+    state = np.zeros(12)
+    state[4] = -5
+    state[6] = 0.2
+
+    # Airborne, tilted, perturbed and spinning motors
+    d.setState(state)
+    d.perturb([1, 2, 3, 0.1, 0.2, 0.3])
+    for _ in range(30):
+        d.setMotors([0.6, 0.55, 0.6, 0.55])
+        d.update()
+    assert d.getStatus() == d.STATUS_AIRBORNE
+
+    d.reinit()
+    assert np.array_equal(d.get_snapshot(), fresh.get_snapshot(), equal_nan=True)
+    assert d._quat == fresh._quat
+
+    d.reinit(state)
+    fresh.setState(state)
+
+    for _ in range(30):
+        for dynamics in (d, fresh):
+            dynamics.setMotors([0.6, 0.55, 0.6, 0.55])
+            dynamics.update()
+
+    assert np.array_equal(d.get_snapshot(), fresh.get_snapshot(), equal_nan=True)
+
+@pytest.mark.parametrize('integrator', ['euler', 'rk4'])
+def test_batch_reinit_leaves_other_rows(integrator):
+
+    batch = BatchDJIPhantomDynamics(6, 50, integrator=integrator)
+
+    states = np.zeros((6,12))
+    states[:,4] = -np.arange(1, 7)
+    batch.setState(states)
+    batch.perturb(np.ones(6))
+    for _ in range(30):
+        batch.setMotors(np.full((6,4), 0.6))
+        batch.update()
+
+    before = batch.get_snapshot()
+
+    mask = np.array([True, False, True, False, False, True])
+    batch.reinit(states[mask], mask)
+
+    fresh = BatchDJIPhantomDynamics(6, 50, integrator=integrator)
+    fresh.setState(states)
+
+    after = batch.get_snapshot()
+    assert np.array_equal(after[~mask], before[~mask], equal_nan=True)
+    assert np.array_equal(after[mask], fresh.get_snapshot()[mask], equal_nan=True)
+
+def test_parameters_are_immutable():
+
+    p = Parameters(*(getattr(PARAMS, name) for name in Parameters.ARGUMENTS))
+
+    assert Parameters.__slots__ == Parameters.COLUMNS
+    assert not hasattr(p, '__dict__')
+
+    with pytest.raises(AttributeError):
+        p.m = 3
+
+    with pytest.raises(AttributeError):
+        p.mass = 3
+
+    with pytest.raises(AttributeError):
+        del p.m
+
+    assert p.m == PARAMS.m
+    assert pickle.loads(pickle.dumps(p)).pack().tolist() == p.pack().tolist()
+
+def test_parameter_table_columns():
+
+    params = [Parameters(PARAMS.b * s, PARAMS.d, PARAMS.m * s, PARAMS.l, PARAMS.Ix * s, PARAMS.Iy, PARAMS.Iz, PARAMS.Jr, PARAMS.maxrpm)
+              for s in (0.8, 1.0, 1.2)]
+
+    table = parameterTable(params)
+
+    assert table.shape == (3, len(Parameters.COLUMNS))
+    assert table.flags.f_contiguous
+
+    for row, p in zip(table, params):
+
+        assert np.array_equal(row, p.pack())
+        assert np.array_equal(row[:P_MAXOMEGA], [getattr(p, name) for name in Parameters.ARGUMENTS])
+
+        # Derived columns are computed from the arguments, in DERIVED order
+        assert np.allclose(row[P_MAXOMEGA:], [p.maxrpm * np.pi / 30, 1 / p.m, 1 / p.Ix, 1 / p.Iy, 1 / p.Iz,
+                                              (p.Iy - p.Iz) / p.Ix, (p.Iz - p.Ix) / p.Iy, (p.Ix - p.Iy) / p.Iz,
+                                              p.Jr / p.Ix, p.Jr / p.Iy, p.l * p.b], rtol=1e-15)
+        assert row[P_INVM] == p.invm and row[P_LB] == p.lb
+
+    shared = parameterTable(PARAMS, 4, np.float32)
+    assert shared.dtype == np.float32 and shared.shape == (4, len(Parameters.COLUMNS))
+    assert np.array_equal(shared, np.tile(np.float32(PARAMS.pack()), (4,1)))
@@ -0,0 +1,157 @@
+'''
+Tests for the environments
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+import pytest
+
+from gym_copter.dynamics import P_M, P_IX, P_INVIX
+from gym_copter.envs import distance, lander3d, vecenv
+from gym_copter.envs import Lander1D, Lander2D, Lander3D, Distance, Takeoff
+from gym_copter.envs import VecLander1D, VecLander2D, VecLander3D, VecDistance, VecTakeoff
+
+SINGLE = (Lander1D, Lander2D, Lander3D, Distance, Takeoff)
+VECTOR = (VecLander1D, VecLander2D, VecLander3D, VecDistance, VecTakeoff)
+
+@pytest.mark.parametrize('cls', SINGLE + VECTOR)
+@pytest.mark.parametrize('action_repeat', (0, -1, 1.5))
+def test_action_repeat_must_be_positive_integer(cls, action_repeat):
+
+    with pytest.raises(ValueError):
+        cls(action_repeat=action_repeat)
+
+def test_distance_heuristic_delegates_to_batch():
+
+    assert np.array_equal(distance.heuristic(None, [0, 0, 0, 0, -1, 0, 0, 0, 0, 0]), [.6, .6, .6, .6])
+    assert np.array_equal(distance.heuristic(None, [0, 0, 0, 0, -5, 0, 0, 0, .1, 0]), [.505, .5, .505, .5])
+    assert np.array_equal(distance.heuristic(None, [0, 0, 0, 0, -5, 0, 0, 0, 1, 0]), [.55, .55, .55, .55])
+
+def test_float32_lander_outcomes_match_float64():
+
+    results = [vecenv.evaluate(VecLander3D(256, dtype=dtype), lander3d.heuristic_batch, seed=3) for dtype in (np.float64, np.float32)]
+
+    (returns, lengths, status, _), (returns32, lengths32, status32, _) = results
+
+    assert np.array_equal(status32, status)
+    assert np.array_equal(lengths32, lengths)
+    assert np.allclose(returns32, returns, atol=1e-3)
+
+@pytest.mark.parametrize('single, vector', list(zip(SINGLE, VECTOR)))
+def test_vector_copter_zero_matches_single(single, vector):
+
+    rng = np.random.default_rng(1)
+
+    env = single()
+    env.seed(3)
+
+    vec = vector(4, auto_reset=False)
+    vec.seed(3)
+
+    assert np.array_equal(vec.reset()[0], env.reset())
+
+    # Small random actions, around hover for the environments that take motor values
+    offset = 0.5 if single in (Distance, Takeoff) else 0
+
+    for _ in range(400):
+
+        action = offset + 0.2 * rng.uniform(-1, 1, env.action_space.shape)
+
+        obs, reward, done, _ = env.step(action)
+        vobs, vreward, vdone, _ = vec.step(np.tile(action, (4,1)))
+
+        assert np.array_equal(vobs[0], obs)
+        assert vreward[0] == reward
+        assert vdone[0] == done
+
+        if done:
+            break
+
+@pytest.mark.parametrize('cls', (Lander1D, Lander2D, Lander3D))
+def test_batched_rollout_matches_single(cls):
+
+    rng = np.random.default_rng(2)
+
+    env = cls()
+    env.seed(0)
+    env.reset()
+
+    actions = rng.uniform(-1, 1, (4, 120) + env.action_space.shape)
+
+    snapshot = env.get_snapshot()
+
+    observations, rewards, dones = env.rollout(actions)
+
+    for k in range(len(actions)):
+        single = env.rollout(actions[k])
+        assert np.array_equal(observations[k], single[0])
+        assert np.array_equal(rewards[k], single[1])
+        assert np.array_equal(dones[k], single[2])
+
+    assert np.array_equal(env.get_snapshot(), snapshot, equal_nan=True)
+
+def test_randomized_parameters_redrawn_only_on_reset():
+
+    randomize = {'m': (1.2, 1.6), 'Ix': lambda np_random, n: 2 * np_random.uniform(0.9, 1.1, n)}
+
+    env = VecLander3D(16, randomize=randomize)
+    env.seed(0)
+    env.reset()
+
+    params = env.dynamics._params
+    assert ((params[:,P_M] >= 1.2) & (params[:,P_M] < 1.6)).all()
+    assert len(np.unique(params[:,P_M])) == 16
+    assert np.allclose(params[:,P_INVIX], 1 / params[:,P_IX])
+
+    rng = np.random.default_rng(0)
+    resets = 0
+
+    for _ in range(400):
+
+        before = params.copy()
+
+        _, _, done, _ = env.step(rng.uniform(-1, 1, (16,3)))
+
+        # Copters whose episodes ended were reset with new parameters; the others keep theirs
+        changed = (params != before).any(axis=1)
+        assert np.array_equal(changed, done)
+
+        resets += done.sum()
+
+    assert resets > 0
+
+@pytest.mark.parametrize('cls', SINGLE)
+def test_reused_observations_match_copies(cls):
+
+    envs = [cls(reuse_observations=reuse) for reuse in (False, True)]
+
+    first = []
+    for env in envs:
+        env.seed(4)
+        first.append(env.reset())
+
+    assert np.array_equal(first[1], first[0])
+
+    rng = np.random.default_rng(0)
+
+    reused = None
+
+    for _ in range(200):
+
+        action = rng.uniform(-1, 1, envs[0].action_space.shape)
+
+        (obs, reward, done, _), (robs, rreward, rdone, _) = (env.step(action) for env in envs)
+
+        # The same read-only array every step, holding the same values as the copies
+        assert reused is None or robs is reused
+        assert not robs.flags.writeable
+        assert obs.flags.writeable and obs is not first[0]
+        assert np.array_equal(robs, obs) and rreward == reward and rdone == done
+
+        reused = robs
+
+        if done:
+            break
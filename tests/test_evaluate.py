@@ -0,0 +1,56 @@
+'''
+Tests for Monte Carlo evaluation
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import sys
+
+from gym_copter import evaluate
+from gym_copter.envs import Lander2D
+from gym_copter.envs.noise import make_bank
+
+def test_results_do_not_depend_on_workers():
+
+    results = [list(evaluate.evaluate('Lander-v2', episodes=12, seed=3, workers=workers)) for workers in (0, 1, 2)]
+
+    assert results[0] == results[1] == results[2]
+    assert [result[0] for result in results[0]] == list(range(12))
+
+def test_stops_once_interval_is_narrow():
+
+    width = 0.3
+
+    results = list(evaluate.evaluate('Lander-v2', episodes=100, seed=3, workers=2, width=width))
+
+    successes = [result[4] for result in results]
+    n = len(results)
+
+    # Stops at the first episode whose interval is narrower than the width
+    lower, upper = evaluate.wilson_interval(sum(successes), n)
+    assert upper - lower < width
+    lower, upper = evaluate.wilson_interval(sum(successes[:-1]), n-1)
+    assert upper - lower >= width
+
+    assert results == list(evaluate.evaluate('Lander-v2', episodes=100, seed=3, workers=0, width=width))
+
+def test_bank_fixes_initial_conditions(tmp_path, monkeypatch, capsys):
+
+    path = str(tmp_path / 'bank.npy')
+    make_bank(path, Lander2D.RESET_NOISE, 6, seed=1)
+
+    banked = [list(evaluate.evaluate('Lander-v2', episodes=50, seed=seed, workers=0, bank=path)) for seed in (3, 9)]
+    unbanked = list(evaluate.evaluate('Lander-v2', episodes=6, seed=3, workers=0))
+
+    # One episode per row, facing the same scenarios whatever the seed
+    assert len(banked[0]) == 6
+    assert [result[2:] for result in banked[0]] == [result[2:] for result in banked[1]]
+    assert [result[2:] for result in banked[0]] != [result[2:] for result in unbanked]
+
+    monkeypatch.setattr(sys, 'argv', ['evaluate', 'Lander-v2', '--bank', path, '-w', '0', '-s', '3'])
+    evaluate.main()
+
+    lines = capsys.readouterr().out.splitlines()[1:]
+    assert [(int(k), float(ret)) for k, _, ret, *_ in map(str.split, lines)] == [(k, round(ret, 2)) for k, _, ret, *_ in banked[0]]
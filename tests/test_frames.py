@@ -0,0 +1,70 @@
+'''
+Tests for the multirotor frames and mixer
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+import pytest
+
+from gym_copter.dynamics import MultirotorDynamics
+from gym_copter.dynamics.batch import BatchMultirotorDynamics
+from gym_copter.dynamics.djiphantom import PARAMS
+from gym_copter.dynamics.frames import mix, QUADXAP, QUADPLUS, HEXAX, OCTOX
+
+# Motor angles in degrees clockwise from the nose, and propeller directions (+1 ccw), in ArduPilot motor order
+LAYOUTS = ((QUADPLUS, (90, -90, 0, 180), (+1, +1, -1, -1)),
+           (HEXAX, (90, -90, -30, 150, 30, -150), (-1, +1, -1, +1, +1, -1)),
+           (OCTOX, (22.5, -157.5, 67.5, 157.5, -22.5, -112.5, -67.5, 112.5), (-1, -1, +1, +1, +1, +1, -1, -1)))
+
+@pytest.mark.parametrize('frame, angles, yaw', LAYOUTS)
+def test_mix_matches_hand_computed(frame, angles, yaw):
+
+    p = PARAMS
+
+    omegas = np.linspace(300, 700, frame.motorCount)
+
+    U1 = U2 = U3 = U4 = Omega = 0
+
+    for angle, direction, omega in zip(np.radians(angles), yaw, omegas):
+
+        # Motors on the left roll right and motors in the rear pitch forward
+        U1 += p.b * omega**2
+        U2 += p.l * p.b * -np.sin(angle) * omega**2
+        U3 += p.l * p.b * -np.cos(angle) * omega**2
+        U4 += p.d * direction * omega**2
+        Omega += direction * omega
+
+    assert np.allclose(mix(frame.mixer(p), omegas), [U1, U2, U3, U4, Omega], rtol=1e-12, atol=1e-12)
+
+def test_mixed_frame_batch_matches_single():
+
+    frames = (QUADXAP, QUADPLUS, HEXAX, OCTOX)
+
+    batch = BatchMultirotorDynamics(PARAMS, frames, len(frames), 50)
+    singles = [MultirotorDynamics(PARAMS, frame, 50) for frame in frames]
+
+    state = np.zeros(12)
+    state[4] = -5
+    batch.setState(np.tile(state, (len(frames),1)))
+    for d in singles:
+        d.setState(state)
+
+    rng = np.random.default_rng(0)
+
+    for _ in range(200):
+
+        # Vehicles with fewer motors ignore the extra columns
+        motors = rng.uniform(0.5, 0.6, (len(frames), 8))
+
+        batch.setMotors(motors)
+        batch.update()
+
+        for d, frame, m in zip(singles, frames, motors):
+            d.setMotors(m[:frame.motorCount])
+            d.update()
+
+        assert np.allclose(batch.getState(), [d.getState() for d in singles], rtol=1e-12, atol=1e-12)
+        assert np.array_equal(batch.getStatus(), [d.getStatus() for d in singles])
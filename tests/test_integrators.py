@@ -0,0 +1,132 @@
+'''
+Tests for the numerical integrators
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+import pytest
+
+from gym_copter.dynamics.integrators import makeIntegrator, RK45
+from gym_copter.dynamics.djiphantom import DJIPhantomDynamics, BatchDJIPhantomDynamics
+
+def _pendulums(x, out):
+
+    # Six damped pendulums, in the interleaved position/velocity layout
+    out[0::2] = x[1::2]
+    out[1::2] = -np.sin(x[0::2]) - 0.1 * x[1::2]
+
+def _integrate(integrator, dt, seconds):
+
+    x = np.array([0.1, 0, 0.5, 0.2, 1.0, -0.3, 1.5, 0, -0.7, 0.4, 2.0, 0.1])
+    dxdt = np.empty(12)
+
+    for _ in range(int(round(seconds / dt))):
+        _pendulums(x, dxdt)
+        integrator(_pendulums, x, dxdt, dt)
+
+    return x
+
+@pytest.mark.parametrize('name, order', [('euler', 1), ('semi-implicit', 1), ('verlet', 2), ('rk4', 4)])
+def test_order_of_convergence(name, order):
+
+    exact = _integrate(makeIntegrator('rk4', (12,)), 1e-3, 2)
+
+    errors = [np.max(np.abs(_integrate(makeIntegrator(name, (12,)), dt, 2) - exact)) for dt in (0.02, 0.01)]
+
+    # Halving the step divides the global error by 2**order
+    assert np.log2(errors[0] / errors[1]) == pytest.approx(order, abs=0.1)
+
+def test_rk45_meets_tolerance():
+
+    exact = _integrate(makeIntegrator('rk4', (12,)), 1e-3, 10)
+
+    errors = []
+
+    for tol in (1e-5, 1e-7, 1e-9):
+
+        rk45 = RK45((12,), rtol=tol, atol=tol)
+        errors.append(np.max(np.abs(_integrate(rk45, 1.0, 10) - exact)))
+
+        # Local errors held under the tolerance accumulate over the ten seconds
+        assert errors[-1] < 20 * tol
+
+    assert errors[0] > errors[1] > errors[2]
+
+@pytest.mark.parametrize('integrator', ['euler', 'semi-implicit', 'verlet', 'rk4', 'rk45'])
+def test_substeps_match_finer_frame_rate(integrator):
+
+    coarse = BatchDJIPhantomDynamics(3, 50, integrator=integrator, substeps=4)
+    fine = BatchDJIPhantomDynamics(3, 200, integrator=integrator)
+
+    motors = np.array([[0.62, 0.6, 0.61, 0.6], [0.6, 0.6, 0.6, 0.6], [0.65, 0.63, 0.65, 0.63]])
+
+    for _ in range(100):
+        coarse.setMotors(motors)
+        coarse.update()
+        for _ in range(4):
+            fine.setMotors(motors)
+            fine.update()
+
+    assert (coarse.getStatus() == coarse.STATUS_AIRBORNE).all()
+    assert np.allclose(coarse.getState(), fine.getState(), rtol=0, atol=1e-9)
+
+def _fly(integrator, fps, substeps=1, seconds=20):
+
+    # Slowly varying open-loop motor values, starting at 10 m
+    t = np.arange(int(fps * seconds)) / fps
+    thrust = 0.55 + 0.01 * np.cos(0.3 * t)
+    roll, pitch, yaw = 0.004 * np.cos(0.7 * t), 0.004 * np.cos(1.1 * t), 0.004 * np.cos(0.5 * t)
+    motors = np.column_stack((thrust-roll-pitch+yaw, thrust+roll+pitch+yaw, thrust+roll-pitch-yaw, thrust-roll+pitch-yaw))
+
+    dynamics = BatchDJIPhantomDynamics(1, fps, integrator=integrator, substeps=substeps)
+
+    state = np.zeros((1,12))
+    state[0,4] = -10
+    dynamics.setState(state)
+
+    states = np.empty((len(t), 1, 12))
+
+    for k, m in enumerate(motors):
+        dynamics.setMotors(m[np.newaxis])
+        dynamics.update()
+        dynamics.getState(states[k])
+
+    assert dynamics.getStatus()[0] == dynamics.STATUS_AIRBORNE
+
+    return states[:,0]
+
+@pytest.mark.parametrize('fps', [50, 25])
+def test_verlet_drift(fps):
+
+    reference = _fly('rk45', fps)
+
+    drift = np.max(np.abs(_fly('verlet', fps) - reference)[:,0:6:2])
+
+    # Euler with two physics steps evaluates the derivative as often as Verlet with one
+    euler = np.max(np.abs(_fly('euler', fps, substeps=2) - reference)[:,0:6:2])
+
+    assert drift < 2e-3
+    assert drift < euler / 100
+
+def test_rk45_step_size_ignores_inactive_rows():
+
+    batch = BatchDJIPhantomDynamics(2, 50, integrator='rk45')
+    single = DJIPhantomDynamics(50, integrator='rk45')
+
+    # The second vehicle sits on the ground, spinning wildly, and is never advanced
+    state = np.zeros((2,12))
+    state[1,6:] = 1, 50, 0.5, 50, 0, 50
+    batch.setState(state)
+
+    for _ in range(50):
+        batch.setMotors(np.array([[0.7, 0.72, 0.7, 0.72], [0, 0, 0, 0]]))
+        batch.update()
+        single.setMotors([0.7, 0.72, 0.7, 0.72])
+        single.update()
+
+    assert batch.getStatus()[1] == batch.STATUS_LANDED
+    assert batch._integrate.h == single._integrate.h
+    assert np.allclose(batch.getState()[0], single.getState(), rtol=0, atol=1e-12)
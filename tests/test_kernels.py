@@ -0,0 +1,54 @@
+'''
+Tests for the compiled VecLander3D step kernel
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+import pytest
+
+from gym_copter.envs import kernels, lander3d
+from gym_copter.envs.veclander3d import VecLander3D
+
+def _rollout(compiled, steps=600):
+
+    env = VecLander3D(64, compiled=compiled, auto_reset=False)
+    assert env.compiled == compiled
+    env.seed(0)
+
+    obs = env.reset()
+
+    observations, rewards, dones = [], [], []
+
+    for _ in range(steps):
+        obs, reward, done, _ = env.step(lander3d.heuristic_batch(obs))
+        observations.append(obs)
+        rewards.append(reward)
+        dones.append(done)
+
+    return np.array(observations), np.array(rewards), np.array(dones), env.dynamics
+
+@pytest.mark.skipif(not kernels.HAVE_NUMBA, reason='Numba is not installed')
+def test_compiled_matches_numpy():
+
+    observations, rewards, dones, d = _rollout(False)
+    cobservations, crewards, cdones, cd = _rollout(True)
+
+    assert np.allclose(cobservations, observations, rtol=1e-6, atol=1e-4)
+    assert np.allclose(crewards, rewards, rtol=1e-6, atol=1e-4)
+    assert np.allclose(cd.getState(), d.getState(), rtol=1e-6, atol=1e-4)
+    assert np.array_equal(cdones, dones)
+
+@pytest.mark.skipif(not kernels.HAVE_NUMBA, reason='Numba is not installed')
+def test_compiled_updates_motor_outputs():
+
+    _, _, _, d = _rollout(False, 100)
+    _, _, _, cd = _rollout(True, 100)
+
+    # Thrust, moments and net motor speed are part of the dynamics' visible state
+    for U, cU in zip((d._U1, d._U2, d._U3, d._U4, d._Omega), (cd._U1, cd._U2, cd._U3, cd._U4, cd._Omega)):
+        assert np.allclose(cU, U, rtol=1e-6, atol=1e-4)
+
+    assert np.allclose(cd.get_snapshot(), d.get_snapshot(), rtol=1e-6, atol=1e-4, equal_nan=True)
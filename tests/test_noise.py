@@ -0,0 +1,134 @@
+'''
+Tests for the per-copter reset noise and banks of initial conditions
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+import pytest
+
+from gym_copter.envs import Lander2D, Lander3D, VecLander2D, VecLander3D
+from gym_copter.envs.noise import ResetNoise, make_bank, load_bank
+
+def _draws(noise, count, index=None):
+
+    return np.array([noise(index) for _ in range(count)])
+
+@pytest.mark.parametrize('single, vector', [(Lander2D, VecLander2D), (Lander3D, VecLander3D)])
+def test_copter_zero_matches_single_env(single, vector):
+
+    env = single()
+    env.seed(7)
+    observations = [env.reset() for _ in range(300)]
+
+    vec = vector(5)
+    vec.seed(7)
+    assert np.array_equal(vec.reset()[0], observations[0])
+
+    # Copter 0 resets alone, past the end of its first block of draws
+    mask = np.zeros(5, dtype=bool)
+    mask[0] = True
+    for observation in observations[1:]:
+        vec._reset(mask)
+        assert np.allclose(vec._observation()[0], observation)
+
+def test_streams_are_per_copter():
+
+    noise = ResetNoise(4, 2, 'standard_normal')
+    noise.seed(1)
+
+    alone = ResetNoise(4, 2, 'standard_normal')
+    alone.seed(1)
+
+    mask = np.array([False, True, False, False])
+
+    # Copter 1's stream does not depend on how often the others reset
+    for _ in range(300):
+        noise()
+        noise(mask)
+    assert np.array_equal(_draws(noise, 10, mask), _draws(alone, 610, mask)[600:])
+
+def test_reseeding_restarts_streams():
+
+    noise = ResetNoise(3, 2, 'uniform', -1, 1)
+
+    noise.seed(5)
+    first = _draws(noise, 300)
+
+    noise.seed(5)
+    assert np.array_equal(_draws(noise, 300), first)
+
+    noise.seed(6)
+    assert not np.array_equal(_draws(noise, 300), first)
+
+    assert (np.abs(first) <= 1).all()
+
+@pytest.mark.parametrize('before', [0, 1, 255, 256, 257, 700])
+def test_snapshot_rewinds_across_blocks(before):
+
+    reference = ResetNoise(3, 2, 'standard_normal')
+    reference.seed(1)
+    expected = _draws(reference, before + 260)[before:]
+
+    noise = ResetNoise(3, 2, 'standard_normal')
+    noise.seed(1)
+    _draws(noise, before)
+
+    snapshot = np.zeros(noise.snapshot_size())
+    noise.get_snapshot(snapshot)
+
+    # Draw past the end of the current 256-draw block, then rewind
+    assert np.array_equal(_draws(noise, 260), expected)
+    noise.set_snapshot(snapshot)
+    assert np.array_equal(_draws(noise, 260), expected)
+
+    # A snapshot also restores into differently seeded noise
+    other = ResetNoise(3, 2, 'standard_normal')
+    other.seed(9)
+    other.set_snapshot(snapshot)
+    assert np.array_equal(_draws(other, 260), expected)
+
+def test_bank_round_trips(tmp_path):
+
+    noise = (3, 'uniform', -1, 1)
+
+    bank = make_bank(str(tmp_path / 'bank.npy'), noise, 1000, seed=2, chunk=300)
+
+    assert bank.shape == (1000, 3)
+    assert np.array_equal(load_bank(str(tmp_path / 'bank.npy')), bank)
+
+    # Rows do not depend on the chunk size
+    assert np.array_equal(make_bank(str(tmp_path / 'other.npy'), noise, 1000, seed=2), bank)
+
+@pytest.mark.parametrize('start', [0, 7])
+def test_bank_rows_per_copter(tmp_path, start):
+
+    count = 4
+
+    bank = make_bank(str(tmp_path / 'bank.npy'), (2, 'standard_normal'), 100, seed=0)
+
+    reference = ResetNoise(count, 2, 'standard_normal')
+    reference.seed(3)
+    streamed = _draws(reference, 10)
+
+    noise = ResetNoise(count, 2, 'standard_normal')
+    noise.seed(3)
+    _draws(noise, 5)
+    noise.use_bank(bank, start)
+
+    # Copter k's n-th reset takes row start + k + n*count, however the copters interleave
+    resets = np.zeros(count, dtype=int)
+    rng = np.random.default_rng(0)
+
+    for _ in range(20):
+        mask = rng.random(count) < 0.5
+        values = noise(mask)
+        rows = start + np.flatnonzero(mask) + resets[mask] * count
+        assert np.array_equal(values, bank[rows])
+        resets[mask] += 1
+
+    # Returning to the streams picks them up where they left off
+    noise.use_bank(None)
+    assert np.array_equal(_draws(noise, 5), streamed[5:])
@@ -0,0 +1,85 @@
+'''
+Tests for the subprocess vector environment
+
+Copyright (C) 2020 Simon D. Levy
+
+MIT License
+'''
+
+import numpy as np
+import pytest
+
+import gym
+
+import gym_copter
+from gym_copter.envs import Lander3D, SubprocVecEnv
+
+IDS = ('Lander-v1', 'Lander-v2', 'Lander-v3', 'Distance-v0', 'Takeoff-v0')
+
+@pytest.mark.parametrize('env_id', IDS)
+def test_matches_in_process_copies(env_id):
+
+    vec = SubprocVecEnv(env_id, 3, workers=2)
+    vec.seed(5)
+    obs = vec.reset()
+
+    envs = [gym.make(env_id) for _ in range(3)]
+    for k, env in enumerate(envs):
+        env.seed(5 + k)
+
+    assert np.array_equal(obs, np.array([env.reset() for env in envs], dtype=np.float32))
+
+    rng = np.random.default_rng(0)
+
+    for _ in range(300):
+
+        actions = rng.uniform(-1, 1, (3,) + vec.single_action_space.shape)
+
+        obs, reward, done, info = vec.step(actions)
+
+        for k, env in enumerate(envs):
+
+            o, r, d, _ = env.step(actions[k])
+
+            # Finished copies start their next episode, keeping the final observation in info
+            if d:
+                assert np.array_equal(info['terminal_observation'][k], np.float32(o))
+                o = env.reset()
+
+            assert np.array_equal(obs[k], np.float32(o))
+            assert reward[k] == r
+            assert done[k] == d
+
+    vec.close()
+
+def test_close_stops_workers():
+
+    vec = SubprocVecEnv('Lander-v3', 4, workers=2)
+    vec.reset()
+
+    processes = list(vec._processes)
+    assert all(process.is_alive() for process in processes)
+
+    vec.close()
+
+    assert vec.closed
+    assert not any(process.is_alive() for process in processes)
+
+    # Closing again does nothing
+    vec.close()
+
+def test_worker_failure_is_reported(monkeypatch):
+
+    def step(self, action):
+        raise ValueError('broken step')
+
+    # Forked workers inherit the broken step()
+    monkeypatch.setattr(Lander3D, 'step', step)
+
+    vec = SubprocVecEnv('Lander-v3', 2, workers=2, context='fork')
+    vec.reset()
+
+    with pytest.raises(RuntimeError, match='broken step'):
+        vec.step(np.zeros((2,3)))
+
+    vec.close()